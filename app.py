@@ -1,11 +1,24 @@
-import os, json, hashlib
-from datetime import datetime, timedelta
-from flask import Flask, request, jsonify, render_template, send_from_directory
-import pandas as pd
-import numpy as np
+from __future__ import annotations
+
+import os, io, json, hashlib, functools, base64, time
+from datetime import date, datetime, timedelta
+from flask import Blueprint, Flask, request, jsonify, render_template, send_from_directory, make_response, send_file, g, has_request_context, current_app
+from flask.json.provider import DefaultJSONProvider
+import importlib
 import sqlite3
 import logging
+import multiprocessing
 import re
+import uuid
+import shutil
+import socket
+import tempfile
+import threading
+import contextlib
+import pathlib
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 
 APP_VERSION = "v1.0.9-hotfix"
 
@@ -14,6 +27,7 @@ DB_PATH = os.path.join(BASE_DIR, "budget_sniffer.db")
 RULES_PATH = os.path.join(BASE_DIR, "rules.json")
 LOGS_DIR = os.path.join(BASE_DIR, "logs")
 DATA_DIR = os.path.join(BASE_DIR, "data")
+UPLOADS_DIR = os.path.join(BASE_DIR, "uploads")
 os.makedirs(LOGS_DIR, exist_ok=True)
 
 logging.basicConfig(
@@ -23,7 +37,26 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+class _LazyModule:
+    """
+    Stand-in for a heavy module that imports it on first attribute access.
+    pandas/numpy cost most of a cold start, and /health, the rules and job
+    endpoints and most of the SQL-backed reads never touch them.
+    """
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+pd = _LazyModule("pandas")
+np = _LazyModule("numpy")
+
+# Routes and hooks live on this blueprint; create_app() builds the Flask app.
+bp = Blueprint("budget", __name__, cli_group=None)
 
 def _skip_transfers_df(df):
     try:
@@ -36,18 +69,512 @@ def _skip_transfers_df(df):
     return df, 0
 
 
-@app.after_request
+@bp.after_app_request
 def add_no_store(resp):
-    resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
+    if resp.headers.get("ETag"):
+        # Cached read endpoints: let the browser keep a copy but always revalidate
+        resp.headers["Cache-Control"] = "no-cache, must-revalidate, max-age=0"
+    else:
+        resp.headers["Cache-Control"] = "no-store, no-cache, must-revalidate, max-age=0"
     resp.headers["Pragma"] = "no-cache"
     resp.headers["Expires"] = "0"
     return resp
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH, detect_types=sqlite3.PARSE_DECLTYPES)
+class Metrics:
+    """
+    In-process counters and histograms, rendered in the Prometheus text format
+    by /metrics. Each gunicorn worker keeps its own; scrape them per worker
+    or sum them in the query.
+    """
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [per-bucket counts..., sum, count]
+        self._help = {}
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * (len(self.BUCKETS) + 2)
+            for i, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    h[i] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    def clear(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _labels(labels, extra=()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ""
+        def esc(v):
+            return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in items) + "}"
+
+    def render(self) -> str:
+        with self._lock:
+            counters = sorted(self._counters.items(), key=lambda kv: (kv[0][0], str(kv[0][1])))
+            histograms = sorted(((k, list(v)) for k, v in self._histograms.items()), key=lambda kv: (kv[0][0], str(kv[0][1])))
+        lines, seen = [], set()
+
+        def header(name, default_kind):
+            if name not in seen:
+                seen.add(name)
+                kind, text = self._help.get(name, (default_kind, name))
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {value}")
+        for (name, labels), h in histograms:
+            header(name, "histogram")
+            for bound, count in zip(self.BUCKETS, h):
+                lines.append(f"{name}_bucket{self._labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{self._labels(labels, [('le', '+Inf')])} {h[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {h[-2]}")
+            lines.append(f"{name}_count{self._labels(labels)} {h[-1]}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+METRICS.describe("budget_http_requests_total", "counter", "HTTP requests by endpoint, method and status.")
+METRICS.describe("budget_http_request_duration_seconds", "histogram", "Request wall time by endpoint.")
+METRICS.describe("budget_span_duration_seconds", "histogram", "Time in instrumented code paths (sql, json, parse_dataframe, ...).")
+METRICS.describe("budget_rows_parsed_total", "counter", "Rows parsed from uploaded exports.")
+METRICS.describe("budget_rows_inserted_total", "counter", "Transactions inserted.")
+METRICS.describe("budget_rows_duplicate_total", "counter", "Parsed rows skipped as duplicates.")
+METRICS.describe("budget_rows_relabelled_total", "counter", "Transactions relabelled by rules.")
+
+# Adds a Server-Timing header (per-span totals for the request) when set
+SERVER_TIMING = str(os.environ.get("SERVER_TIMING", "")).lower() in ("1", "true", "yes", "y")
+
+@contextlib.contextmanager
+def span(name: str):
+    """Time a block into budget_span_duration_seconds and, inside a request, its Server-Timing totals."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        METRICS.observe("budget_span_duration_seconds", elapsed, span=name)
+        if has_request_context():
+            timings = g.setdefault("span_timings", {})
+            total, count = timings.get(name, (0.0, 0))
+            timings[name] = (total + elapsed, count + 1)
+
+def instrumented(name: str):
+    """Decorator form of span()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with span("json"):
+            return super().dumps(obj, **kwargs)
+
+@bp.before_app_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+@bp.after_app_request
+def _record_request_timing(resp):
+    started = g.pop("request_started", None)
+    if started is None:
+        return resp
+    elapsed = time.perf_counter() - started
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    METRICS.inc("budget_http_requests_total", method=request.method, endpoint=endpoint, status=resp.status_code)
+    METRICS.observe("budget_http_request_duration_seconds", elapsed, endpoint=endpoint)
+    if SERVER_TIMING:
+        parts = [f'{name};dur={total * 1000:.2f};desc="{count}x"'
+                 for name, (total, count) in sorted(g.get("span_timings", {}).items())]
+        parts.append(f"total;dur={elapsed * 1000:.2f}")
+        resp.headers["Server-Timing"] = ", ".join(parts)
+    return resp
+
+@functools.lru_cache(maxsize=1024)
+def compiled_regex(pattern: str):
+    return re.compile(pattern)
+
+def _sqlite_regexp(pattern, value):
+    """SQLite REGEXP: `value REGEXP pattern` calls regexp(pattern, value)."""
+    if value is None:
+        return 0
+    return 1 if compiled_regex(pattern).search(value) else 0
+
+# Applied to every new connection; SQLite keeps these per connection, not per file
+DB_PRAGMAS = {
+    "synchronous": "NORMAL",
+    "cache_size": os.environ.get("SQLITE_CACHE_SIZE", "-32000"),      # KiB when negative
+    "mmap_size": os.environ.get("SQLITE_MMAP_SIZE", "268435456"),
+    "temp_store": "MEMORY",
+    "busy_timeout": os.environ.get("SQLITE_BUSY_TIMEOUT", "10000"),   # ms
+}
+
+class TimedCursor(sqlite3.Cursor):
+    """Cursor whose statements and fetches are timed as the "sql" span."""
+    def execute(self, sql, parameters=()):
+        with span("sql"):
+            return super().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        with span("sql"):
+            return super().executemany(sql, seq_of_parameters)
+
+    def fetchone(self):
+        with span("sql"):
+            return super().fetchone()
+
+    def fetchmany(self, size=None):
+        with span("sql"):
+            return super().fetchmany(self.arraysize if size is None else size)
+
+    def fetchall(self):
+        with span("sql"):
+            return super().fetchall()
+
+class InstrumentedConnection(sqlite3.Connection):
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+_DB_LOCAL = threading.local()
+_WRITE_LOCK = threading.RLock()
+_WRITERS = {}
+
+def _connect(path: str, readonly: bool = False, check_same_thread: bool = True):
+    if readonly:
+        conn = sqlite3.connect(f"{pathlib.Path(path).absolute().as_uri()}?mode=ro", uri=True, factory=InstrumentedConnection,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=check_same_thread)
+    else:
+        conn = sqlite3.connect(path, factory=InstrumentedConnection,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=check_same_thread)
     conn.row_factory = sqlite3.Row
+    for name, value in DB_PRAGMAS.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    if readonly:
+        conn.execute("PRAGMA query_only = 1")
+    conn.create_function("REGEXP", 2, _sqlite_regexp, deterministic=True)
+    conn.create_function("normalise", 1, normalise_description, deterministic=True)
+    return conn
+
+def _thread_conn(kind: str):
+    conns = getattr(_DB_LOCAL, kind, None)
+    if conns is None:
+        conns = {}
+        setattr(_DB_LOCAL, kind, conns)
+    conn = conns.get(DB_PATH)
+    if conn is None:
+        conn = conns[DB_PATH] = _connect(DB_PATH, readonly=(kind == "ro"))
     return conn
 
+def get_db():
+    """This thread's pooled read-write connection (tuned, reused across calls)."""
+    return _thread_conn("rw")
+
+def get_read_db():
+    """
+    This thread's pooled read-only connection, for endpoints that only query.
+    Under WAL these never block, and are never blocked by, the writer.
+    """
+    if not os.path.exists(DB_PATH):
+        return get_db()
+    return _thread_conn("ro")
+
+@contextlib.contextmanager
+def db_writer():
+    """
+    The process-wide writer connection. Writes are serialised on one lock so
+    threads queue here instead of racing for SQLite's lock; other processes
+    wait up to busy_timeout. Commits on success, rolls back on error.
+    """
+    with _WRITE_LOCK:
+        conn = _WRITERS.get(DB_PATH)
+        if conn is None:
+            conn = _WRITERS[DB_PATH] = _connect(DB_PATH, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+        before = conn.total_changes
+        try:
+            yield conn
+            if conn.total_changes != before:
+                _bump_generation(conn)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+def _bump_generation(conn):
+    try:
+        conn.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'data_generation'")
+    except sqlite3.OperationalError:
+        # app_meta not created yet (schema being initialised)
+        pass
+
+def data_generation() -> int:
+    """Counter bumped by every write that changed rows; shared by all workers via the DB."""
+    try:
+        row = get_read_db().execute("SELECT value FROM app_meta WHERE key = 'data_generation'").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] if row else 0
+
+def close_db_connections():
+    """Close pooled connections (e.g. before the DB file is moved aside)."""
+    with _WRITE_LOCK:
+        for conn in _WRITERS.values():
+            conn.close()
+        _WRITERS.clear()
+    for kind in ("rw", "ro"):
+        for conn in getattr(_DB_LOCAL, kind, {}).values():
+            conn.close()
+        setattr(_DB_LOCAL, kind, {})
+
+def _migrate_schema(con):
+    """
+    Bring an existing DB up to date with schema.sql.
+    Every statement there is IF NOT EXISTS, so re-running it only adds the
+    tables and indexes introduced since the DB was created.
+    """
+    _add_missing_columns(con)
+    version = con.execute("PRAGMA user_version").fetchone()[0]
+    if version < 2:
+        _drop_hash_unique(con)
+    schema_path = os.path.join(BASE_DIR, "schema.sql")
+    with open(schema_path, "r") as f:
+        con.executescript(f.read())
+    _backfill_hash_keys(con)
+    if version < 1:
+        _canonicalise_dates(con)
+    if version < 3:
+        _backfill_normalised(con)
+        # Nothing filters or sorts on merchant_key; the index only cost inserts
+        con.execute("DROP INDEX IF EXISTS idx_tx_merchant_key")
+    if version < SCHEMA_VERSION:
+        con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        con.commit()
+        logger.info("Migrated schema from user_version %s to %s", version, SCHEMA_VERSION)
+    _ensure_rollups(con)
+
+# Bumped whenever _migrate_schema gains a one-off data migration
+SCHEMA_VERSION = 3
+
+def _canonicalise_dates(con):
+    """Rewrite tx_date as plain YYYY-MM-DD so it can be range-filtered without date()."""
+    cur = con.execute("""
+        UPDATE transactions SET tx_date = date(tx_date)
+        WHERE date(tx_date) IS NOT NULL AND tx_date != date(tx_date)
+    """)
+    con.commit()
+    if cur.rowcount:
+        logger.info("Canonicalised tx_date on %s transactions", cur.rowcount)
+
+# Columns added to existing tables after they were first created
+ADDED_COLUMNS = {
+    "transactions": (("raw_header_id", "INTEGER"), ("raw_values", "TEXT"), ("hash_key", "INTEGER"),
+                     ("description_norm", "TEXT"), ("merchant_key", "TEXT"), ("updated_at", "TEXT")),
+    "ingest_jobs": (("owner", "TEXT"), ("heartbeat", "TEXT")),
+}
+
+def _add_missing_columns(con):
+    """
+    Add columns introduced after a table was created. Runs before schema.sql
+    so the indexes there can refer to them; tables that do not exist yet are
+    left to schema.sql.
+    """
+    for table, added in ADDED_COLUMNS.items():
+        columns = {row[1] for row in con.execute(f"PRAGMA table_info({table})")}
+        if not columns:
+            continue
+        for name, decl in added:
+            if name not in columns:
+                con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+                logger.info("Added %s column to %s table", name, table)
+    con.commit()
+
+def _drop_hash_unique(con):
+    """
+    Rebuild transactions without the UNIQUE constraint on hash, leaving the
+    unique hash_key index as the only dedup index. SQLite cannot drop a
+    column constraint in place, so the rows are copied into a new table. ids
+    and the AUTOINCREMENT high-water mark are kept, so the FTS index stays
+    valid. hash_key is cleared and then recomputed by _backfill_hash_keys.
+    Indexes and triggers on the old table are recreated by schema.sql and
+    _ensure_fts.
+    """
+    row = con.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'transactions'").fetchone()
+    table_sql, n = re.subn(r"\bhash\s+TEXT\s+UNIQUE\b", "hash TEXT", row[0] if row else "", flags=re.IGNORECASE)
+    if not n:
+        return
+    table_sql = re.sub(r'^CREATE TABLE\s+"?transactions"?', "CREATE TABLE transactions_rebuild", table_sql, flags=re.IGNORECASE)
+    columns = [r[1] for r in con.execute("PRAGMA table_info(transactions)")]
+    values = ", ".join("NULL" if c == "hash_key" else c for c in columns)
+    seq = con.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+    con.commit()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        con.execute(table_sql)
+        con.execute(f"INSERT INTO transactions_rebuild ({', '.join(columns)}) SELECT {values} FROM transactions")
+        con.execute("DROP TABLE transactions")
+        con.execute("ALTER TABLE transactions_rebuild RENAME TO transactions")
+        if seq:
+            con.execute("DELETE FROM sqlite_sequence WHERE name = 'transactions'")
+            con.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('transactions', ?)", seq)
+        con.commit()
+    except Exception:
+        con.rollback()
+        raise
+    logger.info("Rebuilt transactions table without the UNIQUE constraint on hash")
+
+def _backfill_hash_keys(con, batch_size: int = 10000):
+    """
+    Fill hash_key for rows stored before it existed (or inserted outside the
+    app). A key already taken by another row is left NULL rather than
+    failing init; such rows are still found by HASH_MATCH.
+    """
+    total, last_id = 0, 0
+    while True:
+        rows = con.execute("""
+            SELECT id, hash FROM transactions
+            WHERE hash_key IS NULL AND hash IS NOT NULL AND id > ? ORDER BY id LIMIT ?
+        """, (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        con.executemany("UPDATE OR IGNORE transactions SET hash_key = ? WHERE id = ?", [(hash_key(h), i) for i, h in rows])
+        con.commit()
+        total += len(rows)
+    if total:
+        logger.info("Backfilled hash_key on %s transactions", total)
+
+def _backfill_normalised(con, batch_size: int = 10000):
+    """Fill description_norm/merchant_key for rows stored before them."""
+    total, last_id = 0, 0
+    while True:
+        rows = con.execute("""
+            SELECT id, description FROM transactions
+            WHERE id > ? AND description_norm IS NULL ORDER BY id LIMIT ?
+        """, (last_id, batch_size)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        norm = normalise_series(pd.Series([r[1] for r in rows], dtype=object))
+        keys = merchant_key_series(norm)
+        con.executemany("UPDATE transactions SET description_norm = ?, merchant_key = ? WHERE id = ?",
+                        zip(norm.tolist(), keys.tolist(), (r[0] for r in rows)))
+        con.commit()
+        total += len(rows)
+    if total:
+        logger.info("Backfilled description_norm/merchant_key on %s transactions", total)
+
+def rebuild_rollups(con):
+    """Recompute daily_category_totals from scratch."""
+    con.execute("DELETE FROM daily_category_totals")
+    con.execute("""
+        INSERT INTO daily_category_totals (tx_day, week_start, category, hidden, amount_cents, tx_count)
+        SELECT COALESCE(date(tx_date), tx_date), COALESCE(date(tx_date, 'weekday 0', '-6 days'), tx_date),
+               COALESCE(category, ''), COALESCE(hidden, 0), SUM(CAST(ROUND(amount * 100) AS INTEGER)), COUNT(*)
+        FROM transactions
+        GROUP BY 1, 3, 4
+    """)
+    con.commit()
+
+def _ensure_rollups(con):
+    """Backfill the rollup table for DBs created before it existed (or that drifted)."""
+    rolled = con.execute("SELECT COALESCE(SUM(tx_count), 0) FROM daily_category_totals").fetchone()[0]
+    actual = con.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    if rolled != actual:
+        rebuild_rollups(con)
+        logger.info("Rebuilt daily_category_totals (%s rolled up vs %s transactions)", rolled, actual)
+
+# Trigram FTS5 index over transactions.description (external content, so only
+# the index is stored). Trigram matching is a case-insensitive substring
+# match, the same test as lower(description) LIKE '%phrase%', so rule
+# application can use it to find candidate rows. Created from code rather than
+# schema.sql so a SQLite build without FTS5 still gets a working DB.
+# insert_transactions sets fts_bulk_insert for the length of its batch insert
+# and indexes the new rows in one statement afterwards, instead of one FTS
+# insert per row from the trigger.
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+  description, content='transactions', content_rowid='id', tokenize='trigram'
+);
+INSERT OR IGNORE INTO app_meta (key, value) VALUES ('fts_bulk_insert', 0);
+CREATE TRIGGER IF NOT EXISTS trg_tx_fts_insert AFTER INSERT ON transactions
+WHEN (SELECT value FROM app_meta WHERE key = 'fts_bulk_insert') IS NOT 1
+BEGIN
+  INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_tx_fts_delete AFTER DELETE ON transactions BEGIN
+  INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', old.id, old.description);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_tx_fts_update AFTER UPDATE OF description ON transactions BEGIN
+  INSERT INTO transactions_fts (transactions_fts, rowid, description) VALUES ('delete', old.id, old.description);
+  INSERT INTO transactions_fts (rowid, description) VALUES (new.id, new.description);
+END;
+"""
+_FTS_READY = {}  # DB_PATH -> whether transactions_fts exists
+
+def _ensure_fts(con):
+    """Create (and on first creation, fill) the FTS index if this SQLite has FTS5 trigram."""
+    existed = con.execute("SELECT 1 FROM sqlite_master WHERE name = 'transactions_fts'").fetchone() is not None
+    trigger = con.execute("SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_tx_fts_insert'").fetchone()
+    if trigger and "fts_bulk_insert" not in trigger[0]:
+        # Created before bulk inserts could switch it off
+        con.execute("DROP TRIGGER trg_tx_fts_insert")
+    try:
+        con.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError as e:
+        logger.warning("FTS5 trigram index unavailable, falling back to LIKE scans: %s", e)
+        _FTS_READY[DB_PATH] = False
+        return
+    if not existed:
+        con.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+        con.commit()
+        logger.info("Built transactions_fts index")
+    _FTS_READY[DB_PATH] = True
+
+def fts_quote(phrase: str) -> str:
+    """phrase as a single FTS5 string literal (a substring match under trigram)."""
+    return '"' + phrase.replace('"', '""') + '"'
+
+def contains_candidates(phrase: str):
+    """
+    SQL fragment + params narrowing a `lower(description) LIKE '%phrase%'`
+    filter to the rows the FTS index says contain phrase. Empty when the index
+    cannot answer exactly: no FTS, fewer than 3 characters (trigram minimum),
+    or LIKE wildcards in the phrase.
+    """
+    if not _FTS_READY.get(DB_PATH) or len(phrase) < 3 or "%" in phrase or "_" in phrase:
+        return "", ()
+    return " AND id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)", (fts_quote(phrase),)
+
 def init_db():
     # Determine whether a DB file already exists
     db_exists = os.path.exists(DB_PATH)
@@ -60,6 +587,7 @@ def init_db():
             # Move existing DB to a timestamped backup to avoid silent data loss
             ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
             backup_path = f"{DB_PATH}.bak.{ts}"
+            close_db_connections()
             os.replace(DB_PATH, backup_path)
             logger.info("RECREATE_DB set: backed up existing DB to %s", backup_path)
             db_exists = False
@@ -68,7 +596,7 @@ def init_db():
             raise
 
     # Open (or create) connection; creating the file is harmless but we log intent
-    with get_db() as con:
+    with db_writer() as con:
         cur = con.cursor()
 
         # If the DB file did not exist, create schema from file
@@ -77,6 +605,8 @@ def init_db():
             try:
                 with open(schema_path, "r") as f:
                     con.executescript(f.read())
+                # A new DB is already at the current schema; skip the one-off migrations next start
+                con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
                 logger.info("Database file not found; created new DB and initialized schema at %s", DB_PATH)
             except Exception as e:
                 logger.exception("Failed to create new DB schema: %s", e)
@@ -92,6 +622,7 @@ def init_db():
                 try:
                     with open(schema_path, "r") as f:
                         con.executescript(f.read())
+                    con.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
                     logger.info("Existing DB found but transactions table missing; initialized schema")
                 except Exception as e:
                     logger.exception("Failed to initialize schema on existing DB: %s", e)
@@ -109,16 +640,47 @@ def init_db():
                         logger.warning("Could not add hidden column: %s", e)
                 else:
                     logger.info("Hidden column already exists")
+                try:
+                    _migrate_schema(con)
+                except Exception as e:
+                    logger.exception("Failed to apply schema migrations: %s", e)
+                    raise
 
+    with db_writer() as con:
+        _ensure_fts(con)
+    # The dedup filter and simulation index are rebuilt lazily on first use,
+    # so startup does not import numpy; drop any left from a previous file here
+    with _DEDUP_LOCK:
+        _DEDUP_FILTERS.pop(DB_PATH, None)
+    with _SIMULATION_LOCK:
+        _SIMULATION_INDEXES.pop(DB_PATH, None)
+    seed_rules_from_json()
+    refresh_rules(force=True)
     logger.info("DB initialised / verified. (db_exists=%s)", db_exists)
 
-@app.before_request
+@bp.before_app_request
 def _ensure_db_once():
-    if not app.config.get("_DB_INIT_DONE"):
+    # Apps built with create_app(init_database=True) did init_db at startup and
+    # only resume jobs here, in the worker that will run them.
+    config = current_app.config
+    if not config.get("_DB_INIT_DONE"):
         try:
             init_db()
+            config["_RESUME_JOBS_PENDING"] = True
         finally:
-            app.config["_DB_INIT_DONE"] = True
+            config["_DB_INIT_DONE"] = True
+    if config.pop("_RESUME_JOBS_PENDING", False):
+        try:
+            resume_ingest_jobs()
+        except Exception as e:
+            logger.exception("Failed to resume ingest jobs: %s", e)
+
+@bp.before_app_request
+def _refresh_rules_if_stale():
+    try:
+        refresh_rules()
+    except Exception as e:
+        logger.exception("Failed to refresh rules: %s", e)
 
 def load_rules():
     try:
@@ -129,116 +691,633 @@ def load_rules():
         logger.exception("Failed to load rules: %s", e)
         return {"version": "unknown", "default_category": "Uncategorised", "rules": []}
 
-RULES = load_rules()
+# Filled from the rules tables by init_db(); rules.json is only read to seed
+# a new DB, not on import.
+RULES = {"version": "unknown", "default_category": "Uncategorised", "rules": []}
 
 def sha1(s: str) -> str:
     return hashlib.sha1(s.encode("utf-8", "ignore")).hexdigest()
 
+_SHA1_HEX_RE = re.compile(r"[0-9a-f]{40}")
+
+def hash_key(digest) -> int:
+    """
+    First 8 bytes of a transaction hash as a signed 64-bit int (SQLite INTEGER
+    range). Anything that is not a sha1 hex digest (hashes written outside the
+    app) is sha1'd first, so every stored hash gets a key.
+    """
+    if not (isinstance(digest, str) and _SHA1_HEX_RE.fullmatch(digest)):
+        digest = sha1(str(digest))
+    key = int(digest[:16], 16)
+    return key - (1 << 64) if key >= (1 << 63) else key
+
+# Look a row up by its hash through the unique hash_key index. Rows written
+# outside the app get their hash_key at the next init_db; until then they are
+# matched on hash alone.
+HASH_MATCH = "(hash_key = ? OR hash_key IS NULL) AND hash = ?"
+
+def hash_params(h) -> tuple:
+    return hash_key(h), h
+
 def normalise_description(s: str) -> str:
     if not isinstance(s, str): return ""
     return re.sub(r"\s+", " ", s.strip().lower())
 
+class RuleEngine:
+    """
+    Compiled form of a RULES dict, built once per rules change.
+    contains_any phrases are matched in a single pass with an Aho-Corasick
+    automaton; regex_any patterns are compiled once and cached, and one
+    alternation of all of them rules most texts out before any rule is tried.
+    First rule (by position in the rules list) wins, as before.
+    """
+
+    NO_MATCH = float("inf")
+    # Backreferences and conditionals name groups by number, which combining
+    # renumbers; global inline flags would leak into the other patterns.
+    _UNCOMBINABLE_RE = re.compile(r"\\\d|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)")
+
+    def __init__(self, rules: dict):
+        self.source = rules
+        self.rules_ref = rules.get("rules")
+        self.rule_list = self.rules_ref or []
+        self.n_rules = len(self.rule_list)
+        self.default_category = rules.get("default_category", "Uncategorised")
+        self.categories = []
+        self.always = self.NO_MATCH  # priority of the first rule with an empty phrase
+        self.regex_rules = []  # [(priority, [compiled patterns])] in rule order
+        self._goto = [{}]
+        self._fail = [0]
+        self._best = [self.NO_MATCH]
+
+        for idx, rule in enumerate(self.rule_list):
+            self.categories.append(rule.get("category", self.default_category))
+            match = rule.get("match", {})
+            for phrase in match.get("contains_any", []):
+                if phrase == "":
+                    self.always = min(self.always, idx)
+                else:
+                    self._add_phrase(phrase, idx)
+            compiled = []
+            for pat in match.get("regex_any", []):
+                try:
+                    compiled.append(re.compile(pat))
+                except re.error:
+                    continue
+            if compiled:
+                self.regex_rules.append((idx, compiled))
+        self.regex_gate = self.combine_regexes([pat.pattern for _, compiled in self.regex_rules for pat in compiled])
+        self._build_failure_links()
+
+    @classmethod
+    def combine_regexes(cls, patterns):
+        """A pattern matching wherever any of patterns does, or None if they cannot be combined safely."""
+        if not patterns or any(cls._UNCOMBINABLE_RE.search(p) for p in patterns):
+            return None
+        try:
+            return re.compile("|".join(f"(?:{p})" for p in patterns))
+        except re.error:
+            return None
+
+    def _add_phrase(self, phrase, priority):
+        node = 0
+        for ch in phrase:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._best.append(self.NO_MATCH)
+            node = nxt
+        self._best[node] = min(self._best[node], priority)
+
+    def _build_failure_links(self):
+        # Breadth-first, so each node's failure target is final before its children
+        queue = list(self._goto[0].values())
+        i = 0
+        while i < len(queue):
+            node = queue[i]
+            i += 1
+            for ch, child in self._goto[node].items():
+                f = self._fail[node]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[child] = self._goto[f].get(ch, 0)
+                # Fold in every phrase that is a suffix of this one
+                self._best[child] = min(self._best[child], self._best[self._fail[child]])
+                queue.append(child)
+
+    def first_contains(self, d: str):
+        """Lowest rule index whose contains_any matches normalised text d."""
+        goto, fail, best = self._goto, self._fail, self._best
+        found = self.always
+        node = 0
+        for ch in d:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if best[node] < found:
+                found = best[node]
+                if found == 0:
+                    break
+        return found
+
+    def match(self, d: str):
+        """Index of the first rule matching normalised text d, or None."""
+        found = self.first_contains(d)
+        gate = self.regex_gate
+        for idx, patterns in (self.regex_rules if gate is None or gate.search(d) else ()):
+            if idx >= found:
+                break
+            for pat in patterns:
+                if pat.search(d):
+                    return idx
+        if found != self.NO_MATCH:
+            return found
+        return None
+
+    def categorise(self, desc: str, amount: float) -> str:
+        idx = self.match(normalise_description(desc))
+        if idx is not None:
+            return self.categories[idx]
+        if amount > 0: return "Income"
+        return self.default_category
+
+_RULE_ENGINE = None
+
+def get_rule_engine() -> RuleEngine:
+    """Return the compiled engine for RULES, rebuilding it if RULES changed."""
+    global _RULE_ENGINE
+    eng = _RULE_ENGINE
+    if eng is None or eng.source is not RULES or eng.rules_ref is not RULES.get("rules") or eng.n_rules != len(eng.rule_list):
+        eng = _RULE_ENGINE = RuleEngine(RULES)
+    return eng
+
 def categorise(desc: str, amount: float) -> str:
-    d = normalise_description(desc)
-    for rule in RULES.get("rules", []):
+    return get_rule_engine().categorise(desc, amount)
+
+def rule_fingerprint(rule: dict) -> str:
+    return sha1(json.dumps(rule, sort_keys=True, ensure_ascii=False))
+
+def rules_version(rules: dict = None) -> str:
+    """Fingerprint of a whole rule set (order matters, as it does for matching)."""
+    rules = RULES if rules is None else rules
+    return sha1("|".join(rule_fingerprint(r) for r in rules.get("rules", [])))
+
+# Fingerprints of the rules the DB is known to reflect; see apply_changed_rules()
+_APPLIED_RULES = set()
+
+def mark_rules_applied():
+    global _APPLIED_RULES
+    _APPLIED_RULES = {rule_fingerprint(r) for r in RULES.get("rules", [])}
+
+# Rules loaded at startup are taken as already applied; /api/reload_rules does a full pass
+mark_rules_applied()
+
+def changed_rules() -> list:
+    """Rules added or edited since the last apply."""
+    return [r for r in RULES.get("rules", []) if rule_fingerprint(r) not in _APPLIED_RULES]
+
+def _rows_matching(cur, rules) -> set:
+    """Ids of transactions that any of the given rules could relabel."""
+    ids = set()
+    for rule in rules:
         match = rule.get("match", {})
-        contains_any = match.get("contains_any", [])
-        regex_any = match.get("regex_any", [])
-        if any(c in d for c in contains_any):
-            return rule.get("category", RULES.get("default_category","Uncategorised"))
-        for pat in regex_any:
-            try:
-                if re.search(pat, d):
-                    return rule.get("category", RULES.get("default_category","Uncategorised"))
-            except re.error:
+        for phrase in match.get("contains_any", []):
+            if not phrase.strip():
                 continue
-    if amount > 0: return "Income"
-    return RULES.get("default_category","Uncategorised")
+            fts_sql, fts_params = contains_candidates(phrase)
+            cur.execute("SELECT id FROM transactions WHERE lower(description) LIKE ?" + fts_sql,
+                        (f"%{phrase.lower()}%", *fts_params))
+            ids.update(row[0] for row in cur.fetchall())
+        for pattern in valid_regexes(match.get("regex_any", [])):
+            cur.execute("SELECT id FROM transactions WHERE COALESCE(description_norm, normalise(description)) REGEXP ?", (pattern,))
+            ids.update(row[0] for row in cur.fetchall())
+    return ids
+
+def valid_regexes(patterns) -> list:
+    """Patterns that compile; invalid ones are logged and dropped."""
+    out = []
+    for pattern in patterns:
+        try:
+            compiled_regex(pattern)
+            out.append(pattern)
+        except re.error as e:
+            logger.warning(f"Invalid regex pattern '{pattern}': {e}")
+    return out
 
-def apply_rules_to_db():
+def apply_rules_to_db(scope_ids=None):
     """
     Apply all rules from RULES to the database.
     Phase 1: Fast SQL LIKE updates for contains_any rules
-    Phase 2: Regex rules (slower, row-by-row)
+    Phase 2: Regex rules, one pass over the rows with a compiled RuleEngine
+    If scope_ids is given, only those transactions are re-evaluated.
     Returns total number of rows updated.
     """
     total_updated = 0
+    scope_sql = ""
     
-    with get_db() as con:
+    with db_writer() as con:
         cur = con.cursor()
+
+        if scope_ids is not None:
+            cur.execute("CREATE TEMP TABLE IF NOT EXISTS rule_scope (id INTEGER PRIMARY KEY)")
+            cur.execute("DELETE FROM temp.rule_scope")
+            cur.executemany("INSERT INTO temp.rule_scope (id) VALUES (?)", ((i,) for i in scope_ids))
+            scope_sql = " AND id IN (SELECT id FROM temp.rule_scope)"
         
         # Phase 1: Fast SQL LIKE updates for contains_any rules
-        for rule in RULES.get("rules", []):
-            category = rule.get("category", RULES.get("default_category", "Uncategorised"))
-            match = rule.get("match", {})
-            contains_any = match.get("contains_any", [])
+        with span("apply_rules.contains"):
+            for rule in RULES.get("rules", []):
+                category = rule.get("category", RULES.get("default_category", "Uncategorised"))
+                match = rule.get("match", {})
+                contains_any = match.get("contains_any", [])
             
-            for phrase in contains_any:
-                if not phrase.strip():
-                    continue
+                for phrase in contains_any:
+                    if not phrase.strip():
+                        continue
                     
-                # Use LIKE for case-insensitive substring matching
-                like_pattern = f"%{phrase.lower()}%"
-                cur.execute("""
-                    UPDATE transactions 
-                    SET category = ? 
-                    WHERE lower(description) LIKE ? 
-                    AND category != ?
-                """, (category, like_pattern, category))
+                    # Use LIKE for case-insensitive substring matching
+                    like_pattern = f"%{phrase.lower()}%"
+                    fts_sql, fts_params = contains_candidates(phrase)
+                    cur.execute("""
+                        UPDATE transactions 
+                        SET category = ? 
+                        WHERE lower(description) LIKE ? 
+                        AND category != ?
+                    """ + fts_sql + scope_sql, (category, like_pattern, category, *fts_params))
                 
-                updated = cur.rowcount or 0
-                total_updated += updated
-                if updated > 0:
-                    logger.info(f"Rule '{phrase}' -> '{category}': updated {updated} transactions")
+                    updated = cur.rowcount or 0
+                    total_updated += updated
+                    if updated > 0:
+                        logger.info(f"Rule '{phrase}' -> '{category}': updated {updated} transactions")
         
         con.commit()
         
-        # Phase 2: Regex rules (slower, iterate through transactions)
-        regex_rules = [rule for rule in RULES.get("rules", []) 
-                      if rule.get("match", {}).get("regex_any")]
-        
-        if regex_rules:
-            # Get all transactions for regex processing
-            cur.execute("SELECT id, description FROM transactions")
-            transactions = cur.fetchall()
-            
-            for tx_id, description in transactions:
-                normalized_desc = normalise_description(description)
-                
-                for rule in regex_rules:
-                    category = rule.get("category", RULES.get("default_category", "Uncategorised"))
-                    regex_patterns = rule.get("match", {}).get("regex_any", [])
-                    
-                    for pattern in regex_patterns:
-                        try:
-                            if re.search(pattern, normalized_desc):
-                                cur.execute("""
-                                    UPDATE transactions 
-                                    SET category = ? 
-                                    WHERE id = ? AND category != ?
-                                """, (category, tx_id, category))
-                                
-                                if cur.rowcount > 0:
-                                    total_updated += 1
-                                break  # First matching rule wins
-                        except re.error as e:
-                            logger.warning(f"Invalid regex pattern '{pattern}': {e}")
-                            continue
-            
-            con.commit()
-    
+        # Phase 2: Regex rules. Rules run in order, so a later matching rule
+        # overrides an earlier one: a reversed engine's first match is that rule.
+        # Each distinct description is matched once, in a single read of the
+        # rows, and only rows whose category changes are written back.
+        with span("apply_rules.regex"):
+            rule_list = RULES.get("rules", [])
+            default_category = RULES.get("default_category", "Uncategorised")
+            regexes = _reversed_engine(rule_list, default_category, lambda m: {
+                "regex_any": valid_regexes(m.get("regex_any", []))})
+            if regexes.regex_rules:
+                n = len(rule_list)
+                decided, per_rule, updates = {}, {}, []
+                # description_norm is stored at ingest; normalise() only for rows inserted without it
+                rows = cur.execute("""
+                    SELECT id, COALESCE(description_norm, normalise(description)), category FROM transactions
+                    WHERE category IS NOT NULL
+                """ + scope_sql).fetchall()
+                for tx_id, norm, current in rows:
+                    if norm not in decided:
+                        idx = regexes.match(norm or "")
+                        decided[norm] = None if idx is None else n - 1 - idx
+                    rule_idx = decided[norm]
+                    if rule_idx is None:
+                        continue
+                    category = rule_list[rule_idx].get("category", default_category)
+                    if category != current:
+                        updates.append((category, tx_id))
+                        per_rule[rule_idx] = per_rule.get(rule_idx, 0) + 1
+                cur.executemany("UPDATE transactions SET category = ? WHERE id = ?", updates)
+                total_updated += len(updates)
+                for rule_idx, updated in sorted(per_rule.items()):
+                    rule = rule_list[rule_idx]
+                    logger.info(f"Regex rule '{rule.get('name', rule_idx)}' -> '{rule.get('category', default_category)}': updated {updated} transactions")
+
+        con.commit()
+
+    if scope_ids is None:
+        mark_rules_applied()
+    METRICS.inc("budget_rows_relabelled_total", total_updated, source="rules")
     logger.info(f"apply_rules_to_db completed: {total_updated} total updates")
     return total_updated
 
-def save_rules():
-    """Save the current RULES dict back to rules.json"""
+def apply_changed_rules():
+    """
+    Incremental apply: re-evaluate only the rows that rules added or edited
+    since the last apply could match, using the full rule set so the outcome
+    for those rows is the same as a full apply_rules_to_db().
+    """
+    rules = changed_rules()
+    if not rules:
+        return 0
+    with get_read_db() as con:
+        ids = _rows_matching(con.cursor(), rules)
+    updated = apply_rules_to_db(scope_ids=ids) if ids else 0
+    mark_rules_applied()
+    logger.info(f"apply_changed_rules: {len(rules)} changed rules, {len(ids)} candidate rows, {updated} updates")
+    return updated
+
+def _reversed_engine(rule_list, default_category, make_match) -> RuleEngine:
+    """
+    RuleEngine over rule_list in reverse, so its first match is the last
+    matching rule (apply_rules_to_db's later-rule-wins order).
+    make_match(match) returns the match dict to compile for a rule.
+    """
+    return RuleEngine({
+        "default_category": default_category,
+        "rules": [{"match": make_match(r.get("match", {}))} for r in reversed(rule_list)],
+    })
+
+class SimulationIndex:
+    """
+    The rows simulate_rules evaluates, read once per data generation: every
+    row that has a category, each distinct description once, and (filled in
+    as rule sets are simulated) the descriptions each contains phrase and
+    regex pattern matches. Rule edits re-simulate a mostly unchanged rule
+    set, so only phrases and patterns not seen since the last write cost a
+    scan; everything else is array indexing.
+    """
+
+    def __init__(self, con, generation: int):
+        self.generation = generation
+        self.total = con.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        rows = con.execute("""
+            SELECT id, description, description_norm, category FROM transactions
+            WHERE category IS NOT NULL ORDER BY id
+        """).fetchall()
+        ids, descriptions, norms, categories = zip(*rows) if rows else ((), (), (), ())
+        # use_na_sentinel=False keeps NULL descriptions as a value of their own
+        desc_idx, uniques = pd.factorize(pd.Series(descriptions, dtype=object), use_na_sentinel=False)
+        category_codes, category_names = pd.factorize(pd.Series(categories, dtype=object))
+        _, first = np.unique(desc_idx, return_index=True)
+        self.descriptions = [d if isinstance(d, str) else None for d in uniques.tolist()]
+        self.lowered = [d.lower() if d is not None else None for d in self.descriptions]
+        self.norms = [norms[i] if norms[i] is not None else normalise_description(d)
+                      for i, d in zip(first.tolist(), self.descriptions)]
+        self.ids = np.array(ids, dtype=np.int64)
+        self.desc_idx = desc_idx.astype(np.intp)
+        self.category_codes = category_codes.astype(np.intp)
+        self.categories = {c: i for i, c in enumerate(category_names.tolist())}  # category -> code
+        self._phrases = {}
+        self._patterns = {}
+
+    def contains(self, con, phrase: str) -> np.ndarray:
+        """Descriptions whose lowered text contains phrase (already lowered)."""
+        hit = self._phrases.get(phrase)
+        if hit is None:
+            fts_sql, fts_params = contains_candidates(phrase)
+            if fts_sql:
+                # The FTS index narrows the candidates; the substring check stays exact
+                ids = np.array([r[0] for r in con.execute("SELECT id FROM transactions WHERE category IS NOT NULL" + fts_sql,
+                                                          fts_params)], dtype=np.int64)
+                pos = np.searchsorted(self.ids, ids)
+                found = pos < len(self.ids)
+                pos = pos[found][self.ids[pos[found]] == ids[found]]
+                candidates = np.unique(self.desc_idx[pos]).tolist()
+            else:
+                candidates = range(len(self.lowered))
+            lowered = self.lowered
+            hit = self._phrases[phrase] = np.array(
+                [j for j in candidates if lowered[j] is not None and phrase in lowered[j]], dtype=np.intp)
+        return hit
+
+    def regex(self, patterns) -> dict:
+        """pattern -> descriptions whose normalised text it matches, for every pattern given."""
+        new = [p for p in dict.fromkeys(patterns) if p not in self._patterns]
+        if new:
+            # One combined search rules most descriptions out for all new patterns
+            gate = RuleEngine.combine_regexes(new)
+            norms = self.norms
+            candidates = [j for j, d in enumerate(norms) if gate.search(d)] if gate else range(len(norms))
+            for p in new:
+                search = compiled_regex(p).search
+                self._patterns[p] = np.array([j for j in candidates if search(norms[j])], dtype=np.intp)
+        return {p: self._patterns[p] for p in patterns}
+
+_SIMULATION_INDEXES = {}
+_SIMULATION_LOCK = threading.Lock()
+
+def simulation_index(con) -> SimulationIndex:
+    """This process's SimulationIndex for DB_PATH, re-read whenever a write has bumped the data generation."""
+    generation = data_generation()
+    with _SIMULATION_LOCK:
+        index = _SIMULATION_INDEXES.get(DB_PATH)
+    if index is None or index.generation != generation:
+        index = SimulationIndex(con, generation)
+        with _SIMULATION_LOCK:
+            _SIMULATION_INDEXES[DB_PATH] = index
+    return index
+
+def simulate_rules(rules: dict, sample_size: int = 20) -> dict:
+    """
+    Dry run of apply_rules_to_db() for a proposed rule set: which rows would
+    be relabelled, by which rule, from what to what. Nothing is written.
+
+    Mirrors apply_rules_to_db: contains_any phrases match lower(description)
+    as literal substrings, regex_any matches normalise(description) and
+    overrides them, the last matching rule wins within each phase, and rows
+    with no category are left alone (category != ? is never true there).
+    Each distinct description is decided once, from the cached phrase and
+    pattern matches of the SimulationIndex, and counts follow its rows.
+    Samples are one representative row (the lowest id) per changed
+    (description, category) group.
+    """
+    rule_list = rules.get("rules", [])
+    default_category = rules.get("default_category", "Uncategorised")
+    n = len(rule_list)
+    categories = [r.get("category", default_category) for r in rule_list]
+
+    with get_read_db() as con:
+        # One snapshot for the index, its FTS lookups and the sample rows
+        con.execute("BEGIN")
+        index = simulation_index(con)
+        matches = [r.get("match", {}) for r in rule_list]
+        patterns = index.regex([p for m in matches for p in valid_regexes(m.get("regex_any", []))])
+        # Rules in order, so a later matching rule overwrites an earlier one
+        contains = np.full(len(index.descriptions), -1, dtype=np.intp)
+        regexes = np.full(len(index.descriptions), -1, dtype=np.intp)
+        for i, m in enumerate(matches):
+            for phrase in m.get("contains_any", []):
+                if phrase.strip():
+                    contains[index.contains(con, phrase.lower())] = i
+            for p in m.get("regex_any", []):
+                if p in patterns:
+                    regexes[patterns[p]] = i
+        decided = np.where(regexes >= 0, regexes, contains)[index.desc_idx]
+
+        codes = dict(index.categories)
+        # decided == -1 (no rule) picks the trailing -1: no target
+        targets = np.array([codes.setdefault(c, len(codes)) for c in categories] + [-1], dtype=np.intp)[decided]
+        names = list(codes)
+        current = index.category_codes
+        changed = (targets >= 0) & (targets != current)
+        matched_per_rule = np.bincount(decided[decided >= 0], minlength=n)
+        changed_per_rule = np.bincount(decided[changed], minlength=n)
+        pairs, counts = np.unique(current[changed] * len(names) + targets[changed], return_counts=True)
+        delta = {(names[p // len(names)], names[p % len(names)]): c for p, c in zip(pairs.tolist(), counts.tolist())}
+
+        picked, seen = [], set()
+        if sample_size > 0:
+            for pos in np.flatnonzero(changed).tolist():
+                group = (int(index.desc_idx[pos]), int(current[pos]))
+                if group not in seen:
+                    seen.add(group)
+                    picked.append(pos)
+                    if len(picked) == sample_size:
+                        break
+        details = {row[0]: row for row in con.execute(
+            "SELECT id, tx_date, amount FROM transactions WHERE id IN (SELECT value FROM json_each(?))",
+            (json.dumps([int(index.ids[pos]) for pos in picked]),))}
+
+    samples = []
+    for pos in picked:
+        tx_id, rule_idx = int(index.ids[pos]), int(decided[pos])
+        samples.append({"id": tx_id, "tx_date": details[tx_id][1], "description": index.descriptions[index.desc_idx[pos]],
+                        "amount": details[tx_id][2], "from": names[current[pos]], "to": categories[rule_idx],
+                        "rule": rule_idx})
+    return {
+        "rows": index.total,
+        "changed": int(changed.sum()),
+        "rules": [{"index": i, "name": r.get("name"), "category": categories[i],
+                   "matched": int(matched_per_rule[i]), "changed": int(changed_per_rule[i])}
+                  for i, r in enumerate(rule_list)],
+        "delta": [{"from": f, "to": t, "count": c} for (f, t), c in sorted(delta.items(), key=lambda kv: (-kv[1], kv[0]))],
+        "samples": samples,
+    }
+
+# Rules live in the rules/rule_phrases/rule_regexes tables. Every change bumps
+# app_meta.rules_generation; each worker compares that with the generation its
+# RULES dict was loaded from and reloads (and recompiles) only when it moved.
+# rules.json is the import/export format and seeds an empty DB.
+_RULE_KEYS = ("name", "category")
+_MATCH_KEYS = ("contains_any", "regex_any")
+_RULES_LOADED = (None, None)  # (DB_PATH, rules_generation) RULES was read from
+
+def _insert_rule(cur, rule: dict, position: int):
+    match = rule.get("match", {})
+    extra = {k: v for k, v in rule.items() if k not in _RULE_KEYS and k != "match"}
+    extra_match = {k: v for k, v in match.items() if k not in _MATCH_KEYS}
+    if extra_match:
+        extra["match"] = extra_match
+    cur.execute("INSERT INTO rules (position, name, category, extra) VALUES (?, ?, ?, ?)",
+                (position, rule.get("name"), rule.get("category"), json.dumps(extra, ensure_ascii=False) if extra else None))
+    rule_id = cur.lastrowid
+    cur.executemany("INSERT INTO rule_phrases (rule_id, position, phrase) VALUES (?, ?, ?)",
+                    [(rule_id, i, p) for i, p in enumerate(match.get("contains_any", []))])
+    cur.executemany("INSERT INTO rule_regexes (rule_id, position, pattern) VALUES (?, ?, ?)",
+                    [(rule_id, i, p) for i, p in enumerate(match.get("regex_any", []))])
+
+def _bump_rules_generation(con) -> int:
+    con.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'rules_generation'")
+    return con.execute("SELECT value FROM app_meta WHERE key = 'rules_generation'").fetchone()[0]
+
+def rules_generation(con=None) -> int:
+    con = con or get_read_db()
+    row = con.execute("SELECT value FROM app_meta WHERE key = 'rules_generation'").fetchone()
+    return row[0] if row else 0
+
+def load_rules_from_db(con=None) -> dict:
+    """Assemble the RULES dict (same shape as rules.json) from the rule tables."""
+    con = con or get_read_db()
+    settings = dict(con.execute("SELECT key, value FROM rule_settings").fetchall())
+    phrases, regexes = {}, {}
+    for rule_id, phrase in con.execute("SELECT rule_id, phrase FROM rule_phrases ORDER BY rule_id, position"):
+        phrases.setdefault(rule_id, []).append(phrase)
+    for rule_id, pattern in con.execute("SELECT rule_id, pattern FROM rule_regexes ORDER BY rule_id, position"):
+        regexes.setdefault(rule_id, []).append(pattern)
+    rules = []
+    for row in con.execute("SELECT id, name, category, extra FROM rules ORDER BY position, id"):
+        extra = json.loads(row["extra"]) if row["extra"] else {}
+        rule = {}
+        if row["name"] is not None:
+            rule["name"] = row["name"]
+        match = extra.pop("match", {})
+        if row["id"] in phrases:
+            match["contains_any"] = phrases[row["id"]]
+        if row["id"] in regexes:
+            match["regex_any"] = regexes[row["id"]]
+        rule["match"] = match
+        if row["category"] is not None:
+            rule["category"] = row["category"]
+        rule.update(extra)
+        rules.append(rule)
+    return {
+        "version": settings.get("version", "unknown"),
+        "default_category": settings.get("default_category", "Uncategorised"),
+        "rules": rules,
+    }
+
+def refresh_rules(force: bool = False) -> bool:
+    """
+    Reload RULES if the stored rules_generation differs from the one this
+    worker loaded. One indexed read when nothing changed. Rules another worker
+    added are taken as already applied, as rules loaded at startup are.
+    """
+    global RULES, _RULES_LOADED
     try:
-        with open(RULES_PATH, "w") as fh:
-            json.dump(RULES, fh, indent=2, ensure_ascii=False)
-        logger.info("Saved updated rules to rules.json")
-    except Exception as e:
-        logger.exception(f"Failed to save rules: {e}")
-        raise
+        con = get_read_db()
+        gen = rules_generation(con)
+        if not force and _RULES_LOADED == (DB_PATH, gen):
+            return False
+        RULES = load_rules_from_db(con)
+    except sqlite3.OperationalError:
+        # Rule tables not created yet
+        return False
+    _RULES_LOADED = (DB_PATH, gen)
+    mark_rules_applied()
+    logger.info("Loaded %s rules (rules_generation=%s)", len(RULES["rules"]), gen)
+    return True
+
+def replace_rules(rules: dict):
+    """Store a whole rule set (e.g. an imported rules.json), replacing the current one."""
+    global RULES, _RULES_LOADED
+    with db_writer() as con:
+        cur = con.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        cur.execute("DELETE FROM rule_phrases")
+        cur.execute("DELETE FROM rule_regexes")
+        cur.execute("DELETE FROM rules")
+        for position, rule in enumerate(rules.get("rules", [])):
+            _insert_rule(cur, rule, position)
+        cur.executemany("INSERT OR REPLACE INTO rule_settings (key, value) VALUES (?, ?)", [
+            ("version", str(rules.get("version", "unknown"))),
+            ("default_category", rules.get("default_category", "Uncategorised")),
+        ])
+        gen = _bump_rules_generation(con)
+    RULES = load_rules_from_db()
+    _RULES_LOADED = (DB_PATH, gen)
+    logger.info("Stored %s rules (rules_generation=%s)", len(RULES["rules"]), gen)
+
+def add_rules(rules: list):
+    """Append rules without rewriting the others; they stay pending for apply_changed_rules()."""
+    global _RULES_LOADED
+    if not rules:
+        return
+    with db_writer() as con:
+        cur = con.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        # Holding the write lock, bring RULES up to date so the append lands on the current set
+        refresh_rules()
+        position = cur.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM rules").fetchone()[0]
+        for offset, rule in enumerate(rules):
+            _insert_rule(cur, rule, position + offset)
+        gen = _bump_rules_generation(con)
+    RULES.setdefault("rules", []).extend(rules)
+    _RULES_LOADED = (DB_PATH, gen)
+
+def add_rule(rule: dict):
+    add_rules([rule])
+
+def rule_with_phrase(phrase: str, category: str):
+    """Id of a rule mapping this exact phrase to category, via the phrase index."""
+    row = get_read_db().execute("""
+        SELECT r.id FROM rule_phrases p JOIN rules r ON r.id = p.rule_id
+        WHERE p.phrase = ? AND r.category = ? LIMIT 1
+    """, (phrase, category)).fetchone()
+    return row[0] if row else None
+
+def seed_rules_from_json():
+    """Import rules.json into a DB that has never stored any rules."""
+    con = get_read_db()
+    if rules_generation(con) == 0 and con.execute("SELECT COUNT(*) FROM rules").fetchone()[0] == 0:
+        replace_rules(load_rules())
+        logger.info("Imported rules from %s", RULES_PATH)
 
 def extract_learning_phrase(description):
     """
@@ -266,21 +1345,144 @@ def extract_learning_phrase(description):
     # Fallback: return first word if nothing better found
     return words[0] if words else None
 
-def parse_dataframe(df: pd.DataFrame, source_file: str, account_hint: str = None) -> pd.DataFrame:
-    cols = {c.lower().strip(): c for c in df.columns}
-    date_col = next((cols[k] for k in cols if k in ["date","transaction date","tx date","posting date"]), None)
-    desc_col = next((cols[k] for k in cols if k in ["description","details","narrative","merchant","payee"]), None)
-    amt_col  = next((cols[k] for k in cols if k in ["amount","amt","value"]), None)
+def normalise_series(s: pd.Series) -> pd.Series:
+    """Vectorised normalise_description for a column of descriptions."""
+    s = s.where(s.map(lambda v: isinstance(v, str)), "")
+    return s.str.strip().str.lower().str.replace(r"\s+", " ", regex=True)
+
+# Payment-method prefixes banks put before the merchant name
+MERCHANT_PREFIX_RE = r"^(?:(?:eftpos|pos w/d|pos|visa purchase|visa debit|visa|debit card purchase|card purchase|direct debit|dd|ap|bill payment)\s+)+"
+
+def merchant_key_series(norm: pd.Series) -> pd.Series:
+    """
+    Merchant identity from normalised descriptions: payment-method prefixes
+    and any word containing a digit (card numbers, store numbers, references)
+    are dropped and the first three remaining words kept. Falls back to the
+    first three words when nothing is left. One regex pass strips both (the
+    digit-word branch only starts at word boundaries, so it never backtracks
+    through a word), and the words are taken with str.extract rather than
+    per-row split/join lists.
+    """
+    stripped = norm.str.replace(MERCHANT_PREFIX_RE + r"|(?<!\S)[^\s\d]*\d\S*\s*", "", regex=True)
+    first_words = r"^(\S+(?: \S+){0,2})"
+    key = stripped.str.extract(first_words, expand=False)
+    return key.fillna(norm.str.extract(first_words, expand=False)).fillna("")
+
+def hash_keys(tx_date: pd.Series, amount: pd.Series, norm: pd.Series, account: pd.Series) -> list:
+    """
+    Dedup hashes for whole columns. Keys are built exactly like the row-wise
+    f"{tx_date}|{amount}|{normalised description}|{account}" so existing
+    hashes in the DB stay valid. amount is formatted as a float whatever dtype
+    the reader inferred, so a chunk that happens to hold only whole numbers
+    hashes "-10.0" like a whole-file read of a statement with cents does.
+    """
+    keys = tx_date.astype(str) + "|" + amount.astype("float64").astype(str) + "|" + norm + "|" + account.astype(str)
+    return [sha1(k) for k in keys.tolist()]
+
+def legacy_hash_keys(tx_date: pd.Series, amount: pd.Series, norm: pd.Series, account: pd.Series) -> list:
+    """
+    The hash earlier versions stored for a whole-number amount read from an
+    all-integer column ("-10" rather than "-10.0"), or None where the amount
+    has cents. Duplicate checks look these up too, so statements loaded
+    before amounts were hashed as floats are still recognised on re-upload.
+    """
+    amount = amount.astype("float64")
+    whole = (amount == amount.round()).to_numpy()
+    out = [None] * len(amount)
+    if whole.any():
+        keys = (tx_date[whole].astype(str) + "|" + amount[whole].astype("int64").astype(str) + "|" + norm[whole]
+                + "|" + account[whole].astype(str))
+        for i, k in zip(np.flatnonzero(whole), keys.tolist()):
+            out[i] = sha1(k)
+    return out
+
+@instrumented("categorise")
+def categorise_series(norm: pd.Series, amount: pd.Series) -> pd.Series:
+    """
+    Bulk categorise() over already-normalised descriptions.
+    Each distinct description is matched once; rows that no rule claims fall
+    back to Income (amount > 0) or the default category.
+    """
+    eng = get_rule_engine()
+    by_desc = {}
+    for d in pd.unique(norm):
+        i = eng.match(d)
+        if i is not None:
+            by_desc[d] = eng.categories[i]
+    fallback = pd.Series(np.where(amount > 0, "Income", eng.default_category), index=norm.index, dtype=object)
+    has_rule = norm.isin(list(by_desc))
+    return norm.map(by_desc).astype(object).where(has_rule, fallback)
+
+DATE_COLUMNS = ["date","transaction date","tx date","posting date"]
+DESC_COLUMNS = ["description","details","narrative","merchant","payee"]
+AMOUNT_COLUMNS = ["amount","amt","value"]
+DEBIT_COLUMNS = ["debit","withdrawal","debits"]
+CREDIT_COLUMNS = ["credit","deposit","credits"]
 
+def infer_columns(df: pd.DataFrame) -> dict:
+    """Map the export's headers to date/description/amount (or debit+credit) columns."""
+    cols = {str(c).lower().strip(): c for c in df.columns}
+    date_col = next((cols[k] for k in cols if k in DATE_COLUMNS), None)
+    desc_col = next((cols[k] for k in cols if k in DESC_COLUMNS), None)
+    amt_col  = next((cols[k] for k in cols if k in AMOUNT_COLUMNS), None)
+    debit_col = credit_col = None
     if amt_col is None:
-        debit_col = next((cols[k] for k in cols if k in ["debit","withdrawal","debits"]), None)
-        credit_col = next((cols[k] for k in cols if k in ["credit","deposit","credits"]), None)
-        if debit_col and credit_col:
-            df["__amount"] = pd.to_numeric(df.get(credit_col, 0), errors="coerce").fillna(0) - pd.to_numeric(df.get(debit_col, 0), errors="coerce").fillna(0)
-            amt_col = "__amount"
+        debit_col = next((cols[k] for k in cols if k in DEBIT_COLUMNS), None)
+        credit_col = next((cols[k] for k in cols if k in CREDIT_COLUMNS), None)
+        if not (debit_col and credit_col):
+            debit_col = credit_col = None
 
-    if date_col is None or desc_col is None or amt_col is None:
+    if date_col is None or desc_col is None or (amt_col is None and debit_col is None):
         raise ValueError("Could not infer columns (need Date, Description, Amount or Debit+Credit).")
+    return {"date": date_col, "description": desc_col, "amount": amt_col, "debit": debit_col, "credit": credit_col}
+
+RAW_MAX_COLUMNS = 40
+
+def _raw_json_default(o):
+    # numpy scalars from the object-cast frame; anything else (timestamps) as text
+    return o.item() if isinstance(o, np.generic) else str(o)
+
+def encode_raw_values(values) -> str:
+    """
+    Compact JSON list of one row's original cell values. Stored as plain
+    text: a single export row is too short for zlib to pay for its own
+    header, so per-row compression made payloads larger, not smaller.
+    """
+    return json.dumps(values, ensure_ascii=False, separators=(",", ":"), default=_raw_json_default)
+
+def decode_raw_values(value) -> list:
+    # bytes are zlib-compressed payloads written before values were stored as text
+    if isinstance(value, bytes):
+        value = zlib.decompress(value).decode("utf-8")
+    return json.loads(value)
+
+def raw_header_ids(cur, headers) -> dict:
+    """Map each JSON-encoded header list to its raw_headers id, adding new ones."""
+    ids = {}
+    for header in headers:
+        cur.execute("INSERT OR IGNORE INTO raw_headers (columns) VALUES (?)", (header,))
+        ids[header] = cur.execute("SELECT id FROM raw_headers WHERE columns = ?", (header,)).fetchone()[0]
+    return ids
+
+def raw_payload(row) -> dict:
+    """Rebuild a transaction's original export row from the compact store (or legacy raw_json)."""
+    if row["raw_values"] is not None and row["raw_columns"] is not None:
+        return dict(zip(json.loads(row["raw_columns"]), decode_raw_values(row["raw_values"])))
+    if row["raw_json"]:
+        return json.loads(row["raw_json"])
+    return None
+
+@instrumented("parse_dataframe")
+def parse_dataframe(df: pd.DataFrame, source_file: str, account_hint: str = None, columns: dict = None) -> pd.DataFrame:
+    """
+    Normalise one export (or one chunk of it) into transaction rows.
+    Pass the result of infer_columns() as columns to skip re-inferring per chunk.
+    """
+    columns = columns or infer_columns(df)
+    date_col, desc_col, amt_col = columns["date"], columns["description"], columns["amount"]
+    if amt_col is None:
+        df["__amount"] = pd.to_numeric(df.get(columns["credit"], 0), errors="coerce").fillna(0) - pd.to_numeric(df.get(columns["debit"], 0), errors="coerce").fillna(0)
+        amt_col = "__amount"
 
     out = pd.DataFrame({
         "tx_date": pd.to_datetime(df[date_col], errors="coerce").dt.date.astype("string"),
@@ -290,89 +1492,734 @@ def parse_dataframe(df: pd.DataFrame, source_file: str, account_hint: str = None
     })
     out["source_file"] = os.path.basename(source_file)
     out = out.dropna(subset=["tx_date","amount"])
-    out["hash"] = out.apply(lambda r: sha1(f"{r['tx_date']}|{r['amount']}|{normalise_description(r['description'])}|{r['account']}"), axis=1)
-    out["category"] = out.apply(lambda r: categorise(r["description"], r["amount"]), axis=1)
-    raw_subset = df[df.columns[:40]].astype(object).where(pd.notnull(df), None).to_dict(orient="records")
-    out["raw_json"] = raw_subset[:len(out)]
-    return out[["tx_date","description","amount","account","category","source_file","raw_json","hash"]]
+    norm = normalise_series(out["description"])
+    out["hash"] = hash_keys(out["tx_date"], out["amount"], norm, out["account"])
+    out["legacy_hash"] = legacy_hash_keys(out["tx_date"], out["amount"], norm, out["account"])
+    out["category"] = categorise_series(norm, out["amount"])
+    out["description_norm"] = norm
+    out["merchant_key"] = merchant_key_series(norm)
+    # Raw payload only for rows that survived, so each one lines up with its source row.
+    # The header is shared by the whole chunk; rows keep just their values.
+    raw = df.loc[out.index, df.columns[:RAW_MAX_COLUMNS]]
+    out["raw_columns"] = json.dumps([str(c) for c in raw.columns], ensure_ascii=False)
+    out["raw_values"] = pd.Series(raw.astype(object).where(pd.notnull(raw), None).values.tolist(), index=out.index, dtype=object)
+    return out[["tx_date","description","amount","account","category","source_file","raw_columns","raw_values","hash",
+                "legacy_hash","description_norm","merchant_key"]]
+
+INGEST_CHUNKSIZE = int(os.environ.get("INGEST_CHUNKSIZE", "5000"))
+
+def _iter_xlsx_chunks(f, chunksize: int):
+    """Yield DataFrames of at most chunksize rows from the first sheet, via openpyxl read-only mode."""
+    from openpyxl import load_workbook
+
+    wb = load_workbook(f, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        batch = []
+        for row in rows:
+            batch.append(row[:len(header)])
+            if len(batch) >= chunksize:
+                yield pd.DataFrame.from_records(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=header)
+    finally:
+        wb.close()
+
+def iter_export_chunks(f, filename: str, chunksize: int = None):
+    """Read an uploaded export as a stream of DataFrames, never the whole file at once."""
+    chunksize = chunksize or INGEST_CHUNKSIZE
+    name = filename.lower()
+    if name.endswith(".xlsx"):
+        yield from _iter_xlsx_chunks(f, chunksize)
+    elif name.endswith(".xls"):
+        # Legacy binary workbooks have no streaming reader
+        yield pd.read_excel(f)
+    else:
+        with pd.read_csv(f, chunksize=chunksize) as reader:
+            yield from reader
+
+def parse_export_chunks(f, filename: str, account_hint: str = None, chunksize: int = None):
+    """Yield parsed DataFrames for one export; columns are inferred from the first chunk only."""
+    columns = None
+    for chunk in iter_export_chunks(f, filename, chunksize):
+        if columns is None:
+            columns = infer_columns(chunk)
+        yield parse_dataframe(chunk, filename, account_hint=account_hint, columns=columns)
+
+def write_parsed(parsed: pd.DataFrame, stats: dict) -> dict:
+    """Drop transfers from a parsed chunk, insert the rest and add the counts to stats."""
+    stats["parsed"] += len(parsed)
+    METRICS.inc("budget_rows_parsed_total", len(parsed))
+    parsed, skipped_now = _skip_transfers_df(parsed)
+    stats["skipped_transfers"] += int(skipped_now)
+    inserted_now, duplicates_now = insert_transactions(parsed)
+    stats["inserted"] += inserted_now
+    stats["duplicates"] += duplicates_now
+    return stats
+
+def _new_stats() -> dict:
+    return {"parsed": 0, "inserted": 0, "duplicates": 0, "skipped_transfers": 0}
+
+def ingest_file(f, filename: str, account_hint: str = None, chunksize: int = None, progress=None) -> dict:
+    """
+    Parse, categorise, drop transfers and insert one export chunk by chunk.
+    progress, if given, is called with the running stats after each chunk.
+    """
+    stats = _new_stats()
+    for parsed in parse_export_chunks(f, filename, account_hint, chunksize):
+        write_parsed(parsed, stats)
+        if progress:
+            progress(stats)
+    return stats
+
+# Each parse process costs its interpreter + pandas plus one chunk in flight
+# (the frame read, the parsed frame and the raw payload lists). Unless
+# UPLOAD_WORKERS is set, run one per core but no more than UPLOAD_MEMORY_MB holds.
+UPLOAD_MEMORY_MB = int(os.environ.get("UPLOAD_MEMORY_MB", "1024"))
+PARSE_WORKER_BASE_MB = 100
+PARSE_ROW_KB = 4
+
+def _default_upload_workers() -> int:
+    per_worker_mb = PARSE_WORKER_BASE_MB + INGEST_CHUNKSIZE * PARSE_ROW_KB / 1024
+    return max(1, min(os.cpu_count() or 1, int(UPLOAD_MEMORY_MB // per_worker_mb)))
+
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", "0")) or _default_upload_workers()
+_PARSE_POOL = None
+
+def _parse_pool() -> ProcessPoolExecutor:
+    global _PARSE_POOL
+    if _PARSE_POOL is None:
+        # Never fork this process: request and ingest threads may hold locks
+        # (logging, METRICS) that a forked child would inherit held forever.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        _PARSE_POOL = ProcessPoolExecutor(max_workers=UPLOAD_WORKERS, mp_context=multiprocessing.get_context(method))
+    return _PARSE_POOL
+
+def _parse_file_worker(path: str, filename: str, rules: dict, spool_dir: str, account_hint: str = None,
+                       chunksize: int = None) -> list:
+    """
+    Process-pool entry point: parse one stored export with the caller's rules.
+    Each parsed chunk is spooled to its own pickle under spool_dir as soon as
+    it is ready, so neither this process nor the parent ever holds more than
+    one chunk of the file. Returns the spool paths in order; nothing is
+    written to the DB here.
+    """
+    global RULES
+    RULES = rules
+    paths = []
+    with open(path, "rb") as fh:
+        for i, parsed in enumerate(parse_export_chunks(fh, filename, account_hint, chunksize)):
+            spooled = os.path.join(spool_dir, f"{os.path.basename(path)}.{i:05d}.pkl")
+            parsed.to_pickle(spooled)
+            paths.append(spooled)
+    return paths
+
+def ingest_files(files, account_hint: str = None) -> list:
+    """
+    Ingest several uploaded files. Parsing/categorisation runs across CPU cores
+    in a process pool; every insert happens here, in one thread, so SQLite
+    only ever sees a single writer. A failing file does not stop the others.
+    Returns one result dict per file, in upload order.
+    """
+    names = [f.filename or "upload" for f in files]
+    results = [dict(_new_stats(), file=name, error=None) for name in names]
+
+    if len(files) <= 1 or UPLOAD_WORKERS <= 1:
+        for f, res in zip(files, results):
+            try:
+                ingest_file(f, res["file"], account_hint=account_hint, progress=res.update)
+            except Exception as e:
+                logger.exception("Failed to process %s", res["file"])
+                res["error"] = str(e)
+        return results
+
+    os.makedirs(UPLOADS_DIR, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix="upload_", dir=UPLOADS_DIR)
+    try:
+        futures = {}
+        for i, (f, res) in enumerate(zip(files, results)):
+            path = os.path.join(tmp_dir, f"{i:03d}_{os.path.basename(res['file'])}")
+            f.save(path)
+            futures[_parse_pool().submit(_parse_file_worker, path, res["file"], RULES, tmp_dir, account_hint,
+                                         INGEST_CHUNKSIZE)] = res
+        for fut in as_completed(futures):
+            res = futures[fut]
+            try:
+                for spooled in fut.result():
+                    write_parsed(pd.read_pickle(spooled), res)
+                    os.remove(spooled)
+            except Exception as e:
+                logger.exception("Failed to process %s", res["file"])
+                res["error"] = str(e)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return results
 
+class DedupFilter:
+    """
+    Bloom filter over the hash_key of every stored transaction. A negative
+    answer means the row is certainly new, so overlapping re-uploads only hit
+    SQL for the rows that might be duplicates. False positives (including rows
+    deleted since the filter was built) just fall through to the SQL check.
+    max_id is the highest transaction id the filter has seen.
+    """
+    BITS_PER_KEY = 10
+    HASHES = 7
+
+    def __init__(self, capacity: int):
+        self.capacity = max(int(capacity), 1024)
+        self.n_bits = self.capacity * self.BITS_PER_KEY
+        self.bits = np.zeros((self.n_bits + 7) // 8, dtype=np.uint8)
+        self.count = 0
+        self.max_id = 0
+
+    def _positions(self, keys) -> np.ndarray:
+        # Double hashing over the two 32-bit halves of each key
+        k = np.asarray(keys, dtype=np.int64).view(np.uint64)
+        h1 = k & np.uint64(0xFFFFFFFF)
+        h2 = (k >> np.uint64(32)) | np.uint64(1)
+        i = np.arange(self.HASHES, dtype=np.uint64)
+        return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.n_bits)
+
+    def add(self, keys):
+        if len(keys) == 0:
+            return
+        pos = self._positions(keys).ravel()
+        np.bitwise_or.at(self.bits, (pos >> np.uint64(3)).astype(np.intp), (1 << (pos & np.uint64(7))).astype(np.uint8))
+        self.count += len(keys)
+
+    def might_contain(self, keys) -> np.ndarray:
+        if len(keys) == 0:
+            return np.zeros(0, dtype=bool)
+        pos = self._positions(keys)
+        hit = self.bits[(pos >> np.uint64(3)).astype(np.intp)] & (1 << (pos & np.uint64(7))).astype(np.uint8)
+        return (hit != 0).all(axis=1)
+
+    @property
+    def overfull(self) -> bool:
+        return self.count > self.capacity
+
+_DEDUP_FILTERS = {}
+_DEDUP_LOCK = threading.Lock()
+
+def rebuild_dedup_filter(con=None) -> DedupFilter:
+    """Load every stored hash_key into a fresh filter sized with headroom for growth."""
+    con = con or get_read_db()
+    max_id = con.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+    keys = np.array([hash_key(h) if k is None else k
+                     for k, h in con.execute("SELECT hash_key, hash FROM transactions WHERE id <= ?", (max_id,))],
+                    dtype=np.int64)
+    filt = DedupFilter(capacity=len(keys) * 2)
+    filt.add(keys)
+    filt.max_id = max_id
+    with _DEDUP_LOCK:
+        _DEDUP_FILTERS[DB_PATH] = filt
+    logger.info("Dedup filter built over %s transactions", len(keys))
+    return filt
+
+def dedup_filter(con=None) -> DedupFilter:
+    """
+    This process's filter, first caught up with rows stored since it last
+    looked, whichever process (or raw SQL) wrote them. ids are AUTOINCREMENT,
+    so the rows past max_id are exactly the ones it is missing.
+    """
+    con = con or get_read_db()
+    with _DEDUP_LOCK:
+        filt = _DEDUP_FILTERS.get(DB_PATH)
+    if filt is None or filt.overfull:
+        filt = rebuild_dedup_filter(con)
+    with _DEDUP_LOCK:
+        rows = con.execute("SELECT id, hash_key, hash FROM transactions WHERE id > ? ORDER BY id", (filt.max_id,)).fetchall()
+        if rows:
+            filt.add(np.array([hash_key(h) if k is None else k for _, k, h in rows], dtype=np.int64))
+            filt.max_id = rows[-1][0]
+    return filt
+
+def existing_hashes(cur, hashes) -> set:
+    """
+    Return the subset of hashes already stored. hashes may be a dict of
+    hash -> hash_key when the caller already has the keys. Hashes the dedup
+    filter rules out are never looked up; the rest go through one batched
+    lookup, which also matches rows still waiting for their hash_key.
+    """
+    if not hashes:
+        return set()
+    keyed = hashes if isinstance(hashes, dict) else {h: hash_key(h) for h in hashes}
+    maybe = dedup_filter(cur).might_contain(np.fromiter(keyed.values(), dtype=np.int64, count=len(keyed)))
+    if not maybe.any():
+        return set()
+    candidates = [h for h, hit in zip(keyed, maybe.tolist()) if hit]
+    cur.execute(
+        """
+        SELECT hash FROM transactions
+        WHERE hash_key IN (SELECT value FROM json_each(?))
+           OR (hash_key IS NULL AND hash IN (SELECT value FROM json_each(?)))
+        """,
+        (json.dumps([keyed[h] for h in candidates]), json.dumps(candidates)),
+    )
+    return {row[0] for row in cur.fetchall()} & keyed.keys()
+
+@instrumented("insert_transactions")
 def insert_transactions(df: pd.DataFrame):
-    if df.empty: return 0
-    tuples = [(
-        str(r.tx_date), r.description, float(r.amount), r.account, r.category, r.source_file, json.dumps(r.raw_json), r.hash, 0
-    ) for r in df.itertuples(index=False)]
-    with get_db() as con:
+    """
+    Bulk insert parsed transactions.
+    Hashes already in the DB (or repeated within df) are filtered out with one
+    lookup, the rest go through executemany in a single transaction.
+    Returns (inserted, duplicates).
+    """
+    if df.empty: return 0, 0
+    hashes, legacy = df["hash"].tolist(), df["legacy_hash"].tolist()
+    keys = {h: hash_key(h) for h in hashes}
+    keys.update((h, hash_key(h)) for h in legacy if h)
+    with db_writer() as con:
         cur = con.cursor()
-        inserted = 0
-        for t in tuples:
-            try:
-                cur.execute("""
-                    INSERT INTO transactions (tx_date, description, amount, account, category, source_file, raw_json, hash, hidden)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, t)
-                inserted += 1
-            except sqlite3.IntegrityError:
+        # Take the write lock before the lookup so the duplicate check stays valid
+        cur.execute("BEGIN IMMEDIATE")
+        seen = existing_hashes(cur, keys)
+        keep = []
+        for i, (h, old) in enumerate(zip(hashes, legacy)):
+            if h in seen or old in seen:
                 continue
+            seen.add(h)
+            keep.append(i)
+        # Only the rows that will actually be written are built and encoded
+        rows = df if len(keep) == len(df) else df.iloc[keep]
+        header_ids = raw_header_ids(cur, rows["raw_columns"].unique()) if keep else {}
+        fresh = [(
+            str(r.tx_date), r.description, float(r.amount), r.account, r.category, r.source_file,
+            header_ids[r.raw_columns], encode_raw_values(r.raw_values), r.hash, keys[r.hash], 0,
+            r.description_norm, r.merchant_key
+        ) for r in rows.itertuples(index=False)]
+        bulk_fts = bool(fresh) and _FTS_READY.get(DB_PATH)
+        if bulk_fts:
+            last_id = cur.execute("SELECT COALESCE(MAX(id), 0) FROM transactions").fetchone()[0]
+            cur.execute("UPDATE app_meta SET value = 1 WHERE key = 'fts_bulk_insert'")
+        cur.executemany("""
+            INSERT OR IGNORE INTO transactions (tx_date, description, amount, account, category, source_file, raw_header_id, raw_values,
+                                                hash, hash_key, hidden, description_norm, merchant_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, fresh)
+        # rowcount counts the INSERTs themselves; total_changes would also count trigger writes
+        inserted = cur.rowcount if fresh else 0
+        if bulk_fts:
+            # ids are AUTOINCREMENT, so the batch is exactly the rows past last_id
+            cur.execute("INSERT INTO transactions_fts (rowid, description) SELECT id, description FROM transactions WHERE id > ?",
+                        (last_id,))
+            cur.execute("UPDATE app_meta SET value = 0 WHERE key = 'fts_bulk_insert'")
+        con.commit()
+    METRICS.inc("budget_rows_inserted_total", inserted)
+    METRICS.inc("budget_rows_duplicate_total", len(df) - inserted)
+    return inserted, len(df) - inserted
+
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+_INGEST_EXECUTOR = None
+
+def _ingest_executor() -> ThreadPoolExecutor:
+    global _INGEST_EXECUTOR
+    if _INGEST_EXECUTOR is None:
+        _INGEST_EXECUTOR = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+    return _INGEST_EXECUTOR
+
+def create_ingest_job(files) -> str:
+    """Store uploaded files under UPLOADS_DIR and record a queued job. Returns the job id."""
+    job_id = uuid.uuid4().hex
+    job_dir = os.path.join(UPLOADS_DIR, job_id)
+    os.makedirs(job_dir, exist_ok=True)
+    stored = []
+    for i, f in enumerate(files):
+        name = f.filename or "upload"
+        path = os.path.join(job_dir, f"{i:03d}_{os.path.basename(name)}")
+        f.save(path)
+        stored.append({"name": name, "path": path})
+    with db_writer() as con:
+        con.execute("INSERT INTO ingest_jobs (id, status, files) VALUES (?, 'queued', ?)", (job_id, json.dumps(stored)))
+        con.commit()
+    return job_id
+
+def _update_job(job_id: str, **fields):
+    """Record job fields; every update also renews the running worker's lease."""
+    cols = ", ".join(f"{k} = ?" for k in fields)
+    with db_writer() as con:
+        con.execute(f"UPDATE ingest_jobs SET {cols}, updated_at = datetime('now'), heartbeat = datetime('now') WHERE id = ?",
+                    (*fields.values(), job_id))
         con.commit()
-    return inserted
 
-@app.get("/health")
+# A running job whose owner has not written progress for this long is
+# presumed dead and may be taken over.
+JOB_LEASE_SECONDS = int(os.environ.get("INGEST_JOB_LEASE_SECONDS", "300"))
+
+def job_owner() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _lease_expired_sql() -> tuple:
+    return ("status = 'running' AND COALESCE(heartbeat, updated_at) < datetime('now', ?)",
+            (f"-{JOB_LEASE_SECONDS} seconds",))
+
+def claim_ingest_job(job_id: str) -> bool:
+    """
+    Atomically take a queued job, or a running one whose lease has expired.
+    Every worker may try; only the one whose UPDATE matched runs the job.
+    """
+    expired, params = _lease_expired_sql()
+    with db_writer() as con:
+        cur = con.execute(f"""
+            UPDATE ingest_jobs SET status = 'running', owner = ?, heartbeat = datetime('now'), updated_at = datetime('now')
+            WHERE id = ? AND (status = 'queued' OR ({expired}))
+        """, (job_owner(), job_id, *params))
+        return cur.rowcount == 1
+
+def run_ingest_job(job_id: str):
+    """Worker body: claim the job, then ingest every stored file, recording progress after each chunk."""
+    if not claim_ingest_job(job_id):
+        logger.info("Ingest job %s is missing or owned by another worker", job_id)
+        return
+    with get_read_db() as con:
+        row = con.execute("SELECT files FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+    files = json.loads(row["files"])
+    refresh_rules()
+    totals = {"rows_parsed": 0, "inserted": 0, "duplicates": 0, "skipped_transfers": 0}
+    errors = []
+    _update_job(job_id, errors="[]", **totals)
+
+    for entry in files:
+        done = dict(totals)
+
+        def progress(stats, done=done):
+            totals.update({
+                "rows_parsed": done["rows_parsed"] + stats["parsed"],
+                "inserted": done["inserted"] + stats["inserted"],
+                "duplicates": done["duplicates"] + stats["duplicates"],
+                "skipped_transfers": done["skipped_transfers"] + stats["skipped_transfers"],
+            })
+            _update_job(job_id, **totals)
+
+        try:
+            with open(entry["path"], "rb") as fh:
+                ingest_file(fh, entry["name"], account_hint=None, progress=progress)
+            logger.info("Job %s processed %s", job_id, entry["name"])
+        except Exception as e:
+            logger.exception("Job %s failed to process %s", job_id, entry["name"])
+            errors.append({"file": entry["name"], "error": str(e)})
+            _update_job(job_id, errors=json.dumps(errors))
+
+    status = "failed" if errors and len(errors) == len(files) else "done"
+    _update_job(job_id, status=status, errors=json.dumps(errors), **totals)
+    shutil.rmtree(os.path.join(UPLOADS_DIR, job_id), ignore_errors=True)
+    refresh_snapshot_quietly()
+
+def submit_ingest_job(job_id: str):
+    _ingest_executor().submit(run_ingest_job, job_id)
+
+def resume_ingest_jobs():
+    """
+    Submit jobs left queued, or running under an expired lease, by a restart.
+    Every worker calls this; claim_ingest_job lets only one of them run each
+    job. Re-ingesting a half-done job is safe thanks to hash dedup.
+    """
+    expired, params = _lease_expired_sql()
+    with get_read_db() as con:
+        rows = con.execute(f"SELECT id FROM ingest_jobs WHERE status = 'queued' OR ({expired})", params).fetchall()
+    for row in rows:
+        logger.info("Resuming ingest job %s", row["id"])
+        submit_ingest_job(row["id"])
+
+def job_status(job_id: str):
+    with get_read_db() as con:
+        row = con.execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    return {
+        "id": row["id"],
+        "status": row["status"],
+        "files": [f["name"] for f in json.loads(row["files"])],
+        "rows_parsed": row["rows_parsed"],
+        "inserted": row["inserted"],
+        "duplicates": row["duplicates"],
+        "skipped_transfers": row["skipped_transfers"],
+        "errors": json.loads(row["errors"] or "[]"),
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+    }
+
+SNAPSHOT_COLUMNS = ["id", "tx_date", "description", "amount", "account", "category", "source_file", "hash", "hidden"]
+_SNAPSHOT_LOCK = threading.Lock()
+
+def snapshot_dir() -> str:
+    """Columnar snapshot lives next to the DB file: <db name>_snapshot/<YYYY-MM>.arrow"""
+    return os.path.splitext(DB_PATH)[0] + "_snapshot"
+
+def _month_fingerprints(con) -> dict:
+    """
+    Per-month fingerprint of the rollup rows plus the month's row count,
+    highest id and latest updated_at. Rollups catch inserts, deletes,
+    relabels and hide/unhide; the transaction stats catch edits that leave
+    the totals alone (descriptions, accounts, swapped rows). ids are
+    AUTOINCREMENT, so a delete followed by an insert still moves MAX(id).
+    """
+    months = {}
+    rows = con.execute("""
+        SELECT tx_day, category, hidden, amount_cents, tx_count FROM daily_category_totals
+        ORDER BY tx_day, category, hidden
+    """).fetchall()
+    for row in rows:
+        months.setdefault(row[0][:7], []).append("|".join(str(v) for v in row))
+    stats = con.execute("""
+        SELECT substr(tx_date, 1, 7) AS month, COUNT(*), MAX(id), MAX(updated_at) FROM transactions
+        GROUP BY month
+    """).fetchall()
+    for row in stats:
+        months.setdefault(row[0], []).append("|".join(str(v) for v in row))
+    return {m: sha1("\n".join(parts)) for m, parts in months.items()}
+
+def _read_manifest(path: str) -> dict:
+    try:
+        with open(os.path.join(path, "manifest.json"), "r") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {"months": {}}
+
+def refresh_snapshot() -> dict:
+    """
+    Bring the Arrow IPC snapshot up to date, rewriting only months whose
+    fingerprint changed and dropping months that no longer have rows.
+    Returns {"written": [...], "removed": [...]}.
+    """
+    import pyarrow as pa
+
+    out_dir = snapshot_dir()
+    with _SNAPSHOT_LOCK:
+        os.makedirs(out_dir, exist_ok=True)
+        manifest = _read_manifest(out_dir)
+        con = get_read_db()
+        current = _month_fingerprints(con)
+        written, removed = [], []
+        for month, fp in sorted(current.items()):
+            path = os.path.join(out_dir, f"{month}.arrow")
+            if manifest["months"].get(month) == fp and os.path.exists(path):
+                continue
+            df = pd.read_sql_query(
+                f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM transactions WHERE tx_date BETWEEN ? AND ? ORDER BY tx_date, id",
+                con, params=(f"{month}-01", f"{month}-31"))
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            tmp = path + ".tmp"
+            with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp, path)
+            manifest["months"][month] = fp
+            written.append(month)
+        for month in sorted(set(manifest["months"]) - set(current)):
+            try:
+                os.remove(os.path.join(out_dir, f"{month}.arrow"))
+            except FileNotFoundError:
+                pass
+            del manifest["months"][month]
+            removed.append(month)
+        if written or removed:
+            tmp = os.path.join(out_dir, "manifest.json.tmp")
+            with open(tmp, "w") as fh:
+                json.dump(manifest, fh)
+            os.replace(tmp, os.path.join(out_dir, "manifest.json"))
+    if written or removed:
+        logger.info("Snapshot refreshed: wrote %s, removed %s", written, removed)
+    return {"written": written, "removed": removed}
+
+def read_snapshot(start=None, end=None, columns=None):
+    """
+    Load transactions from the snapshot as an Arrow table. Only the month
+    partitions overlapping [start, end] and only the requested columns are
+    read, via memory-mapped files.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns = columns or SNAPSHOT_COLUMNS
+    first = str(start)[:7] if start else None
+    last = str(end)[:7] if end else None
+    tables = []
+    for month in sorted(_read_manifest(snapshot_dir())["months"]):
+        if (first and month < first) or (last and month > last):
+            continue
+        with pa.memory_map(os.path.join(snapshot_dir(), f"{month}.arrow"), "r") as source:
+            tables.append(pa.ipc.open_file(source).read_all().select(columns + (["tx_date"] if "tx_date" not in columns else [])))
+    if not tables:
+        schema_src = pd.DataFrame({c: pd.Series(dtype="object") for c in columns})
+        return pa.Table.from_pandas(schema_src, preserve_index=False)
+    table = pa.concat_tables(tables)
+    if start:
+        table = table.filter(pc.greater_equal(table["tx_date"], str(start)))
+    if end:
+        table = table.filter(pc.less_equal(table["tx_date"], str(end)))
+    return table.select(columns)
+
+def refresh_snapshot_quietly():
+    """Post-ingest hook: a missing pyarrow or a failed refresh must not fail the upload."""
+    try:
+        refresh_snapshot()
+    except ImportError:
+        pass
+    except Exception as e:
+        logger.exception("Snapshot refresh failed: %s", e)
+
+class ResponseCache:
+    """Small thread-safe LRU of serialised responses."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+RESPONSE_CACHE = ResponseCache(int(os.environ.get("RESPONSE_CACHE_SIZE", "256")))
+
+def _normalised_args() -> tuple:
+    return tuple(sorted((k, v.strip()) for k, v in request.args.items(multi=True) if v.strip()))
+
+def cached_response(view):
+    """
+    Cache a read endpoint's JSON on (endpoint, normalised query, data generation).
+    Any committed write bumps the generation, so stale entries are never served.
+    The same key doubles as the ETag, so If-None-Match gets a 304 before the
+    view (or the cache) is touched.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        # default_range() depends on today's date, so it is part of the key
+        key = (DB_PATH, request.endpoint, _normalised_args(), data_generation(), str(datetime.utcnow().date()))
+        etag = sha1(repr(key))
+        if etag in request.if_none_match:
+            resp = make_response("", 304)
+            resp.set_etag(etag)
+            return resp
+        entry = RESPONSE_CACHE.get(key)
+        if entry is None:
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200:
+                return resp
+            entry = (resp.get_data(), resp.mimetype)
+            RESPONSE_CACHE.put(key, entry)
+        body, mimetype = entry
+        resp = current_app.response_class(body, status=200, mimetype=mimetype)
+        resp.set_etag(etag)
+        return resp
+    return wrapper
+
+@bp.get("/health")
 def health():
     return {"ok": True, "version": APP_VERSION}
 
-@app.get("/")
+@bp.get("/")
 def index():
     return render_template("index.html", app_version=APP_VERSION)
 
-@app.post("/upload")
+@bp.post("/upload")
 def upload():
     if "files" not in request.files:
         return jsonify({"error":"No files part"}), 400
     files = request.files.getlist("files")
-    total_inserted = 0
-    total_skipped = 0
-    for f in files:
-        filename = f.filename or "upload"
-        try:
-            if filename.lower().endswith(".csv"):
-                df = pd.read_csv(f)
-            elif filename.lower().endswith((".xls",".xlsx")):
-                df = pd.read_excel(f)
-            else:
-                df = pd.read_csv(f)
-    
-            parsed = parse_dataframe(df, filename, account_hint=None)
-    
-            # NEW: drop transfers
-            parsed, skipped_now = _skip_transfers_df(parsed)
-            total_skipped += int(skipped_now)
-    
-            # Save using existing helper (supports various codebases)
-            inserted_now = 0
-            if "insert_transactions" in globals():
-                res = insert_transactions(parsed)
-                inserted_now = res[0] if isinstance(res, tuple) else int(res)
-            elif "save_dataframe" in globals():
-                inserted_now = int(save_dataframe(parsed))
+    if request.values.get("async", "").lower() in ("1", "true", "yes"):
+        job_id = create_ingest_job(files)
+        submit_ingest_job(job_id)
+        return jsonify({"status": "queued", "job_id": job_id, "status_url": f"/api/jobs/{job_id}"}), 202
+    results = ingest_files(files, account_hint=None)
+    if any(r["inserted"] for r in results):
+        refresh_snapshot_quietly()
+    for res in results:
+        if res["error"] is None:
+            logger.info("Processed %s; parsed=%s inserted=%s duplicates=%s skipped_transfers=%s",
+                        res["file"], res["parsed"], res["inserted"], res["duplicates"], res["skipped_transfers"])
+    errors = [{"file": r["file"], "error": r["error"]} for r in results if r["error"] is not None]
+    if errors and len(errors) == len(results):
+        first = errors[0]
+        return jsonify({"error": f"Failed to process {first['file']}: {first['error']}", "errors": errors, "files": results}), 400
+
+    return jsonify({
+        "status": "ok",
+        "inserted": sum(r["inserted"] for r in results),
+        "duplicates": sum(r["duplicates"] for r in results),
+        "skipped_transfers": sum(r["skipped_transfers"] for r in results),
+        "errors": errors,
+        "files": results,
+    })
+
+def preview_file(f, filename: str) -> dict:
+    """Dry run of ingest_file: count new vs duplicate rows without writing."""
+    stats = {"parsed": 0, "new": 0, "duplicates": 0, "skipped_transfers": 0}
+    seen = set()
+    con = get_read_db()
+    for parsed in parse_export_chunks(f, filename):
+        stats["parsed"] += len(parsed)
+        parsed, skipped_now = _skip_transfers_df(parsed)
+        stats["skipped_transfers"] += int(skipped_now)
+        hashes, legacy = parsed["hash"].tolist(), parsed["legacy_hash"].tolist()
+        seen |= existing_hashes(con.cursor(), (set(hashes) | {h for h in legacy if h}) - seen)
+        for h, old in zip(hashes, legacy):
+            if h in seen or old in seen:
+                stats["duplicates"] += 1
             else:
-                # fallback generic insert
-                con = get_db()
-                cur = con.cursor()
-                for r in parsed.to_dict(orient="records"):
-                    cur.execute("INSERT OR IGNORE INTO transactions (tx_date, description, amount, account, category, source_file) VALUES (?, ?, ?, ?, ?, ?)",
-                                (r.get("tx_date"), r.get("description"), float(r.get("amount",0) or 0), r.get("account"), r.get("category"), r.get("source_file")))
-                inserted_now = cur.rowcount or 0
-                con.commit()
-                con.close()
-    
-            total_inserted += int(inserted_now)
-            logger.info("Processed %s; inserted=%s skipped_transfers=%s", filename, inserted_now, skipped_now)
+                stats["new"] += 1
+                seen.add(h)
+    return stats
+
+@bp.post("/api/upload/preview")
+def api_upload_preview():
+    """Report how many rows of each uploaded file would be inserted vs skipped as duplicates."""
+    if "files" not in request.files:
+        return jsonify({"error": "No files part"}), 400
+    results = []
+    for f in request.files.getlist("files"):
+        name = f.filename or "upload"
+        try:
+            results.append(dict(preview_file(f, name), file=name, error=None))
         except Exception as e:
-            logger.exception("Failed to process %s", filename)
-            return jsonify({"error": f"Failed to process {filename}: {e}"}), 400
-    
-    return jsonify({"status":"ok","inserted": total_inserted, "skipped_transfers": total_skipped})
-    
+            logger.exception("Preview failed for %s", name)
+            results.append({"file": name, "error": str(e)})
+    ok = [r for r in results if r["error"] is None]
+    return jsonify({
+        "new": sum(r["new"] for r in ok),
+        "duplicates": sum(r["duplicates"] for r in ok),
+        "skipped_transfers": sum(r["skipped_transfers"] for r in ok),
+        "files": results,
+    })
+
+@bp.get("/api/jobs/<job_id>")
+def api_job(job_id):
+    status = job_status(job_id)
+    if status is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(status)
+
+@bp.get("/metrics")
+def metrics():
+    """Prometheus text exposition of METRICS for this worker."""
+    resp = make_response(METRICS.render())
+    resp.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    return resp
 
 def parse_date(s, default=None):
     try:
@@ -388,48 +2235,80 @@ def default_range():
 
 EXCLUDE_FOR_ANALYTICS = {"Income", "Transfer"}
 
-@app.get("/api/summary")
+@bp.get("/api/summary")
+@cached_response
 def api_summary():
+    """
+    Dashboard summary. Category and weekly figures come from the
+    daily_category_totals rollup; only the 500-row table reads transactions.
+    """
     start_str = request.args.get("start")
     end_str = request.args.get("end")
     start, end = default_range()
     if start_str: start = parse_date(start_str, start)
     if end_str: end = parse_date(end_str, end)
-    with get_db() as con:
-        df_all = pd.read_sql_query("""
-            SELECT tx_date, description, amount, account, category, hash, hidden FROM transactions
-            WHERE date(tx_date) BETWEEN date(?) AND date(?)
-        """, con, params=(str(start), str(end)))
-    if df_all.empty:
-        return jsonify({"categories": [], "weekly": {}, "hist": [], "transactions": [], "meta": {"start": str(start), "end": str(end)}})
-
-    # Transactions for table (include everything)
-    df_all["tx_date"] = pd.to_datetime(df_all["tx_date"])
-    df_sorted = df_all.sort_values("tx_date", ascending=False).head(500)
-    transactions = df_sorted.to_dict(orient="records")
-
-    # Analytics should ignore Income & Transfer and hidden transactions
-    df = df_all[(~df_all["category"].isin(EXCLUDE_FOR_ANALYTICS)) & (df_all["hidden"] == 0)].copy()
-
-    if df.empty:
+    excluded = sorted(EXCLUDE_FOR_ANALYTICS)
+    analytics_where = f"""
+        tx_day BETWEEN ? AND ? AND hidden = 0
+        AND category NOT IN ({",".join("?" * len(excluded))})
+    """
+    analytics_params = (str(start), str(end), *excluded)
+    with get_read_db() as con:
+        cur = con.cursor()
+        cur.execute("""
+            SELECT COALESCE(SUM(tx_count), 0) FROM daily_category_totals
+            WHERE tx_day BETWEEN ? AND ?
+        """, (str(start), str(end)))
+        in_range = cur.fetchone()[0]
+        if not in_range:
+            return jsonify({"categories": [], "weekly": {}, "hist": [], "transactions": [], "meta": {"start": str(start), "end": str(end)}})
+
+        # Transactions for table (include everything)
+        df_tx, tx_next_cursor = transactions_page(con, start, end, 500, show_hidden=True)
+
+        cur.execute("""
+            SELECT DISTINCT category FROM daily_category_totals
+            WHERE tx_day BETWEEN ? AND ? AND category != ''
+            ORDER BY category
+        """, (str(start), str(end)))
+        categories = [r[0] for r in cur.fetchall()]
+
+        # Analytics should ignore Income & Transfer and hidden transactions
+        cur.execute(f"""
+            SELECT category, SUM(amount_cents) FROM daily_category_totals
+            WHERE {analytics_where} AND category != ''
+            GROUP BY category
+        """, analytics_params)
+        cat_rows = cur.fetchall()
+        cur.execute(f"""
+            SELECT week_start, SUM(amount_cents) FROM daily_category_totals
+            WHERE {analytics_where}
+            GROUP BY week_start
+            ORDER BY week_start
+        """, analytics_params)
+        week_rows = cur.fetchall()
+
+    df_tx["tx_date"] = pd.to_datetime(df_tx["tx_date"])
+    transactions = df_tx.to_dict(orient="records")
+
+    if not week_rows:
         cat_list = []
         weekly_points = []
         hist = []
-        categories = sorted([c for c in df_all["category"].dropna().unique()])
         return jsonify({
             "categories_breakdown": cat_list,
             "weekly": {"points": weekly_points, "stats": {"avg": 0.0, "min": 0.0, "max": 0.0, "mode_nearest_thousand": 0.0}},
             "hist": hist,
             "transactions": transactions,
+            "transactions_next_cursor": tx_next_cursor,
             "filters": {"categories": categories},
             "meta": {"start": str(start), "end": str(end), "app_version": APP_VERSION}
         })
 
-    cat = df.groupby("category")["amount"].sum().sort_values(ascending=False).reset_index()
-    cat_list = [{"category": c, "amount": float(a)} for c, a in zip(cat["category"], cat["amount"])]
+    cat_rows.sort(key=lambda r: r[1], reverse=True)
+    cat_list = [{"category": c, "amount": cents / 100.0} for c, cents in cat_rows]
 
-    df["week"] = df["tx_date"].dt.to_period("W").apply(lambda r: r.start_time.date())
-    weekly = df.groupby("week")["amount"].sum().reset_index()
+    weekly = pd.DataFrame({"week": [w for w, _ in week_rows], "amount": [cents / 100.0 for _, cents in week_rows]})
     spend_series = weekly["amount"].apply(lambda x: -x if x < 0 else 0.0)
     if spend_series.empty:
         avg = mn = mx = mode = 0.0
@@ -448,8 +2327,6 @@ def api_summary():
         hist_counts, bin_edges = np.histogram(spend_series, bins=np.arange(0, max(250.0, spend_series.max()+250), 250.0))
         hist = [{"bin_from": float(bin_edges[i]), "bin_to": float(bin_edges[i+1]), "count": int(hist_counts[i])} for i in range(len(hist_counts))]
 
-    categories = sorted([c for c in df_all["category"].dropna().unique()])
-
     return jsonify({
         "categories_breakdown": cat_list,
         "weekly": {
@@ -458,12 +2335,254 @@ def api_summary():
         },
         "hist": hist,
         "transactions": transactions,
+        "transactions_next_cursor": tx_next_cursor,
         "filters": {"categories": categories},
         "meta": {"start": str(start), "end": str(end), "app_version": APP_VERSION}
     })
 
-@app.get("/api/transactions")
+TREND_WINDOWS = (4, 13, 52)
+TREND_PERCENTILES = (10, 25, 50, 75, 90)
+
+def _months_before(d, n):
+    """First day of the month n months before d's month."""
+    idx = d.year * 12 + d.month - 1 - n
+    return date(idx // 12, idx % 12 + 1, 1)
+
+def _pct_change(cents, prev):
+    if prev is None:
+        return None, None
+    delta = (cents - prev) / 100.0
+    return delta, (round(delta * 100.0 / abs(prev / 100.0), 1) if prev else None)
+
+def trends_report(con, start, end, category=None):
+    """
+    Month-over-month and year-over-year deltas per category, rolling weekly
+    spend averages and weekly spend percentiles, all computed by SQLite window
+    functions over daily_category_totals. Months and weeks are laid out on a
+    dense grid (recursive CTE) so LAG and ROWS frames count calendar periods,
+    not just periods with data. Like /api/summary, hidden rows and
+    EXCLUDE_FOR_ANALYTICS categories are ignored.
+    """
+    excluded = sorted(EXCLUDE_FOR_ANALYTICS)
+    where = f"hidden = 0 AND category != '' AND category NOT IN ({','.join('?' * len(excluded))})"
+    where_params = list(excluded)
+    if category:
+        where += " AND category = ?"
+        where_params.append(category)
+    cur = con.cursor()
+    cur.execute(f"SELECT MIN(tx_day) FROM daily_category_totals WHERE {where}", where_params)
+    first_day = parse_date(cur.fetchone()[0] or "")
+    meta = {"start": str(start), "end": str(end), "category": category or None, "windows": list(TREND_WINDOWS)}
+    if first_day is None or first_day > end:
+        return {"months": [], "weeks": [], "percentiles": {}, "meta": meta}
+
+    # Months: the year before start's month feeds LAG(12); earlier than the
+    # first month with data there is no comparison, so those LAGs are NULL.
+    month_start = start.replace(day=1)
+    first_month = str(first_day.replace(day=1))
+    cur.execute(f"""
+        WITH RECURSIVE months(m) AS (
+            SELECT ? UNION ALL SELECT date(m, '+1 month') FROM months WHERE m < ?
+        ),
+        totals AS (
+            SELECT substr(tx_day, 1, 7) || '-01' AS m, category, SUM(amount_cents) AS cents
+            FROM daily_category_totals
+            WHERE tx_day BETWEEN ? AND ? AND {where}
+            GROUP BY 1, 2
+        ),
+        grid AS (
+            SELECT months.m, cats.category, COALESCE(totals.cents, 0) AS cents
+            FROM months
+            CROSS JOIN (SELECT DISTINCT category FROM totals) AS cats
+            LEFT JOIN totals ON totals.m = months.m AND totals.category = cats.category
+        ),
+        lagged AS (
+            SELECT m, category, cents,
+                   CASE WHEN LAG(m, 1) OVER w >= ? THEN LAG(cents, 1) OVER w END AS prev_month,
+                   CASE WHEN LAG(m, 12) OVER w >= ? THEN LAG(cents, 12) OVER w END AS prev_year
+            FROM grid
+            WINDOW w AS (PARTITION BY category ORDER BY m)
+        )
+        SELECT m, category, cents, prev_month, prev_year FROM lagged
+        WHERE m >= ? AND (cents != 0 OR COALESCE(prev_month, 0) != 0 OR COALESCE(prev_year, 0) != 0)
+        ORDER BY m, category
+    """, (str(_months_before(start, 12)), str(end.replace(day=1)), str(_months_before(start, 12)), str(end),
+          *where_params, first_month, first_month, str(month_start)))
+    months = []
+    for m, cat, cents, prev_month, prev_year in cur.fetchall():
+        mom_delta, mom_pct = _pct_change(cents, prev_month)
+        yoy_delta, yoy_pct = _pct_change(cents, prev_year)
+        months.append({
+            "month": m[:7], "category": cat, "amount": cents / 100.0,
+            "prev_month": None if prev_month is None else prev_month / 100.0, "mom_delta": mom_delta, "mom_pct": mom_pct,
+            "prev_year": None if prev_year is None else prev_year / 100.0, "yoy_delta": yoy_delta, "yoy_pct": yoy_pct,
+        })
+
+    # Weeks (Monday starts, as in the rollup): windows reach back up to 51
+    # weeks before start but never before the first week with data, so early
+    # windows average the weeks that exist rather than padding with zeros.
+    start_week = start - timedelta(days=start.weekday())
+    end_week = end - timedelta(days=end.weekday())
+    grid_start = max(start_week - timedelta(weeks=max(TREND_WINDOWS) - 1), first_day - timedelta(days=first_day.weekday()))
+    rolling = ",\n                   ".join(
+        f"AVG(spend) OVER (ORDER BY w ROWS {n - 1} PRECEDING) AS avg_{n}" for n in TREND_WINDOWS
+    )
+    cur.execute(f"""
+        WITH RECURSIVE weeks(w) AS (
+            SELECT ? UNION ALL SELECT date(w, '+7 days') FROM weeks WHERE w < ?
+        ),
+        totals AS (
+            SELECT week_start AS w, SUM(amount_cents) AS cents
+            FROM daily_category_totals
+            WHERE tx_day BETWEEN ? AND ? AND {where}
+            GROUP BY week_start
+        ),
+        spend AS (
+            SELECT weeks.w, COALESCE(totals.cents, 0) AS cents,
+                   MAX(-COALESCE(totals.cents, 0), 0) AS spend
+            FROM weeks LEFT JOIN totals ON totals.w = weeks.w
+        ),
+        rolled AS (
+            SELECT w, cents, spend,
+                   {rolling}
+            FROM spend
+        )
+        SELECT * FROM rolled WHERE w >= ? ORDER BY w
+    """, (str(grid_start), str(end_week), str(grid_start), str(end), *where_params, str(start_week)))
+    weeks = [
+        {"week": row[0], "amount": row[1] / 100.0, "spend": row[2] / 100.0,
+         **{f"avg_{n}w": round(v / 100.0, 2) for n, v in zip(TREND_WINDOWS, row[3:])}}
+        for row in cur.fetchall()
+    ]
+
+    # Nearest-rank percentiles of weekly spend over the same weeks as above
+    picks = ",\n               ".join(f"MIN(CASE WHEN cd >= {p / 100.0} THEN spend END)" for p in TREND_PERCENTILES)
+    cur.execute(f"""
+        WITH RECURSIVE weeks(w) AS (
+            SELECT ? UNION ALL SELECT date(w, '+7 days') FROM weeks WHERE w < ?
+        ),
+        totals AS (
+            SELECT week_start AS w, SUM(amount_cents) AS cents
+            FROM daily_category_totals
+            WHERE tx_day BETWEEN ? AND ? AND {where}
+            GROUP BY week_start
+        ),
+        ranked AS (
+            SELECT MAX(-COALESCE(totals.cents, 0), 0) AS spend,
+                   CUME_DIST() OVER (ORDER BY MAX(-COALESCE(totals.cents, 0), 0)) AS cd
+            FROM weeks LEFT JOIN totals ON totals.w = weeks.w
+        )
+        SELECT {picks} FROM ranked
+    """, (str(start_week), str(end_week), str(start_week), str(end), *where_params))
+    percentiles = {f"p{p}": (v or 0) / 100.0 for p, v in zip(TREND_PERCENTILES, cur.fetchone())}
+    return {"months": months, "weeks": weeks, "percentiles": percentiles, "meta": meta}
+
+@bp.get("/api/trends")
+@cached_response
+def api_trends():
+    """
+    Per-category month-over-month / year-over-year deltas, rolling 4/13/52-week
+    spend averages and weekly spend percentiles for start..end (optional category).
+    """
+    start, end = default_range()
+    start = parse_date(request.args.get("start", ""), start)
+    end = parse_date(request.args.get("end", ""), end)
+    if start > end:
+        return jsonify({"error": "start must be on or before end"}), 400
+    try:
+        with get_read_db() as con:
+            return jsonify(trends_report(con, start, end, category=request.args.get("category") or None))
+    except Exception as e:
+        logger.exception("trends failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+SORT_COLUMNS = {"date": "tx_date", "amount": "amount"}
+
+def transactions_query(start, end, category=None, show_hidden=False, limit=500, sort="date", order="desc", after=None, search=None):
+    """
+    SQL + params for a date-range listing, newest first by default.
+    tx_date is compared bare (it is stored as ISO text) so idx_tx_date,
+    idx_tx_hidden_date or idx_tx_category_date can serve the range.
+    after=(sort value, id) continues a keyset page from that row.
+    """
+    col = SORT_COLUMNS[sort]
+    direction = "DESC" if order == "desc" else "ASC"
+    start, end = str(start), str(end)
+    if after is not None and sort == "date":
+        # Narrow the indexed range to the cursor so deep pages seek, not skip
+        if direction == "DESC":
+            end = min(end, after[0])
+        else:
+            start = max(start, after[0])
+    q = """
+        SELECT id, tx_date, description, amount, account, category, hash, hidden
+        FROM transactions
+        WHERE tx_date BETWEEN ? AND ?
+    """
+    params = [start, end]
+    if category:
+        q += " AND category = ?"
+        params.append(category)
+    if not show_hidden:
+        # With a category the (category, tx_date) index is the selective one; the
+        # unary + keeps the planner from picking (hidden, tx_date) instead
+        q += " AND +hidden = 0" if category else " AND hidden = 0"
+    if search:
+        escaped = search.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        q += " AND lower(description) LIKE ? ESCAPE '\\'"
+        params.append(f"%{escaped}%")
+    if after is not None:
+        q += f" AND ({col}, id) {'<' if direction == 'DESC' else '>'} (?, ?)"
+        params.extend(after)
+    q += f" ORDER BY {col} {direction}, id {direction} LIMIT {int(limit)}"
+    return q, params
+
+def encode_cursor(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data, separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(data, dict) or not {"s", "o", "v", "id"} <= set(data):
+            raise ValueError
+        # v and id are bound straight into the keyset comparison
+        if isinstance(data["v"], bool) or not isinstance(data["v"], (str, int, float)):
+            raise ValueError
+        if isinstance(data["id"], bool) or not isinstance(data["id"], int):
+            raise ValueError
+        return data
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def transactions_page(con, start, end, limit, cursor=None, sort="date", order="desc", **filters):
+    """
+    One keyset page of transactions as a DataFrame, plus the cursor for the
+    next page (None on the last page). Cursors are tied to sort/order.
+    """
+    after = None
+    if cursor:
+        c = decode_cursor(cursor)
+        if c["s"] != sort or c["o"] != order:
+            raise ValueError("Cursor does not match sort order")
+        after = (c["v"], c["id"])
+    q, params = transactions_query(start, end, limit=limit + 1, sort=sort, order=order, after=after, **filters)
+    df = pd.read_sql_query(q, con, params=params)
+    next_cursor = None
+    if len(df) > limit:
+        df = df.head(limit)
+        last = df.iloc[-1]
+        value = last[SORT_COLUMNS[sort]]
+        next_cursor = encode_cursor({"s": sort, "o": order, "v": value.item() if hasattr(value, "item") else value, "id": int(last["id"])})
+    return df, next_cursor
+
+@bp.get("/api/transactions")
+@cached_response
 def api_transactions():
+    """
+    Without cursor/limit: the newest 500 rows as a plain list (legacy shape).
+    With either: {"transactions": [...], "next_cursor": ...} keyset pages,
+    optionally sorted (sort=date|amount, order=asc|desc) and searched (q=...).
+    """
     start_str = request.args.get("start")
     end_str = request.args.get("end")
     category = request.args.get("category")
@@ -471,33 +2590,188 @@ def api_transactions():
     start, end = default_range()
     if start_str: start = parse_date(start_str, start)
     if end_str: end = parse_date(end_str, end)
+    filters = {"category": category, "show_hidden": show_hidden, "search": request.args.get("q")}
+
+    if "cursor" not in request.args and "limit" not in request.args:
+        q, params = transactions_query(start, end, **filters)
+        with get_read_db() as con:
+            df = pd.read_sql_query(q, con, params=params)
+        return jsonify(df.to_dict(orient="records"))
+
+    sort = request.args.get("sort", "date")
+    order = request.args.get("order", "desc").lower()
+    if sort not in SORT_COLUMNS or order not in ("asc", "desc"):
+        return jsonify({"error": "sort must be date|amount and order asc|desc"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 100)), 1000))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    try:
+        with get_read_db() as con:
+            df, next_cursor = transactions_page(con, start, end, limit, cursor=request.args.get("cursor"),
+                                                sort=sort, order=order, **filters)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"transactions": df.to_dict(orient="records"), "next_cursor": next_cursor})
+
+@bp.get("/api/transactions/<int:tx_id>")
+def api_transaction_detail(tx_id):
+    """One transaction including its original export row, decoded on demand."""
+    try:
+        with get_read_db() as con:
+            row = con.execute("""
+                SELECT t.*, h.columns AS raw_columns FROM transactions t
+                LEFT JOIN raw_headers h ON h.id = t.raw_header_id
+                WHERE t.id = ?
+            """, (tx_id,)).fetchone()
+        if row is None:
+            return jsonify({"error": "Transaction not found"}), 404
+        detail = {k: row[k] for k in ("id", "tx_date", "description", "amount", "account", "category",
+                                      "source_file", "hash", "hidden", "created_at", "merchant_key")}
+        detail["raw"] = raw_payload(row)
+        return jsonify(detail)
+    except Exception as e:
+        logger.exception("Transaction detail failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+def search_query(match: str, start, end, category=None, show_hidden=False, limit=100, order="date"):
+    """SQL + params for an FTS5 search (order "date" = newest first, "rank" = best match first)."""
     q = """
-        SELECT tx_date, description, amount, account, category, hash, hidden
-        FROM transactions
-        WHERE date(tx_date) BETWEEN date(?) AND date(?)
+        SELECT t.id, t.tx_date, t.description, t.amount, t.account, t.category, t.hash, t.hidden
+        FROM transactions_fts JOIN transactions t ON t.id = transactions_fts.rowid
+        WHERE transactions_fts MATCH ? AND t.tx_date BETWEEN ? AND ?
     """
-    params = [str(start), str(end)]
+    params = [match, str(start), str(end)]
     if category:
-        q += " AND category = ?"
+        q += " AND t.category = ?"
         params.append(category)
     if not show_hidden:
-        q += " AND hidden = 0"
-    q += " ORDER BY date(tx_date) DESC LIMIT 500"
-    with get_db() as con:
-        df = pd.read_sql_query(q, con, params=params)
-    return jsonify(df.to_dict(orient="records"))
+        q += " AND t.hidden = 0"
+    q += " ORDER BY " + ("transactions_fts.rank" if order == "rank" else "t.tx_date DESC, t.id DESC")
+    q += f" LIMIT {int(limit)}"
+    return q, params
+
+@bp.get("/api/search")
+@cached_response
+def api_search():
+    """
+    Full-text search over descriptions. q takes FTS5 syntax: words (substring
+    matches, 3+ characters), "quoted phrases", prefix*, AND/OR/NOT and
+    parentheses. Filters: start, end, category, show_hidden; order=date|rank.
+    """
+    match = (request.args.get("q") or "").strip()
+    if not match:
+        return jsonify({"error": "q is required"}), 400
+    if not _FTS_READY.get(DB_PATH):
+        return jsonify({"error": "Full-text search is not available on this SQLite build"}), 501
+    order = request.args.get("order", "date")
+    if order not in ("date", "rank"):
+        return jsonify({"error": "order must be date or rank"}), 400
+    try:
+        limit = max(1, min(int(request.args.get("limit", 100)), 1000))
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    start, end = default_range()
+    start = parse_date(request.args.get("start", ""), start)
+    end = parse_date(request.args.get("end", ""), end)
+    # Check the syntax on its own first: inside the full query FTS5 only parses
+    # q once the date/category filters leave a row to test it against.
+    # (LIMIT 0 would skip the parse, so ask for one row.)
+    try:
+        get_read_db().execute("SELECT 1 FROM transactions_fts WHERE transactions_fts MATCH ? LIMIT 1", (match,)).fetchall()
+    except sqlite3.OperationalError as e:
+        return jsonify({"error": f"Invalid search query: {e}"}), 400
+    q, params = search_query(match, start, end, category=request.args.get("category"),
+                             show_hidden=request.args.get("show_hidden", "false").lower() == "true",
+                             limit=limit, order=order)
+    try:
+        with get_read_db() as con:
+            df = pd.read_sql_query(q, con, params=params)
+    except Exception as e:
+        logger.exception("search failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({"transactions": df.to_dict(orient="records")})
+
+@bp.get("/api/export")
+def api_export():
+    """
+    Download transactions from the columnar snapshot.
+    ?format=parquet (default) or arrow, optional start/end and comma-separated columns.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        return jsonify({"error": "Export needs pyarrow installed"}), 501
+    fmt = request.args.get("format", "parquet").lower()
+    if fmt not in ("parquet", "arrow"):
+        return jsonify({"error": "format must be parquet or arrow"}), 400
+    columns = [c for c in request.args.get("columns", "").split(",") if c] or SNAPSHOT_COLUMNS
+    unknown = sorted(set(columns) - set(SNAPSHOT_COLUMNS))
+    if unknown:
+        return jsonify({"error": f"Unknown columns: {', '.join(unknown)}"}), 400
+    start = parse_date(request.args.get("start", ""), None)
+    end = parse_date(request.args.get("end", ""), None)
+
+    try:
+        refresh_snapshot()
+        table = read_snapshot(start, end, columns)
+        buf = io.BytesIO()
+        if fmt == "parquet":
+            pq.write_table(table, buf)
+            mimetype = "application/vnd.apache.parquet"
+        else:
+            with pa.ipc.new_file(buf, table.schema) as writer:
+                writer.write_table(table)
+            mimetype = "application/vnd.apache.arrow.file"
+        buf.seek(0)
+        return send_file(buf, mimetype=mimetype, as_attachment=True, download_name=f"transactions.{fmt}")
+    except Exception as e:
+        logger.exception("Export failed: %s", e)
+        return jsonify({"error": str(e)}), 500
 
-@app.get("/api/categories")
+@bp.get("/api/categories")
+@cached_response
 def api_categories():
     base = ["Groceries","Utilities","Transport","Dining","Housing","Entertainment","Healthcare","Insurance","Education","Fees","Gifts","Travel","Savings","Transfer","Income","Uncategorised"]
-    with get_db() as con:
+    with get_read_db() as con:
         cur = con.cursor()
         cur.execute("SELECT DISTINCT category FROM transactions")
         rows = [r[0] for r in cur.fetchall() if r[0]]
     all_cats = sorted(set(base) | set(rows))
     return jsonify(all_cats)
 
-@app.post("/api/update_category")
+def learn_phrases(phrases: dict) -> int:
+    """
+    Add a "User: phrase -> category" rule for each phrase not already mapped to
+    that category and relabel the rows containing it straight away.
+    Returns the number of rows relabelled by those quick LIKE passes.
+    """
+    new_rules = [
+        {"name": f"User: {phrase} -> {category}", "match": {"contains_any": [phrase]}, "category": category}
+        for phrase, category in phrases.items()
+        if not rule_with_phrase(phrase, category)
+    ]
+    if not new_rules:
+        return 0
+    add_rules(new_rules)
+    affected = 0
+    with db_writer() as con:
+        cur = con.cursor()
+        for rule in new_rules:
+            phrase, category = rule["match"]["contains_any"][0], rule["category"]
+            logger.info(f"Learned new rule: '{phrase}' -> '{category}'")
+            fts_sql, fts_params = contains_candidates(phrase)
+            cur.execute("""
+                UPDATE transactions 
+                SET category = ? 
+                WHERE lower(description) LIKE ? AND category != ?
+            """ + fts_sql, (category, f"%{phrase.lower()}%", category, *fts_params))
+            affected += cur.rowcount or 0
+    METRICS.inc("budget_rows_relabelled_total", affected, source="learned")
+    return affected
+
+@bp.post("/api/update_category")
 def api_update_category():
     try:
         data = request.get_json(force=True)
@@ -508,10 +2782,11 @@ def api_update_category():
             return jsonify({"error": "hash and category are required"}), 400
         
         # First, update the specific transaction
-        with get_db() as con:
+        with db_writer() as con:
             cur = con.cursor()
             # Get the transaction details before updating
-            cur.execute("SELECT description FROM transactions WHERE hash = ?", (h,))
+            # Learn from the merchant key where stored, so card prefixes are not learned as phrases
+            cur.execute("SELECT COALESCE(NULLIF(merchant_key, ''), description) FROM transactions WHERE " + HASH_MATCH, hash_params(h))
             result = cur.fetchone()
             if not result:
                 return jsonify({"error": "Transaction not found"}), 404
@@ -519,7 +2794,7 @@ def api_update_category():
             description = result[0]
             
             # Update the transaction
-            cur.execute("UPDATE transactions SET category = ? WHERE hash = ?", (new_category, h))
+            cur.execute("UPDATE transactions SET category = ? WHERE " + HASH_MATCH, (new_category, *hash_params(h)))
             con.commit()
             
             if cur.rowcount == 0:
@@ -527,46 +2802,10 @@ def api_update_category():
         
         # Learn from this categorization
         learned_phrase = extract_learning_phrase(description)
-        affected_like = 0
-        
-        if learned_phrase:
-            # Check if we already have a rule for this phrase -> category
-            existing_rule = None
-            for rule in RULES.get("rules", []):
-                if (rule.get("category") == new_category and 
-                    learned_phrase in rule.get("match", {}).get("contains_any", [])):
-                    existing_rule = rule
-                    break
-            
-            if not existing_rule:
-                # Add new rule
-                new_rule = {
-                    "name": f"User: {learned_phrase} -> {new_category}",
-                    "match": {
-                        "contains_any": [learned_phrase]
-                    },
-                    "category": new_category
-                }
-                RULES.setdefault("rules", []).append(new_rule)
-                
-                # Save updated rules
-                save_rules()
-                logger.info(f"Learned new rule: '{learned_phrase}' -> '{new_category}'")
-                
-                # Quick application of the new learned phrase
-                with get_db() as con:
-                    cur = con.cursor()
-                    like_pattern = f"%{learned_phrase.lower()}%"
-                    cur.execute("""
-                        UPDATE transactions 
-                        SET category = ? 
-                        WHERE lower(description) LIKE ? AND category != ?
-                    """, (new_category, like_pattern, new_category))
-                    affected_like = cur.rowcount or 0
-                    con.commit()
+        affected_like = learn_phrases({learned_phrase: new_category} if learned_phrase else {})
         
-        # Apply all rules to ensure complete consistency
-        relabelled_total = apply_rules_to_db()
+        # Re-evaluate only the rows touched by rules changed since the last apply
+        relabelled_total = apply_changed_rules()
         
         return jsonify({
             "status": "ok",
@@ -574,20 +2813,107 @@ def api_update_category():
             "category": new_category,
             "learned_phrase": learned_phrase,
             "affected_like": affected_like,
-            "relabelled_total": relabelled_total
+            "relabelled_total": relabelled_total,
+            "rules_version": rules_version()
         })
         
     except Exception as e:
         logger.exception("update_category failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
-@app.post("/api/reload_rules")
+BATCH_UPDATE_MAX = int(os.environ.get("BATCH_UPDATE_MAX", "5000"))
+
+@bp.post("/api/update_category/batch")
+def api_update_category_batch():
+    """
+    Relabel many transactions at once. Body is either
+      {"items": [{"hash": ..., "category": ...}, ...]}
+    or {"filter": {"start", "end", "category", "q", "show_hidden"}, "category": ...}
+    to relabel every matching row. All relabels commit together, the learned
+    phrases are deduplicated (the last item wins for a phrase) and rules are
+    applied once at the end; the chosen categories are then re-asserted so a
+    later rule cannot override an explicit pick.
+    """
+    try:
+        data = request.get_json(force=True) or {}
+        if "filter" in data:
+            new_category = data.get("category")
+            flt = data.get("filter") or {}
+            if not new_category or not isinstance(flt, dict):
+                return jsonify({"error": "filter and category are required"}), 400
+            start, end = default_range()
+            start = parse_date(flt.get("start") or "", start)
+            end = parse_date(flt.get("end") or "", end)
+            q, params = transactions_query(start, end, category=flt.get("category"),
+                                           show_hidden=str(flt.get("show_hidden", "false")).lower() == "true",
+                                           search=flt.get("q"), limit=BATCH_UPDATE_MAX + 1)
+            with get_read_db() as con:
+                hashes = [row["hash"] for row in con.execute(q, params)]
+            items = [{"hash": h, "category": new_category} for h in hashes]
+        else:
+            items = data.get("items")
+            if not isinstance(items, list) or not items:
+                return jsonify({"error": "items (list of {hash, category}) or filter is required"}), 400
+        if len(items) > BATCH_UPDATE_MAX:
+            return jsonify({"error": f"At most {BATCH_UPDATE_MAX} transactions per batch"}), 400
+
+        results = []
+        valid = {}
+        for item in items:
+            h = item.get("hash") if isinstance(item, dict) else None
+            category = item.get("category") if isinstance(item, dict) else None
+            if not h or not category:
+                results.append({"hash": h, "status": "error", "error": "hash and category are required"})
+                continue
+            valid[h] = category
+            results.append({"hash": h, "category": category, "status": "ok"})
+
+        with db_writer() as con:
+            cur = con.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            cur.execute("""
+                SELECT hash, COALESCE(NULLIF(merchant_key, ''), description) FROM transactions
+                WHERE (hash_key IN (SELECT value FROM json_each(?)) OR hash_key IS NULL)
+                  AND hash IN (SELECT value FROM json_each(?))
+            """, (json.dumps([hash_key(h) for h in valid]), json.dumps(list(valid))))
+            descriptions = dict(cur.fetchall())
+            cur.executemany("UPDATE transactions SET category = ? WHERE " + HASH_MATCH,
+                            [(c, *hash_params(h)) for h, c in valid.items() if h in descriptions])
+        for res in results:
+            if res["status"] == "ok" and res["hash"] not in descriptions:
+                res.update(status="error", error="Transaction not found")
+
+        phrases = {}
+        for h, category in valid.items():
+            if h in descriptions:
+                phrase = extract_learning_phrase(descriptions[h])
+                if phrase:
+                    phrases[phrase] = category
+        affected_like = learn_phrases(phrases)
+        relabelled_total = apply_changed_rules()
+
+        with db_writer() as con:
+            con.executemany("UPDATE transactions SET category = ? WHERE " + HASH_MATCH + " AND category IS NOT ?",
+                            [(c, *hash_params(h), c) for h, c in valid.items() if h in descriptions])
+
+        return jsonify({
+            "status": "ok",
+            "updated": sum(1 for r in results if r["status"] == "ok"),
+            "results": results,
+            "learned_phrases": sorted(phrases),
+            "affected_like": affected_like,
+            "relabelled_total": relabelled_total,
+            "rules_version": rules_version()
+        })
+    except Exception as e:
+        logger.exception("update_category batch failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@bp.post("/api/reload_rules")
 def api_reload_rules():
-    """Reload rules from file and apply to database"""
+    """Reload rules from the DB and apply them all to transactions"""
     try:
-        global RULES
-        RULES = load_rules()
-        logger.info("Reloaded rules from file")
+        refresh_rules(force=True)
         
         # Apply all rules to database
         relabelled = apply_rules_to_db()
@@ -595,39 +2921,99 @@ def api_reload_rules():
         return jsonify({
             "status": "ok",
             "relabelled": relabelled,
-            "version": RULES.get("version", "unknown")
+            "version": RULES.get("version", "unknown"),
+            "rules_version": rules_version()
         })
     except Exception as e:
         logger.exception("reload_rules failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
-@app.get("/api/rules")
+@bp.get("/api/rules")
 def api_rules():
     """Debug endpoint to see current rules in memory"""
     return jsonify(RULES)
 
-@app.post("/api/toggle_hidden")
+@bp.post("/api/rules")
+def api_replace_rules():
+    """Replace all rules with a rules.json-shaped body and re-apply them."""
+    try:
+        data = request.get_json(force=True)
+        if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+            return jsonify({"error": "Body must be an object with a rules list"}), 400
+        replace_rules(data)
+        relabelled = apply_rules_to_db()
+        return jsonify({"status": "ok", "rules": len(RULES["rules"]), "relabelled": relabelled,
+                        "rules_version": rules_version()})
+    except Exception as e:
+        logger.exception("replace rules failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@bp.post("/api/rules/simulate")
+def api_simulate_rules():
+    """
+    Preview what saving a rule set (rules.json-shaped body) would relabel,
+    without writing: per-rule counts, from -> to deltas and sample rows.
+    ?samples=N sets the number of sample rows (default 20, max 200).
+    """
+    try:
+        data = request.get_json(force=True)
+        if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+            return jsonify({"error": "Body must be an object with a rules list"}), 400
+        try:
+            sample_size = max(0, min(int(request.args.get("samples", 20)), 200))
+        except ValueError:
+            return jsonify({"error": "samples must be an integer"}), 400
+        t0 = time.perf_counter()
+        result = simulate_rules(data, sample_size=sample_size)
+        result["elapsed_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+        return jsonify(result)
+    except Exception as e:
+        logger.exception("simulate rules failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@bp.post("/api/rules/import")
+def api_import_rules():
+    """Import rules.json (the file on disk) into the DB, replacing the stored rules."""
+    try:
+        replace_rules(load_rules())
+        relabelled = apply_rules_to_db()
+        return jsonify({"status": "ok", "rules": len(RULES["rules"]), "relabelled": relabelled,
+                        "rules_version": rules_version()})
+    except Exception as e:
+        logger.exception("import rules failed: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+@bp.get("/api/rules/export")
+def api_export_rules():
+    """Current rules as a downloadable rules.json."""
+    body = json.dumps(load_rules_from_db(), indent=2, ensure_ascii=False)
+    resp = make_response(body)
+    resp.headers["Content-Type"] = "application/json"
+    resp.headers["Content-Disposition"] = "attachment; filename=rules.json"
+    return resp
+
+@bp.post("/api/toggle_hidden")
 def api_toggle_hidden():
     try:
         data = request.get_json(force=True)
         h = data.get("hash")
         if not h:
             return jsonify({"error":"hash is required"}), 400
-        with get_db() as con:
+        with db_writer() as con:
             cur = con.cursor()
-            cur.execute("UPDATE transactions SET hidden = NOT hidden WHERE hash = ?", (h,))
+            cur.execute("UPDATE transactions SET hidden = NOT hidden WHERE " + HASH_MATCH, hash_params(h))
             con.commit()
             if cur.rowcount == 0:
                 return jsonify({"error":"Transaction not found"}), 404
             # Get the new hidden status
-            cur.execute("SELECT hidden FROM transactions WHERE hash = ?", (h,))
+            cur.execute("SELECT hidden FROM transactions WHERE " + HASH_MATCH, hash_params(h))
             hidden = cur.fetchone()[0]
         return jsonify({"status":"ok","hash":h,"hidden":bool(hidden)})
     except Exception as e:
         logger.exception("toggle_hidden failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
-@app.post("/api/bulk_hide_transfers")
+@bp.post("/api/bulk_hide_transfers")
 def api_bulk_hide_transfers():
     try:
         data = request.get_json(force=True)
@@ -636,7 +3022,7 @@ def api_bulk_hide_transfers():
             return jsonify({"error":"action must be 'hide' or 'unhide'"}), 400
         
         hidden_value = 1 if action == "hide" else 0
-        with get_db() as con:
+        with db_writer() as con:
             cur = con.cursor()
             cur.execute("UPDATE transactions SET hidden = ? WHERE category = 'Transfer'", (hidden_value,))
             con.commit()
@@ -646,77 +3032,111 @@ def api_bulk_hide_transfers():
         logger.exception("bulk_hide_transfers failed: %s", e)
         return jsonify({"error": str(e)}), 500
 
-@app.get("/logs/<path:filename>")
+@bp.get("/logs/<path:filename>")
 def logs_file(filename):
     return send_from_directory(LOGS_DIR, filename, as_attachment=True)
 
-@app.post("/dev/seed")
+@bp.post("/dev/seed")
 def dev_seed():
     try:
         sample = os.path.join(DATA_DIR, "sample.csv")
         df = pd.read_csv(sample)
         parsed = parse_dataframe(df, "sample.csv", account_hint="Demo")
-        count = insert_transactions(parsed)
-        return {"status":"ok","inserted": count}
+        count, duplicates = insert_transactions(parsed)
+        return {"status":"ok","inserted": count, "duplicates": duplicates}
     except Exception as e:
         logger.exception("Seed failed: %s", e)
         return {"error": str(e)}, 500
 
-@app.post("/api/purge_transfers")
+@bp.post("/api/purge_transfers")
 def api_purge_transfers():
-    con = get_db()
-    cur = con.cursor()
-    cur.execute("DELETE FROM transactions WHERE category='Transfer'")
-    deleted = cur.rowcount or 0
-    con.commit()
-    con.close()
+    with db_writer() as con:
+        cur = con.cursor()
+        cur.execute("DELETE FROM transactions WHERE category='Transfer'")
+        deleted = cur.rowcount or 0
     return jsonify({"status":"ok","deleted": deleted})
 
-if __name__ == "__main__":
+def _db_bytes(con) -> int:
+    con.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    return con.execute("PRAGMA page_count").fetchone()[0] * con.execute("PRAGMA page_size").fetchone()[0]
+
+def compact_raw_payloads(batch_size: int = 5000) -> dict:
+    """
+    Move legacy raw_json payloads into the compact store (shared header +
+    values list), rewrite zlib-compressed values as plain JSON text, then
+    VACUUM. Rows whose raw_json is not a JSON object are left as they are.
+    Returns the row count and DB size before/after.
+    """
+    with db_writer() as con:
+        bytes_before = _db_bytes(con)
+    compacted, last_id = 0, 0
+    while True:
+        with db_writer() as con:
+            cur = con.cursor()
+            rows = cur.execute("""
+                SELECT id, raw_json, raw_header_id, raw_values FROM transactions
+                WHERE id > ? AND ((raw_json IS NOT NULL AND raw_values IS NULL) OR typeof(raw_values) = 'blob')
+                ORDER BY id LIMIT ?
+            """, (last_id, batch_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1]["id"]
+            updates, recoded = [], []
+            for row in rows:
+                if row["raw_values"] is not None:
+                    recoded.append((encode_raw_values(decode_raw_values(row["raw_values"])), row["id"]))
+                    continue
+                try:
+                    payload = json.loads(row["raw_json"])
+                except ValueError:
+                    continue
+                if not isinstance(payload, dict):
+                    continue
+                header = json.dumps(list(payload), ensure_ascii=False)
+                updates.append((header, encode_raw_values(list(payload.values())), row["id"]))
+            header_ids = raw_header_ids(cur, {u[0] for u in updates})
+            cur.executemany(
+                "UPDATE transactions SET raw_header_id = ?, raw_values = ?, raw_json = NULL WHERE id = ?",
+                [(header_ids[h], blob, tx_id) for h, blob, tx_id in updates],
+            )
+            cur.executemany("UPDATE transactions SET raw_values = ? WHERE id = ?", recoded)
+            compacted += len(updates) + len(recoded)
+    with db_writer() as con:
+        con.execute("VACUUM")
+        bytes_after = _db_bytes(con)
+    logger.info("Compacted raw payloads of %s transactions: %s -> %s bytes", compacted, bytes_before, bytes_after)
+    return {"rows": compacted, "bytes_before": bytes_before, "bytes_after": bytes_after,
+            "bytes_saved": bytes_before - bytes_after}
+
+@bp.cli.command("compact-raw")
+def compact_raw_command():
+    """Compact legacy raw_json payloads and report the bytes saved."""
     init_db()
-    port = int(os.environ.get("PORT", "5056"))
-    host = os.environ.get("HOST", "127.0.0.1")
-    app.run(host=host, port=port, debug=True)
+    print(json.dumps(compact_raw_payloads()))
 
+def create_app(init_database: bool = False) -> Flask:
+    """
+    Build the Flask app. With init_database=True the DB is initialised here,
+    once, instead of inside the first request, and the pooled connections it
+    opened are closed again so none are shared across a fork. Under gunicorn:
 
-# --- Budget Sniffer Rules API (reads from Rules.json) ---
-import os, json
-from flask import jsonify
+        gunicorn --preload "app:create_app(init_database=True)"
+    """
+    flask_app = Flask(__name__)
+    flask_app.json = TimedJSONProvider(flask_app)
+    flask_app.register_blueprint(bp)
+    if init_database:
+        init_db()
+        close_db_connections()
+        flask_app.config["_DB_INIT_DONE"] = True
+        flask_app.config["_RESUME_JOBS_PENDING"] = True
+    return flask_app
 
-def _load_rules_from_json():
-    rules_path = os.environ.get("RULES_JSON_PATH")
-    if not rules_path:
-        rules_path = os.path.join(os.path.dirname(__file__), "Rules.json")
-        if not os.path.exists(rules_path):
-            alt = os.path.join(os.path.dirname(__file__), "static", "data", "Rules.json")
-            if os.path.exists(alt):
-                rules_path = alt
-    try:
-        with open(rules_path, "r", encoding="utf-8") as rf:
-            data = json.load(rf)
-    except Exception:
-        return []
-    if isinstance(data, dict) and "rules" in data and isinstance(data["rules"], list):
-        return data["rules"]
-    if isinstance(data, list):
-        return data
-    return []
-
-def register_rules_routes(app):
-    @app.get("/api/rules")
-    def api_rules():
-        rules = _load_rules_from_json()
-        out = []
-        for r in rules:
-            if not isinstance(r, dict):
-                continue
-            rr = dict(r)
-            if "enabled" in rr:
-                val = rr["enabled"]
-                try:
-                    rr["enabled"] = 1 if int(val) != 0 else 0
-                except Exception:
-                    rr["enabled"] = 1 if str(val).lower() in ("true","yes","y","on") else 0
-            out.append(rr)
-        return jsonify({"rules": out})
-# --- end Rules API ---
+# Module-level app for `flask --app app`, plain `gunicorn app:app` and tests;
+# it initialises the DB lazily on its first request.
+app = create_app()
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", "5056"))
+    host = os.environ.get("HOST", "127.0.0.1")
+    create_app(init_database=True).run(host=host, port=port, debug=True)
@@ -5,6 +5,9 @@ const $$ = (sel) => document.querySelectorAll(sel);
 
 let ALL_CATEGORIES = [];
 let CURRENT_RULES = null;
+const TABLE_PAGE_SIZE = 200;
+// Filters behind the rows currently in the table, reused by "Load more"
+let TABLE_QUERY = { start: '', end: '', category: '', showHidden: false, label: '' };
 
 // Utility Functions
 function fmtMoney(amt) {
@@ -66,17 +69,20 @@ async function fetchSummary(start = '', end = '') {
     }
 }
 
-async function fetchTransactions(start = '', end = '', category = '') {
+async function fetchTransactions(start = '', end = '', category = '', cursor = '', showHidden = false) {
     try {
         const params = new URLSearchParams();
         if (start) params.set('start', start);
         if (end) params.set('end', end);
         if (category) params.set('category', category);
+        if (showHidden) params.set('show_hidden', 'true');
+        params.set('limit', String(TABLE_PAGE_SIZE));
+        if (cursor) params.set('cursor', cursor);
         const resp = await fetch(`/api/transactions?${params}`);
         return await resp.json();
     } catch (e) {
         setWarning('Failed to fetch transactions');
-        return [];
+        return { transactions: [], next_cursor: null };
     }
 }
 
@@ -246,11 +252,13 @@ function renderWeekly(points, stats) {
 }
 
 // Table Functions
-function renderTable(rows, categoryLabel = '') {
+function renderTable(rows, categoryLabel = '', nextCursor = null, append = false) {
     const tbody = $('#transactionTable tbody');
-    tbody.innerHTML = '';
+    if (!append) tbody.innerHTML = '';
+    const loadMore = tbody.querySelector('.load-more-row');
+    if (loadMore) loadMore.remove();
     
-    if (rows.length === 0) {
+    if (!append && rows.length === 0) {
         tbody.innerHTML = '<tr><td colspan="6" class="text-center">No transactions found</td></tr>';
         return;
     }
@@ -278,44 +286,56 @@ function renderTable(rows, categoryLabel = '') {
                 </button>
             </td>
         `;
+        tr.querySelector('.category-select').addEventListener('change', onCategoryChange);
         tbody.appendChild(tr);
     });
     
-    // Add event listeners for category changes
-    $('.category-select').forEach(select => {
-        select.addEventListener('change', async (e) => {
-            const hash = e.target.dataset.hash;
-            const category = e.target.value;
-            
-            try {
-                const resp = await fetch('/api/update_category', {
-                    method: 'POST',
-                    headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ hash, category })
-                });
-                const result = await resp.json();
-                
-                if (result.status === 'ok') {
-                    let message = `Category updated to "${category}"`;
-                    if (result.learned_phrase) {
-                        message += ` | Learned: "${result.learned_phrase}"`;
-                        if (result.affected_like > 0) {
-                            message += ` | Quick updates: ${result.affected_like}`;
-                        }
-                        if (result.relabelled_total > 0) {
-                            message += ` | Total updates: ${result.relabelled_total}`;
-                        }
-                    }
-                    showToast(message);
-                    refreshAll();
-                } else {
-                    setWarning(result.error || 'Failed to update category');
+    if (nextCursor) {
+        const tr = document.createElement('tr');
+        tr.className = 'load-more-row';
+        tr.innerHTML = '<td colspan="6" class="text-center"><button class="btn-small">Load more</button></td>';
+        tr.querySelector('button').addEventListener('click', () => loadMoreTransactions(nextCursor));
+        tbody.appendChild(tr);
+    }
+}
+
+async function loadMoreTransactions(cursor) {
+    const q = TABLE_QUERY;
+    const page = await fetchTransactions(q.start, q.end, q.category, cursor, q.showHidden);
+    renderTable(page.transactions || [], q.label, page.next_cursor, true);
+}
+
+async function onCategoryChange(e) {
+    const hash = e.target.dataset.hash;
+    const category = e.target.value;
+    
+    try {
+        const resp = await fetch('/api/update_category', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ hash, category })
+        });
+        const result = await resp.json();
+        
+        if (result.status === 'ok') {
+            let message = `Category updated to "${category}"`;
+            if (result.learned_phrase) {
+                message += ` | Learned: "${result.learned_phrase}"`;
+                if (result.affected_like > 0) {
+                    message += ` | Quick updates: ${result.affected_like}`;
+                }
+                if (result.relabelled_total > 0) {
+                    message += ` | Total updates: ${result.relabelled_total}`;
                 }
-            } catch (error) {
-                setWarning('Failed to update category: ' + error.message);
             }
-        });
-    });
+            showToast(message);
+            refreshAll();
+        } else {
+            setWarning(result.error || 'Failed to update category');
+        }
+    } catch (error) {
+        setWarning('Failed to update category: ' + error.message);
+    }
 }
 
 // Rules Management Functions
@@ -474,6 +494,19 @@ function addNewRule() {
     }, 100);
 }
 
+async function simulateRules(rules) {
+    try {
+        const resp = await fetch('/api/rules/simulate?samples=5', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(rules)
+        });
+        return await resp.json();
+    } catch (e) {
+        return { error: 'Network error' };
+    }
+}
+
 async function saveAllRules() {
     if (!CURRENT_RULES) {
         setWarning('No rules to save');
@@ -481,6 +514,13 @@ async function saveAllRules() {
     }
     
     try {
+        const preview = await simulateRules(CURRENT_RULES);
+        if (!preview.error && preview.changed > 0) {
+            const moves = preview.delta.slice(0, 5).map(d => `  ${d.from} \u2192 ${d.to}: ${d.count}`).join('\n');
+            if (!confirm(`Saving will relabel ${preview.changed} transactions:\n${moves}\n\nContinue?`)) {
+                return;
+            }
+        }
         const result = await saveRules(CURRENT_RULES);
         if (result.status === 'ok') {
             showToast(`Rules saved successfully! ${result.relabelled || 0} transactions updated.`);
@@ -534,9 +574,10 @@ async function applyFilter() {
     const end = $('#endDate').value;
     const category = $('#categoryFilter').value;
     
-    const transactions = await fetchTransactions(start, end, category);
     const categoryLabel = category || 'All Categories';
-    renderTable(transactions, categoryLabel);
+    TABLE_QUERY = { start, end, category, showHidden: false, label: categoryLabel };
+    const page = await fetchTransactions(start, end, category);
+    renderTable(page.transactions || [], categoryLabel, page.next_cursor);
 }
 
 async function refreshAll() {
@@ -549,7 +590,8 @@ async function refreshAll() {
     renderDonut(data.categories_breakdown || []);
     renderWeekly(data.weekly?.points || [], data.weekly?.stats || {});
     renderHist(data.hist || []);
-    renderTable(data.transactions || []);
+    TABLE_QUERY = { start, end, category: '', showHidden: true, label: '' };
+    renderTable(data.transactions || [], '', data.transactions_next_cursor);
     populateFilters(data.filters?.categories || []);
 }
 
@@ -610,6 +652,8 @@ function wireEvents() {
             
             if (result.status === 'ok') {
                 showToast(`Uploaded successfully! ${result.inserted} transactions added.`);
+                const failed = (result.errors || []).map(x => `${x.file} (${x.error})`);
+                if (failed.length) setWarning(`Some files failed: ${failed.join('; ')}`);
                 refreshAll();
                 $('#fileInput').value = '';
             } else {
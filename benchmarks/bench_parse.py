@@ -0,0 +1,62 @@
+"""
+Benchmark parse_dataframe on a synthetic bank export.
+
+Compares the vectorised parse_dataframe against the previous row-wise
+apply(axis=1) implementation and checks that both produce identical hashes.
+
+    python benchmarks/bench_parse.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+import app
+from synthetic import synthetic_export
+
+
+def legacy_parse(df: pd.DataFrame, source_file: str) -> pd.DataFrame:
+    """Row-wise hash/category computation as parse_dataframe did before vectorising."""
+    out = pd.DataFrame({
+        "tx_date": pd.to_datetime(df["Date"], errors="coerce").dt.date.astype("string"),
+        "description": df["Description"].astype(str).fillna(""),
+        "amount": pd.to_numeric(df["Amount"], errors="coerce"),
+        "account": "",
+    })
+    out["source_file"] = os.path.basename(source_file)
+    out = out.dropna(subset=["tx_date", "amount"])
+    out["hash"] = out.apply(lambda r: app.sha1(f"{r['tx_date']}|{r['amount']}|{app.normalise_description(r['description'])}|{r['account']}"), axis=1)
+    out["category"] = out.apply(lambda r: app.categorise(r["description"], r["amount"]), axis=1)
+    return out
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    res = fn(*args)
+    return res, time.perf_counter() - t0
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=100_000)
+    args = ap.parse_args(argv)
+
+    df = synthetic_export(args.rows)
+    before, t_before = timed(legacy_parse, df.copy(), "synthetic.csv")
+    after, t_after = timed(app.parse_dataframe, df.copy(), "synthetic.csv")
+
+    assert before["hash"].tolist() == after["hash"].tolist(), "hash mismatch"
+    assert before["category"].tolist() == after["category"].tolist(), "category mismatch"
+
+    print(f"rows:   {args.rows}")
+    print(f"before: {t_before:.2f}s  {args.rows / t_before:,.0f} rows/sec (row-wise apply)")
+    print(f"after:  {t_after:.2f}s  {args.rows / t_after:,.0f} rows/sec (vectorised)")
+    print(f"speedup: {t_before / t_after:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
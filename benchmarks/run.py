@@ -0,0 +1,203 @@
+"""
+Benchmark suite: ingest, rule application and the read endpoints.
+
+For each size it builds a fresh DB in a temp directory from a synthetic
+export (see synthetic.py) and times:
+
+    parse_dataframe          signed-amount layout
+    parse_debit_credit       Debit/Credit layout
+    ingest_file              CSV on disk to rows in an empty DB: read, parse,
+                             categorise, insert with every index and trigger
+    insert_transactions      first load, in INGEST_CHUNKSIZE chunks
+    insert_duplicates        the same rows again (overlapping re-upload)
+    apply_rules_to_db        full pass with --rules rules
+    simulate_rules           dry run of the same rules (nothing written),
+                             rows re-read as after a write
+    simulate_rules_edit      the same dry run with one rule edited, reusing
+                             the rows read by the previous run
+    categorise               RuleEngine over 10k descriptions with --rules rules
+    api_summary              GET /api/summary, response cache cleared
+    api_transactions         GET /api/transactions (legacy list)
+    api_transactions_page    GET /api/transactions?limit=100
+
+plus the cold-start phases from startup.py (import, init_db, first /health)
+under "startup" unless --no-startup. Each timing is the best of --repeat
+runs. Results are written as JSON; with --baseline, any metric more than
+--threshold slower than the baseline fails the run (exit status 1).
+--update-baseline stores this run as the baseline.
+
+    python benchmarks/run.py --sizes 10000,100000,1000000 --output bench.json \\
+        --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app
+from startup import run_startup
+from synthetic import synthetic_export, synthetic_rules
+
+SUMMARY_URL = "/api/summary?start=2020-01-01&end=2024-12-31"
+TRANSACTIONS_URL = "/api/transactions?start=2020-01-01&end=2024-12-31"
+
+
+def best_of(fn, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def metric(seconds: float, rows: int) -> dict:
+    return {"seconds": round(seconds, 6), "rows_per_sec": round(rows / seconds, 1) if seconds else None}
+
+
+def _use_fresh_db(tmp_dir: str):
+    app.DB_PATH = os.path.join(tmp_dir, "bench.db")
+    app.LOGS_DIR = os.path.join(tmp_dir, "logs")
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    app.close_db_connections()
+    app.RESPONSE_CACHE.clear()
+    app.init_db()
+    app.app.config["_DB_INIT_DONE"] = True
+
+
+def _insert_chunked(parsed):
+    size = app.INGEST_CHUNKSIZE
+    for i in range(0, len(parsed), size):
+        app.insert_transactions(parsed.iloc[i:i + size])
+
+
+def run_size(rows: int, n_rules: int, repeat: int) -> dict:
+    out = {}
+    rules = synthetic_rules(n_rules)
+    export = synthetic_export(rows, duplicate_rate=0.05)
+    export_dc = synthetic_export(rows, seed=43, layout="debit_credit")
+
+    with tempfile.TemporaryDirectory(prefix="budget_bench_") as tmp_dir:
+        # End to end into its own empty DB, so it runs once
+        csv_path = os.path.join(tmp_dir, "bench.csv")
+        export.to_csv(csv_path, index=False)
+        _use_fresh_db(os.path.join(tmp_dir, "ingest"))
+        app.replace_rules(rules)
+        out["ingest_file"] = metric(best_of(lambda: app.ingest_file(csv_path, "bench.csv"), 1), rows)
+
+        _use_fresh_db(tmp_dir)
+        app.replace_rules(rules)
+
+        parsed = app.parse_dataframe(export.copy(), "bench.csv")
+        out["parse_dataframe"] = metric(best_of(lambda: app.parse_dataframe(export.copy(), "bench.csv"), repeat), rows)
+        out["parse_debit_credit"] = metric(best_of(lambda: app.parse_dataframe(export_dc.copy(), "bench.csv"), repeat), rows)
+
+        # Inserting is not repeatable against the same DB, so it runs once
+        out["insert_transactions"] = metric(best_of(lambda: _insert_chunked(parsed), 1), rows)
+        out["insert_duplicates"] = metric(best_of(lambda: _insert_chunked(parsed), repeat), rows)
+        out["apply_rules_to_db"] = metric(best_of(app.apply_rules_to_db, repeat), rows)
+
+        def simulate_cold():
+            app._SIMULATION_INDEXES.clear()
+            app.simulate_rules(rules)
+
+        edited = {**rules, "rules": [*rules["rules"][:-1], {**rules["rules"][-1], "category": "Edited"}]}
+        out["simulate_rules"] = metric(best_of(simulate_cold, repeat), rows)
+        out["simulate_rules_edit"] = metric(best_of(lambda: app.simulate_rules(edited), repeat), rows)
+
+        engine = app.RuleEngine(rules)
+        descriptions = export["Description"].head(10_000).tolist()
+        out["categorise"] = metric(best_of(lambda: [engine.categorise(d, -1.0) for d in descriptions], repeat),
+                                   len(descriptions))
+
+        client = app.app.test_client()
+
+        def get(url):
+            def call():
+                app.RESPONSE_CACHE.clear()
+                res = client.get(url)
+                assert res.status_code == 200, res.get_data(as_text=True)
+            return call
+
+        out["api_summary"] = metric(best_of(get(SUMMARY_URL), repeat), rows)
+        out["api_transactions"] = metric(best_of(get(TRANSACTIONS_URL), repeat), rows)
+        out["api_transactions_page"] = metric(best_of(get(TRANSACTIONS_URL + "&limit=100"), repeat), rows)
+        app.close_db_connections()
+    return out
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Messages for every metric more than threshold (a fraction) slower than the baseline."""
+    regressions = []
+    for size, metrics in results.get("results", {}).items():
+        for name, current in metrics.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base or not base.get("seconds"):
+                continue
+            ratio = current["seconds"] / base["seconds"]
+            if ratio > 1 + threshold:
+                regressions.append(f"{name} @ {size} rows: {current['seconds']:.4f}s vs baseline "
+                                   f"{base['seconds']:.4f}s ({(ratio - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated row counts")
+    ap.add_argument("--rules", type=int, default=1000, help="number of synthetic rules")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--output", help="write results JSON here (default: stdout)")
+    ap.add_argument("--baseline", help="baseline JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, as a fraction")
+    ap.add_argument("--update-baseline", action="store_true", help="write this run to --baseline")
+    ap.add_argument("--no-startup", action="store_true", help="skip the cold-start benchmark")
+    args = ap.parse_args(argv)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "rules": args.rules,
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s):
+        print(f"benchmarking {size} rows...", file=sys.stderr)
+        results["results"][str(size)] = run_size(size, args.rules, args.repeat)
+    if not args.no_startup:
+        print("benchmarking cold start...", file=sys.stderr)
+        startup = run_startup(args.repeat)
+        results["meta"]["startup_modules"] = startup.pop("modules")
+        results["results"]["startup"] = startup
+
+    body = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as fh:
+            fh.write(body + "\n")
+    else:
+        print(body)
+
+    if args.baseline and args.update_baseline:
+        with open(args.baseline, "w") as fh:
+            fh.write(body + "\n")
+        print(f"baseline written to {args.baseline}", file=sys.stderr)
+        return 0
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as fh:
+            regressions = compare(results, json.load(fh), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Cold-start benchmark: each run is a fresh interpreter that imports app,
+builds it with create_app(init_database=True) against an empty DB in a temp
+directory and serves one GET /health. Reported per phase (best of --repeat):
+
+    import_app          `import app`
+    init_db             create_app(init_database=True)
+    first_health        the first GET /health through the test client
+    time_to_first_health  wall clock from spawning the interpreter to the
+                        /health response, interpreter start-up included
+
+plus whether pandas/numpy were imported by the time /health answered.
+
+    python benchmarks/startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import os, sys, time, json
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.DB_PATH = os.path.join(sys.argv[1], "startup.db")
+app.LOGS_DIR = os.path.join(sys.argv[1], "logs")
+os.makedirs(app.LOGS_DIR, exist_ok=True)
+flask_app = app.create_app(init_database=True)
+t2 = time.perf_counter()
+res = flask_app.test_client().get("/health")
+t3 = time.perf_counter()
+assert res.status_code == 200, res.status_code
+print(json.dumps({"import_app": t1 - t0, "init_db": t2 - t1, "first_health": t3 - t2,
+                  "pandas_loaded": "pandas" in sys.modules, "numpy_loaded": "numpy" in sys.modules}))
+"""
+
+
+def measure_once() -> dict:
+    with tempfile.TemporaryDirectory(prefix="budget_startup_") as tmp_dir:
+        t0 = time.perf_counter()
+        proc = subprocess.run([sys.executable, "-c", CHILD, tmp_dir], cwd=ROOT,
+                              capture_output=True, text=True, check=True)
+        wall = time.perf_counter() - t0
+    out = json.loads(proc.stdout.strip().splitlines()[-1])
+    out["time_to_first_health"] = wall
+    return out
+
+
+def run_startup(repeat: int) -> dict:
+    """Best-of-repeat phase timings, in the same metric shape as run.py."""
+    runs = [measure_once() for _ in range(repeat)]
+    out = {}
+    for name in ("import_app", "init_db", "first_health", "time_to_first_health"):
+        out[name] = {"seconds": round(min(r[name] for r in runs), 6)}
+    out["modules"] = {"pandas_loaded": any(r["pandas_loaded"] for r in runs),
+                      "numpy_loaded": any(r["numpy_loaded"] for r in runs)}
+    return out
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args(argv)
+    print(json.dumps(run_startup(args.repeat), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""
+Synthetic bank exports and rule sets for the benchmarks.
+
+Descriptions mimic NZ bank statements (card prefixes, merchant, branch,
+reference numbers); exports come in the two layouts infer_columns handles
+(signed Amount, or separate Debit/Credit columns) and can repeat a share
+of their rows to model overlapping re-uploads.
+"""
+import random
+
+import pandas as pd
+
+MERCHANTS = [
+    "COUNTDOWN PETONE", "New World  Thorndon", "Z Energy 123 Lower Hutt", "PAK N SAVE KILBIRNIE",
+    "Contact Energy", "Spark NZ Trading", "Uber *Trip", "Netflix.com", "Webbs Stationery",
+    "Majestic Cafe", "Prosegur Change", "Dxc Wellington Social Club", "Salary DXC Technology",
+    "Transfer to 06-0821-0620733-00", "Positive Health Pharmacy", "Creative Arts Supplies",
+]
+PREFIXES = ["", "", "EFTPOS ", "VISA PURCHASE 4829 ", "POS W/D ", "DIRECT DEBIT ", "AP "]
+PLACES = ["", "Wellington", "Lower Hutt", "Auckland", "Petone", "Porirua", "Christchurch"]
+
+
+def _description(rnd: random.Random) -> str:
+    desc = f"{rnd.choice(PREFIXES)}{rnd.choice(MERCHANTS)}"
+    place = rnd.choice(PLACES)
+    if place:
+        desc += f" {place}"
+    return f"{desc} {rnd.randint(0, 9999):04d}"
+
+
+def synthetic_export(rows: int, seed: int = 42, layout: str = "amount", duplicate_rate: float = 0.0) -> pd.DataFrame:
+    """
+    rows transactions over five years. layout is "amount" (one signed column)
+    or "debit_credit". duplicate_rate is the share of rows that repeat an
+    earlier row exactly, as an overlapping export would.
+    """
+    rnd = random.Random(seed)
+    start = pd.Timestamp("2020-01-01")
+    unique = max(1, int(rows * (1 - duplicate_rate)))
+    dates = [(start + pd.Timedelta(days=rnd.randint(0, 5 * 365))).strftime("%Y-%m-%d") for _ in range(unique)]
+    descriptions = [_description(rnd) for _ in range(unique)]
+    amounts = [round(rnd.uniform(-250, 50), 2) for _ in range(unique)]
+    for _ in range(rows - unique):
+        i = rnd.randrange(unique)
+        dates.append(dates[i])
+        descriptions.append(descriptions[i])
+        amounts.append(amounts[i])
+    df = pd.DataFrame({"Date": dates, "Description": descriptions})
+    if layout == "debit_credit":
+        df["Debit"] = [-a if a < 0 else None for a in amounts]
+        df["Credit"] = [a if a >= 0 else None for a in amounts]
+    else:
+        df["Amount"] = amounts
+    df["Balance"] = [round(rnd.uniform(0, 10000), 2) for _ in range(rows)]
+    return df
+
+
+def synthetic_rules(n: int, seed: int = 7) -> dict:
+    """A rules dict with n contains_any rules (every tenth one a regex rule)."""
+    rnd = random.Random(seed)
+    rules = []
+    for i in range(n):
+        if i % 10 == 9:
+            rules.append({"name": f"r{i}", "match": {"regex_any": [rf"^{rnd.choice(PREFIXES).strip().lower() or 'ap'} .*{i:04d}$"]},
+                          "category": f"Cat{i % 25}"})
+        else:
+            word = f"{rnd.choice(MERCHANTS).split()[0].lower()} {i:04d}"
+            rules.append({"name": f"r{i}", "match": {"contains_any": [word]}, "category": f"Cat{i % 25}"})
+    # Keep the real merchants matched so the category mix looks like a live DB
+    rules.extend({"name": m, "match": {"contains_any": [m.split()[0].lower()]}, "category": "Known"} for m in MERCHANTS)
+    return {"version": "bench", "default_category": "Uncategorised", "rules": rules}
@@ -8,11 +8,135 @@ CREATE TABLE IF NOT EXISTS transactions (
   category TEXT,
   source_file TEXT,
   raw_json TEXT,
-  hash TEXT UNIQUE,
+  hash TEXT,
   hidden INTEGER DEFAULT 0,
-  created_at TEXT DEFAULT (datetime('now'))
+  created_at TEXT DEFAULT (datetime('now')),
+  raw_header_id INTEGER,
+  raw_values TEXT,
+  hash_key INTEGER,
+  description_norm TEXT,
+  merchant_key TEXT,
+  updated_at TEXT
 );
 CREATE INDEX IF NOT EXISTS idx_tx_date ON transactions(tx_date);
 CREATE INDEX IF NOT EXISTS idx_category ON transactions(category);
 CREATE INDEX IF NOT EXISTS idx_amount ON transactions(amount);
 CREATE INDEX IF NOT EXISTS idx_hidden ON transactions(hidden);
+-- tx_date is stored as canonical YYYY-MM-DD, so range filters compare the bare
+-- column and these composite indexes apply.
+CREATE INDEX IF NOT EXISTS idx_tx_hidden_date ON transactions(hidden, tx_date);
+CREATE INDEX IF NOT EXISTS idx_tx_range_cover ON transactions(hidden, tx_date, category, amount);
+CREATE INDEX IF NOT EXISTS idx_tx_category_date ON transactions(category, tx_date);
+-- First 8 bytes of hash as an integer: the dedup key. Its unique index is far
+-- smaller than one over the 40-character hash text, which is not indexed.
+CREATE UNIQUE INDEX IF NOT EXISTS idx_tx_hash_key ON transactions(hash_key);
+-- Original export rows: each distinct column header is stored once here and
+-- transactions keep only a plain JSON list of their values
+-- (raw_header_id/raw_values). raw_json is only set on rows not yet compacted.
+-- Databases that gained raw_values as BLOB keep that declared type; BLOB has no
+-- affinity, so the JSON text is stored unchanged either way.
+CREATE TABLE IF NOT EXISTS raw_headers (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  columns TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS ingest_jobs (
+  id TEXT PRIMARY KEY,
+  status TEXT NOT NULL DEFAULT 'queued',
+  files TEXT NOT NULL,
+  rows_parsed INTEGER DEFAULT 0,
+  inserted INTEGER DEFAULT 0,
+  duplicates INTEGER DEFAULT 0,
+  skipped_transfers INTEGER DEFAULT 0,
+  errors TEXT DEFAULT '[]',
+  created_at TEXT DEFAULT (datetime('now')),
+  updated_at TEXT DEFAULT (datetime('now')),
+  -- Worker running the job and when it last reported progress (its lease)
+  owner TEXT,
+  heartbeat TEXT
+);
+-- Pre-aggregated spend per day/category/hidden flag, kept in step with
+-- transactions by the triggers below. week_start is the Monday of the
+-- (Mon-Sun) week, matching pandas' to_period("W").
+CREATE TABLE IF NOT EXISTS daily_category_totals (
+  tx_day TEXT NOT NULL,
+  week_start TEXT NOT NULL,
+  category TEXT NOT NULL,
+  hidden INTEGER NOT NULL,
+  amount_cents INTEGER NOT NULL DEFAULT 0,
+  tx_count INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (tx_day, category, hidden)
+);
+CREATE INDEX IF NOT EXISTS idx_daily_totals_week ON daily_category_totals(week_start);
+CREATE TRIGGER IF NOT EXISTS trg_tx_rollup_insert AFTER INSERT ON transactions
+BEGIN
+  INSERT INTO daily_category_totals (tx_day, week_start, category, hidden, amount_cents, tx_count)
+  VALUES (COALESCE(date(new.tx_date), new.tx_date), COALESCE(date(new.tx_date, 'weekday 0', '-6 days'), new.tx_date),
+          COALESCE(new.category, ''), COALESCE(new.hidden, 0), CAST(ROUND(new.amount * 100) AS INTEGER), 1)
+  ON CONFLICT(tx_day, category, hidden) DO UPDATE SET
+    amount_cents = amount_cents + excluded.amount_cents, tx_count = tx_count + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS trg_tx_rollup_delete AFTER DELETE ON transactions
+BEGIN
+  UPDATE daily_category_totals
+  SET amount_cents = amount_cents - CAST(ROUND(old.amount * 100) AS INTEGER), tx_count = tx_count - 1
+  WHERE tx_day = COALESCE(date(old.tx_date), old.tx_date) AND category = COALESCE(old.category, '') AND hidden = COALESCE(old.hidden, 0);
+  DELETE FROM daily_category_totals
+  WHERE tx_count <= 0 AND tx_day = COALESCE(date(old.tx_date), old.tx_date) AND category = COALESCE(old.category, '') AND hidden = COALESCE(old.hidden, 0);
+END;
+CREATE TRIGGER IF NOT EXISTS trg_tx_rollup_update AFTER UPDATE OF tx_date, amount, category, hidden ON transactions
+WHEN old.tx_date IS NOT new.tx_date OR old.amount IS NOT new.amount
+  OR COALESCE(old.category, '') IS NOT COALESCE(new.category, '') OR COALESCE(old.hidden, 0) IS NOT COALESCE(new.hidden, 0)
+BEGIN
+  UPDATE daily_category_totals
+  SET amount_cents = amount_cents - CAST(ROUND(old.amount * 100) AS INTEGER), tx_count = tx_count - 1
+  WHERE tx_day = COALESCE(date(old.tx_date), old.tx_date) AND category = COALESCE(old.category, '') AND hidden = COALESCE(old.hidden, 0);
+  DELETE FROM daily_category_totals
+  WHERE tx_count <= 0 AND tx_day = COALESCE(date(old.tx_date), old.tx_date) AND category = COALESCE(old.category, '') AND hidden = COALESCE(old.hidden, 0);
+  INSERT INTO daily_category_totals (tx_day, week_start, category, hidden, amount_cents, tx_count)
+  VALUES (COALESCE(date(new.tx_date), new.tx_date), COALESCE(date(new.tx_date, 'weekday 0', '-6 days'), new.tx_date),
+          COALESCE(new.category, ''), COALESCE(new.hidden, 0), CAST(ROUND(new.amount * 100) AS INTEGER), 1)
+  ON CONFLICT(tx_day, category, hidden) DO UPDATE SET
+    amount_cents = amount_cents + excluded.amount_cents, tx_count = tx_count + 1;
+END;
+-- Stamp edits to exported columns, so a snapshot month whose rollups are
+-- unchanged (a description fix, a same-amount swap) is still rewritten.
+CREATE TRIGGER IF NOT EXISTS trg_tx_touch AFTER UPDATE OF tx_date, description, amount, account, category, source_file, hash, hidden ON transactions
+BEGIN
+  UPDATE transactions SET updated_at = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE id = new.id;
+END;
+-- Small key/value store; data_generation is bumped on every committed write
+-- and keys the response cache.
+CREATE TABLE IF NOT EXISTS app_meta (
+  key TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO app_meta (key, value) VALUES ('data_generation', 0);
+-- Bumped on every rule change; workers reload their rules when it moves.
+INSERT OR IGNORE INTO app_meta (key, value) VALUES ('rules_generation', 0);
+-- Categorisation rules, in match order (position). Keys other than
+-- name/category/contains_any/regex_any are kept in extra as JSON.
+CREATE TABLE IF NOT EXISTS rules (
+  id INTEGER PRIMARY KEY AUTOINCREMENT,
+  position INTEGER NOT NULL,
+  name TEXT,
+  category TEXT,
+  extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_rules_position ON rules(position);
+CREATE TABLE IF NOT EXISTS rule_phrases (
+  rule_id INTEGER NOT NULL,
+  position INTEGER NOT NULL,
+  phrase TEXT NOT NULL,
+  PRIMARY KEY (rule_id, position)
+);
+CREATE INDEX IF NOT EXISTS idx_rule_phrases_phrase ON rule_phrases(phrase);
+CREATE TABLE IF NOT EXISTS rule_regexes (
+  rule_id INTEGER NOT NULL,
+  position INTEGER NOT NULL,
+  pattern TEXT NOT NULL,
+  PRIMARY KEY (rule_id, position)
+);
+CREATE TABLE IF NOT EXISTS rule_settings (
+  key TEXT PRIMARY KEY,
+  value TEXT
+);
@@ -470,7 +470,12 @@ function wireEvents() {
       for (let i=0; i<files.length; i++) form.append("files", files[i]);
       const r = await fetch("/upload", { method:"POST", body: form });
       const j = await r.json();
-      if (j.error) { setWarning(j.error); } else { setWarning(`Uploaded: ${j.inserted} rows`); await refreshAll(); }
+      if (j.error) { setWarning(j.error); }
+      else {
+        const failed = (j.errors || []).map(x => `${x.file} (${x.error})`);
+        setWarning(failed.length ? `Uploaded: ${j.inserted} rows. Failed: ${failed.join("; ")}` : `Uploaded: ${j.inserted} rows`);
+        await refreshAll();
+      }
     } catch (err) { setWarning("Upload failed."); setDebug(err); }
   });
 
@@ -0,0 +1,36 @@
+import os
+import sqlite3
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def db_file(tmp_path, monkeypatch):
+    """A freshly initialised database under tmp_path that the app points at."""
+    path = str(tmp_path / "app.db")
+    monkeypatch.setattr(app, "DB_PATH", path)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    app.init_db()
+    monkeypatch.setitem(app.app.config, "_DB_INIT_DONE", True)
+    app.RESPONSE_CACHE.clear()
+    yield path
+    app.close_db_connections()
+
+
+@pytest.fixture
+def client(db_file):
+    return app.app.test_client()
+
+
+@pytest.fixture
+def seed(db_file):
+    """Insert rows straight into the database, as another process would."""
+    def insert(sql, rows):
+        con = sqlite3.connect(db_file)
+        con.executemany(sql, rows)
+        con.commit()
+        con.close()
+    return insert
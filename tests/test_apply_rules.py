@@ -0,0 +1,89 @@
+import os
+import sqlite3
+
+import app
+
+
+def _seed(tmp_path, monkeypatch, rows):
+    db_file = str(tmp_path / "rules.db")
+    monkeypatch.setattr(app, "DB_PATH", db_file)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    app.init_db()
+    con = sqlite3.connect(db_file)
+    con.executemany(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES ('2024-01-01', ?, -1, ?, ?)",
+        [(d, c, f"h{i}") for i, (d, c) in enumerate(rows)],
+    )
+    con.commit()
+    con.close()
+    return db_file
+
+
+def _categories(db_file):
+    con = sqlite3.connect(db_file)
+    out = dict(con.execute("SELECT description, category FROM transactions").fetchall())
+    con.close()
+    return out
+
+
+def test_incremental_apply_only_touches_new_rule_rows(tmp_path, monkeypatch):
+    db_file = _seed(tmp_path, monkeypatch, [
+        ("Countdown Petone", "Uncategorised"),
+        ("Z Energy 42", "Uncategorised"),
+        ("Manually set", "Gifts"),
+    ])
+    rules = {"rules": [{"match": {"contains_any": ["manually"]}, "category": "Other"}]}
+    monkeypatch.setattr(app, "RULES", rules)
+    monkeypatch.setattr(app, "_APPLIED_RULES", set())
+    app.mark_rules_applied()
+
+    assert app.apply_changed_rules() == 0
+
+    rules["rules"].append({"match": {"contains_any": ["countdown"]}, "category": "Groceries"})
+    rules["rules"].append({"match": {"regex_any": [r"^z energy \d+"]}, "category": "Transport"})
+    assert app.apply_changed_rules() == 2
+    assert _categories(db_file) == {
+        "Countdown Petone": "Groceries",
+        "Z Energy 42": "Transport",
+        # Untouched: no changed rule matches it, so the old rule is not re-asserted
+        "Manually set": "Gifts",
+    }
+    assert app.changed_rules() == []
+
+
+def test_full_apply_marks_rules_applied(tmp_path, monkeypatch):
+    db_file = _seed(tmp_path, monkeypatch, [("Manually set", "Gifts")])
+    monkeypatch.setattr(app, "RULES", {"rules": [{"match": {"contains_any": ["manually"]}, "category": "Other"}]})
+    monkeypatch.setattr(app, "_APPLIED_RULES", set())
+
+    assert len(app.changed_rules()) == 1
+    assert app.apply_rules_to_db() == 1
+    assert app.changed_rules() == []
+    assert _categories(db_file) == {"Manually set": "Other"}
+
+
+def test_regex_rules_apply_in_rule_order(tmp_path, monkeypatch):
+    db_file = _seed(tmp_path, monkeypatch, [
+        ("Z  ENERGY 42", "Uncategorised"),
+        ("Uber   Trip", "Uncategorised"),
+        ("Bakery", "Uncategorised"),
+    ])
+    monkeypatch.setattr(app, "RULES", {"rules": [
+        {"match": {"regex_any": [r"^z energy \d+", "("]}, "category": "Fuel"},
+        {"match": {"regex_any": [r"^uber trip$"]}, "category": "Transport"},
+        {"match": {"regex_any": [r"energy"]}, "category": "Utilities"},
+    ]})
+    monkeypatch.setattr(app, "_APPLIED_RULES", set())
+
+    # The later matching rule overrides the earlier one, as in the row-by-row
+    # version; each relabelled row is counted once, with its final category
+    assert app.apply_rules_to_db() == 2
+    assert _categories(db_file) == {
+        "Z  ENERGY 42": "Utilities",
+        "Uber   Trip": "Transport",
+        "Bakery": "Uncategorised",
+    }
+
+    with app.get_db() as con:
+        assert con.execute("SELECT normalise('  A   b ') REGEXP '^a b$'").fetchone()[0] == 1
@@ -0,0 +1,38 @@
+import json
+import os
+import sys
+
+import app
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import run as bench  # noqa: E402
+from synthetic import synthetic_export  # noqa: E402
+
+
+def test_synthetic_export_layouts_and_duplicates():
+    df = synthetic_export(1000, layout="debit_credit", duplicate_rate=0.1)
+    assert len(df) == 1000
+    assert {"Debit", "Credit"} <= set(df.columns)
+    assert df.duplicated(subset=["Date", "Description", "Debit", "Credit"]).sum() >= 90
+    assert app.infer_columns(df)["debit"] == "Debit"
+
+
+def test_suite_runs_and_flags_regressions(tmp_path, monkeypatch):
+    for name in ("DB_PATH", "LOGS_DIR", "RULES", "_RULES_LOADED", "_APPLIED_RULES"):
+        monkeypatch.setattr(app, name, getattr(app, name))
+    out = tmp_path / "bench.json"
+    baseline = tmp_path / "baseline.json"
+
+    assert bench.main(["--sizes", "200", "--rules", "20", "--repeat", "1", "--output", str(out),
+                       "--baseline", str(baseline), "--update-baseline"]) == 0
+    results = json.loads(out.read_text())
+    assert set(results["results"]["200"]) >= {"parse_dataframe", "ingest_file", "insert_transactions", "apply_rules_to_db",
+                                              "simulate_rules", "simulate_rules_edit",
+                                              "categorise", "api_summary", "api_transactions"}
+    assert set(results["results"]["startup"]) == {"import_app", "init_db", "first_health", "time_to_first_health"}
+    assert results["meta"]["startup_modules"] == {"pandas_loaded": False, "numpy_loaded": False}
+
+    slower = {"results": {"200": {k: {"seconds": v["seconds"] * 2} for k, v in results["results"]["200"].items()}}}
+    assert bench.compare(results, results, 0.25) == []
+    assert len(bench.compare(slower, results, 0.25)) == len(results["results"]["200"])
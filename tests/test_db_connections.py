@@ -0,0 +1,40 @@
+import os
+import sqlite3
+
+import pytest
+
+import app
+
+
+def _init(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "DB_PATH", str(tmp_path / "conn.db"))
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    app.init_db()
+
+
+def test_connections_are_pooled_and_tuned(tmp_path, monkeypatch):
+    _init(tmp_path, monkeypatch)
+    assert app.get_db() is app.get_db()
+    assert app.get_read_db() is app.get_read_db()
+
+    con = app.get_read_db()
+    assert con.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert con.execute("PRAGMA temp_store").fetchone()[0] == 2  # MEMORY
+    assert con.execute("PRAGMA busy_timeout").fetchone()[0] == int(app.DB_PRAGMAS["busy_timeout"])
+    assert con.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_read_connection_rejects_writes(tmp_path, monkeypatch):
+    _init(tmp_path, monkeypatch)
+    with pytest.raises(sqlite3.OperationalError):
+        app.get_read_db().execute("DELETE FROM transactions")
+
+
+def test_writer_rolls_back_on_error(tmp_path, monkeypatch):
+    _init(tmp_path, monkeypatch)
+    with pytest.raises(RuntimeError):
+        with app.db_writer() as con:
+            con.execute("INSERT INTO transactions (tx_date, amount, hash) VALUES ('2024-01-01', -1, 'x')")
+            raise RuntimeError("boom")
+    assert app.get_read_db().execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 0
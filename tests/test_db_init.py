@@ -79,3 +79,72 @@ def test_add_hidden_column(tmp_path, monkeypatch):
 
     # Now hidden column should be present
     assert table_has_column(db_file, 'transactions', 'hidden')
+
+
+def test_normalised_columns_backfilled(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "norm.db")
+    monkeypatch.setattr(app, "DB_PATH", db_file)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    app.init_db()
+    # A row stored before the normalised columns existed, with the old merchant index
+    con = sqlite3.connect(db_file)
+    con.execute("INSERT INTO transactions (tx_date, description, amount, hash) VALUES ('2024-01-01', 'POS W/D  Z Energy 12 ', -1, ?)",
+                (app.sha1("z energy"),))
+    con.execute("CREATE INDEX idx_tx_merchant_key ON transactions(merchant_key)")
+    con.execute("PRAGMA user_version = 2")
+    con.commit()
+    con.close()
+
+    app.init_db()
+
+    con = sqlite3.connect(db_file)
+    row = con.execute("SELECT description_norm, merchant_key FROM transactions").fetchone()
+    assert con.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_tx_merchant_key'").fetchone() is None
+    con.close()
+    assert row == ("pos w/d z energy 12", "z energy")
+
+
+def test_hash_unique_moves_to_hash_key(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "legacy.db")
+    con = sqlite3.connect(db_file)
+    con.execute('''
+        CREATE TABLE transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tx_date TEXT NOT NULL,
+            description TEXT,
+            amount REAL NOT NULL,
+            account TEXT,
+            category TEXT,
+            source_file TEXT,
+            raw_json TEXT,
+            hash TEXT UNIQUE,
+            hidden INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT (datetime('now'))
+        );
+    ''')
+    con.executemany("INSERT INTO transactions (tx_date, description, amount, hash) VALUES ('2024-01-01', ?, -1, ?)",
+                    [("Coffee", app.sha1("a")), ("Books", "not-a-sha1"), ("Gone", "c")])
+    con.execute("DELETE FROM transactions WHERE hash = 'c'")
+    con.commit()
+    con.close()
+    monkeypatch.setattr(app, "DB_PATH", db_file)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+
+    app.init_db()
+
+    con = sqlite3.connect(db_file)
+    table_sql = con.execute("SELECT sql FROM sqlite_master WHERE name = 'transactions'").fetchone()[0]
+    assert "UNIQUE" not in table_sql
+    unique = {r[1] for r in con.execute("PRAGMA index_list(transactions)") if r[2]}
+    assert unique == {"idx_tx_hash_key"}
+    rows = con.execute("SELECT id, hash, hash_key FROM transactions ORDER BY id").fetchall()
+    assert rows == [(1, app.sha1("a"), app.hash_key(app.sha1("a"))), (2, "not-a-sha1", app.hash_key("not-a-sha1"))]
+    # ids are not reused after the rebuild
+    assert con.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()[0] == 3
+    con.close()
+    # The FTS triggers come back with the table
+    with app.db_writer() as con:
+        con.execute("INSERT INTO transactions (tx_date, description, amount, hash) VALUES ('2024-01-02', 'Cinema', -1, 'd')")
+    assert app.get_read_db().execute("SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH 'cinema'").fetchone()[0] == 4
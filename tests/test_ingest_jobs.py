@@ -0,0 +1,73 @@
+import io
+import os
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def _inline_jobs(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "UPLOADS_DIR", str(tmp_path / "uploads"))
+    # Run jobs inline so the test does not race the worker pool
+    monkeypatch.setattr(app, "submit_ingest_job", app.run_ingest_job)
+
+
+def test_async_upload_reports_progress(client):
+    good = (io.BytesIO(b"Date,Description,Amount\n2024-01-01,Coffee,-4.5\n2024-01-02,Books,-20\n"), "jan.csv")
+    bad = (io.BytesIO(b"Foo,Bar\n1,2\n"), "bad.csv")
+
+    resp = client.post("/upload?async=1", data={"files": [good, bad]}, content_type="multipart/form-data")
+    assert resp.status_code == 202
+    job_id = resp.get_json()["job_id"]
+
+    status = client.get(f"/api/jobs/{job_id}").get_json()
+    assert status["status"] == "done"
+    assert status["rows_parsed"] == 2
+    assert status["inserted"] == 2
+    assert [e["file"] for e in status["errors"]] == ["bad.csv"]
+    assert not os.path.exists(os.path.join(app.UPLOADS_DIR, job_id))
+
+
+def test_unknown_job(client):
+    assert client.get("/api/jobs/nope").status_code == 404
+
+
+def test_sync_upload_reports_per_file_errors(client, monkeypatch):
+    monkeypatch.setattr(app, "UPLOAD_WORKERS", 2)
+    jan = (io.BytesIO(b"Date,Description,Amount\n2024-01-01,Coffee,-4.5\n"), "jan.csv")
+    bad = (io.BytesIO(b"Foo,Bar\n1,2\n"), "bad.csv")
+    feb = (io.BytesIO(b"Date,Description,Amount\n2024-02-01,Books,-20\n2024-01-01,Coffee,-4.5\n"), "feb.csv")
+
+    resp = client.post("/upload", data={"files": [jan, bad, feb]}, content_type="multipart/form-data")
+    body = resp.get_json()
+    assert resp.status_code == 200
+    assert body["inserted"] == 2
+    assert body["duplicates"] == 1
+    assert [e["file"] for e in body["errors"]] == ["bad.csv"]
+    assert [f["file"] for f in body["files"]] == ["jan.csv", "bad.csv", "feb.csv"]
+    # Parse workers are never forked from this multi-threaded process
+    assert app._PARSE_POOL._mp_context.get_start_method() in ("forkserver", "spawn")
+
+
+def test_jobs_are_claimed_once_and_leases_expire(db_file, monkeypatch):
+    with app.db_writer() as con:
+        con.execute("INSERT INTO ingest_jobs (id, status, files) VALUES ('j1', 'queued', '[]')")
+    submitted = []
+    monkeypatch.setattr(app, "submit_ingest_job", submitted.append)
+
+    # Every worker resumes the queued job, but only one claim succeeds
+    app.resume_ingest_jobs()
+    assert submitted == ["j1"]
+    assert app.claim_ingest_job("j1") is True
+    assert app.claim_ingest_job("j1") is False
+
+    # A running job with a live lease is left to its owner...
+    app.resume_ingest_jobs()
+    assert submitted == ["j1"]
+    # ...until it stops heartbeating
+    with app.db_writer() as con:
+        con.execute("UPDATE ingest_jobs SET heartbeat = datetime('now', '-1 hour') WHERE id = 'j1'")
+    app.resume_ingest_jobs()
+    assert submitted == ["j1", "j1"]
+    assert app.claim_ingest_job("j1") is True
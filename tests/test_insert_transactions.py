@@ -0,0 +1,239 @@
+import io
+import json
+import os
+import sqlite3
+import zlib
+
+import pandas as pd
+
+import app
+
+
+def _setup_db(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "insert.db")
+    monkeypatch.setattr(app, "DB_PATH", db_file)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    app.init_db()
+    return db_file
+
+
+def _frame(descriptions):
+    df = pd.DataFrame({
+        "Date": ["2024-03-01"] * len(descriptions),
+        "Description": descriptions,
+        "Amount": [-10.0] * len(descriptions),
+    })
+    return app.parse_dataframe(df, "stmt.csv")
+
+
+def test_overlapping_upload_counts_duplicates(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+
+    assert app.insert_transactions(_frame(["a", "b", "b"])) == (2, 1)
+    assert app.insert_transactions(_frame(["b", "c"])) == (1, 1)
+
+    con = sqlite3.connect(db_file)
+    assert con.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 3
+    con.close()
+
+
+def test_empty_frame(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    assert app.insert_transactions(_frame([])) == (0, 0)
+
+
+def test_ingest_file_in_chunks(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    monkeypatch.setattr(app, "RULES", {"rules": [{"match": {"contains_any": ["transfer"]}, "category": "Transfer"}]})
+    csv = io.StringIO(
+        "Date,Description,Amount\n"
+        "2024-03-01,Coffee,-4.5\n"
+        "2024-03-02,Transfer to savings,-100\n"
+        "2024-03-03,Books,-20\n"
+        "2024-03-01,Coffee,-4.5\n"
+        "2024-03-04,Salary,1000\n"
+    )
+    stats = app.ingest_file(csv, "stmt.csv", chunksize=2)
+    assert stats == {"parsed": 5, "inserted": 3, "duplicates": 1, "skipped_transfers": 1}
+
+
+def test_raw_payload_is_compact_and_served_by_detail(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+    monkeypatch.setitem(app.app.config, "_DB_INIT_DONE", True)
+    app.insert_transactions(_frame(["a", "b"]))
+
+    con = sqlite3.connect(db_file)
+    assert con.execute("SELECT COUNT(*) FROM raw_headers").fetchone()[0] == 1
+    assert con.execute("SELECT COUNT(*) FROM transactions WHERE raw_json IS NOT NULL").fetchone()[0] == 0
+    tx_id = con.execute("SELECT id FROM transactions WHERE description = 'b'").fetchone()[0]
+    con.close()
+
+    client = app.app.test_client()
+    body = client.get(f"/api/transactions/{tx_id}").get_json()
+    assert body["raw"] == {"Date": "2024-03-01", "Description": "b", "Amount": -10.0}
+    assert client.get("/api/transactions/999999").status_code == 404
+
+
+def test_compact_legacy_raw_json(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+    con = sqlite3.connect(db_file)
+    payload = json.dumps({"Date": "2024-03-01", "Description": "Coffee " * 20, "Amount": -4.5, "Balance": 10})
+    con.executemany(
+        "INSERT INTO transactions (tx_date, amount, raw_json, hash) VALUES ('2024-03-01', -4.5, ?, ?)",
+        [(payload, f"h{i}") for i in range(2000)] + [("not json", "bad")],
+    )
+    con.commit()
+    con.close()
+
+    report = app.compact_raw_payloads(batch_size=300)
+    assert report["rows"] == 2000
+    assert report["bytes_saved"] > 0
+
+    con = sqlite3.connect(db_file)
+    con.row_factory = sqlite3.Row
+    row = con.execute("""
+        SELECT t.*, h.columns AS raw_columns FROM transactions t
+        LEFT JOIN raw_headers h ON h.id = t.raw_header_id WHERE hash = 'h5'
+    """).fetchone()
+    assert row["raw_json"] is None
+    assert app.raw_payload(row) == json.loads(payload)
+    assert con.execute("SELECT raw_json FROM transactions WHERE hash = 'bad'").fetchone()[0] == "not json"
+    con.close()
+
+
+def test_raw_values_are_plain_json_and_legacy_zlib_is_recoded(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+    values = ["2024-03-01", "COUNTDOWN AUCKLAND 1234", -42.17, 1830.5, "12-3456-0001", "REF17"]
+    encoded = app.encode_raw_values(values)
+    # Per-row zlib costs more than it saves on a single export row
+    assert len(encoded.encode("utf-8")) < len(zlib.compress(encoded.encode("utf-8")))
+    assert app.decode_raw_values(encoded) == values
+
+    app.insert_transactions(_frame(["a"]))
+    con = sqlite3.connect(db_file)
+    assert con.execute("SELECT typeof(raw_values) FROM transactions").fetchone()[0] == "text"
+    con.execute("UPDATE transactions SET raw_values = ?", (zlib.compress(b'["2024-03-01","a",-10.0]'),))
+    con.commit()
+    con.close()
+
+    assert app.compact_raw_payloads()["rows"] == 1
+    con = sqlite3.connect(db_file)
+    assert con.execute("SELECT raw_values FROM transactions").fetchone()[0] == '["2024-03-01","a",-10.0]'
+    con.close()
+
+
+def test_dedup_filter_has_no_false_negatives():
+    filt = app.DedupFilter(capacity=5000)
+    keys = [app.hash_key(app.sha1(str(i))) for i in range(5000)]
+    filt.add(keys[:2500])
+    assert filt.might_contain(keys[:2500]).all()
+    # ~1% false positive rate at 10 bits per key
+    assert filt.might_contain(keys[2500:]).mean() < 0.05
+
+
+def test_known_new_rows_skip_the_lookup(tmp_path, monkeypatch):
+    _setup_db(tmp_path, monkeypatch)
+    app.insert_transactions(_frame(["a", "b"]))
+
+    con = app.get_read_db()
+
+    class NoLookup:
+        # The filter's catch-up scan past max_id is allowed; the hash lookup is not
+        def execute(self, sql, *args):
+            assert "json_each" not in sql, "filter should have ruled these out"
+            return con.execute(sql, *args)
+
+    assert app.existing_hashes(NoLookup(), set(_frame(["c", "d"])["hash"])) == set()
+    assert app.existing_hashes(con.cursor(), set(_frame(["a", "c"])["hash"])) == set(_frame(["a"])["hash"])
+
+    # init_db drops the filter; the next lookup rebuilds it from the stored keys
+    app.init_db()
+    assert app.DB_PATH not in app._DEDUP_FILTERS
+    assert app.dedup_filter().might_contain([app.hash_key(h) for h in _frame(["a", "b"])["hash"]]).all()
+
+
+def test_dedup_filter_sees_rows_from_other_processes(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+    app.insert_transactions(_frame(["a"]))
+    app.dedup_filter()
+
+    # Another worker process inserts behind this process's filter
+    (h,) = _frame(["b"])["hash"]
+    con = sqlite3.connect(db_file)
+    con.execute("INSERT INTO transactions (tx_date, amount, hash, hash_key) VALUES ('2024-03-01', -10, ?, ?)", (h, app.hash_key(h)))
+    con.commit()
+    con.close()
+
+    assert app.existing_hashes(app.get_read_db().cursor(), {h}) == {h}
+    assert app.insert_transactions(_frame(["a", "b", "c"])) == (1, 2)
+
+
+def test_hash_key_accepts_any_hash():
+    assert app.hash_key("x") == app.hash_key(app.sha1("x"))
+    assert app.hash_key(None) == app.hash_key(app.sha1("None"))
+    # Short hex strings are not taken at face value, so "a" and "0a" do not collide
+    assert app.hash_key("a") != app.hash_key("0a")
+
+
+def test_integer_amounts_stored_before_float_hashing_are_duplicates(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+    monkeypatch.setitem(app.app.config, "_DB_INIT_DONE", True)
+    # Earlier versions hashed an all-integer Amount column as "-10", not "-10.0"
+    old = app.sha1("2024-03-01|-10|coffee|")
+    con = sqlite3.connect(db_file)
+    con.execute("INSERT INTO transactions (tx_date, description, amount, hash, hash_key) VALUES ('2024-03-01', 'Coffee', -10, ?, ?)",
+                (old, app.hash_key(old)))
+    con.commit()
+    con.close()
+    csv = b"Date,Description,Amount\n2024-03-01,Coffee,-10\n2024-03-02,Books,-20\n"
+
+    res = app.app.test_client().post("/api/upload/preview", data={"files": (io.BytesIO(csv), "stmt.csv")})
+    assert (res.get_json()["new"], res.get_json()["duplicates"]) == (1, 1)
+    assert app.ingest_file(io.BytesIO(csv), "stmt.csv") == {"parsed": 2, "inserted": 1, "duplicates": 1, "skipped_transfers": 0}
+
+    parsed = app.parse_dataframe(pd.DataFrame({"Date": ["2024-03-01"], "Description": ["Tea"], "Amount": [-4.5]}), "s.csv")
+    assert parsed["legacy_hash"].tolist() == [None]
+
+
+def test_upload_preview_writes_nothing(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+    monkeypatch.setitem(app.app.config, "_DB_INIT_DONE", True)
+    app.insert_transactions(_frame(["Coffee"]))
+    csv = b"Date,Description,Amount\n2024-03-01,Coffee,-10\n2024-03-02,Books,-20\n2024-03-02,Books,-20\n"
+
+    res = app.app.test_client().post("/api/upload/preview", data={"files": (io.BytesIO(csv), "stmt.csv")})
+    body = res.get_json()
+    assert (body["new"], body["duplicates"]) == (1, 2)
+
+    con = sqlite3.connect(db_file)
+    assert con.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 1
+    con.close()
+
+
+def test_parse_worker_spools_one_file_per_chunk(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "RULES", app.RULES)  # the worker swaps in the caller's rules
+    src = tmp_path / "stmt.csv"
+    src.write_text("Date,Description,Amount\n" + "".join(f"2024-01-{i + 1:02d},Shop {i},-{i}.5\n" for i in range(5)))
+    spool = tmp_path / "spool"
+    spool.mkdir()
+
+    paths = app._parse_file_worker(str(src), "stmt.csv", {"rules": []}, str(spool), chunksize=2)
+    chunks = [pd.read_pickle(p) for p in paths]
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert pd.concat(chunks)["description"].tolist() == [f"Shop {i}" for i in range(5)]
+
+
+def test_rows_without_hash_key_are_still_duplicates(tmp_path, monkeypatch):
+    db_file = _setup_db(tmp_path, monkeypatch)
+    app.insert_transactions(_frame(["a"]))
+
+    # Written by raw SQL since the last init_db, so it has no hash_key yet
+    (h,) = _frame(["b"])["hash"]
+    con = sqlite3.connect(db_file)
+    con.execute("INSERT INTO transactions (tx_date, amount, hash) VALUES ('2024-03-01', -10, ?)", (h,))
+    con.commit()
+    con.close()
+
+    assert app.existing_hashes(app.get_read_db().cursor(), {h}) == {h}
+    assert app.insert_transactions(_frame(["a", "b", "c"])) == (1, 2)
@@ -0,0 +1,41 @@
+import io
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def _fresh_metrics():
+    app.METRICS.clear()
+
+
+def test_metrics_endpoint_reports_requests_spans_and_counters(client):
+    csv = b"Date,Description,Amount\n2024-03-01,Coffee,-4.5\n2024-03-02,Books,-20\n2024-03-02,Books,-20\n"
+    client.post("/upload", data={"files": (io.BytesIO(csv), "stmt.csv")})
+    client.get("/api/transactions?start=2024-01-01&end=2024-12-31")
+
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "# TYPE budget_http_request_duration_seconds histogram" in body
+    assert 'budget_http_requests_total{endpoint="/api/transactions",method="GET",status="200"} 1' in body
+    assert 'budget_span_duration_seconds_count{span="sql"}' in body
+    assert 'budget_span_duration_seconds_count{span="parse_dataframe"} 1' in body
+    assert "budget_rows_parsed_total 3" in body
+    assert "budget_rows_inserted_total 2" in body
+    assert "budget_rows_duplicate_total 1" in body
+
+    # Counters follow the rows inserted, not the rollup/FTS trigger writes behind them
+    res = client.post("/upload", data={"files": (io.BytesIO(csv), "stmt.csv")}).get_json()
+    assert (res["inserted"], res["duplicates"]) == (0, 3)
+    body = client.get("/metrics").get_data(as_text=True)
+    assert "budget_rows_inserted_total 2" in body
+    assert "budget_rows_duplicate_total 4" in body
+
+
+def test_server_timing_header_is_opt_in(client, monkeypatch):
+    assert "Server-Timing" not in client.get("/api/categories").headers
+
+    monkeypatch.setattr(app, "SERVER_TIMING", True)
+    app.RESPONSE_CACHE.clear()
+    header = client.get("/api/categories").headers["Server-Timing"]
+    assert "sql;dur=" in header and "json;dur=" in header and "total;dur=" in header
@@ -0,0 +1,55 @@
+import io
+
+import pandas as pd
+
+import app
+
+
+def test_hash_matches_row_wise_key(monkeypatch):
+    monkeypatch.setattr(app, "RULES", {"rules": [{"match": {"contains_any": ["countdown"]}, "category": "Groceries"}]})
+    df = pd.DataFrame({
+        "Date": ["2024-01-02", "2024-01-03", "not a date", "2024-01-05"],
+        "Description": ["  COUNTDOWN   Petone ", "Salary", "Ignored", "Power\tBill"],
+        "Amount": [-12.5, 1000, -1, -80.1],
+    })
+    out = app.parse_dataframe(df, "/tmp/stmt.csv", account_hint="Everyday")
+
+    assert len(out) == 3
+    for r in out.itertuples(index=False):
+        key = f"{r.tx_date}|{r.amount}|{app.normalise_description(r.description)}|{r.account}"
+        assert r.hash == app.sha1(key)
+    assert out["category"].tolist() == ["Groceries", "Income", "Uncategorised"]
+    assert set(out["source_file"]) == {"stmt.csv"}
+
+
+def test_debit_credit_columns():
+    df = pd.DataFrame({
+        "Transaction Date": ["2024-02-01", "2024-02-02"],
+        "Details": ["Coffee", "Refund"],
+        "Debit": [4.5, None],
+        "Credit": [None, 20],
+    })
+    out = app.parse_dataframe(df, "stmt.csv")
+    assert out["amount"].tolist() == [-4.5, 20.0]
+
+
+def test_normalised_description_and_merchant_key():
+    df = pd.DataFrame({
+        "Date": ["2024-02-01"] * 4,
+        "Description": ["EFTPOS  COUNTDOWN Petone 0423", "Visa Purchase 4829 Uber *Trip", "1234 5678", "Netflix.com"],
+        "Amount": [-1, -2, -3, -4],
+    })
+    out = app.parse_dataframe(df, "stmt.csv")
+    assert out["description_norm"].tolist() == ["eftpos countdown petone 0423", "visa purchase 4829 uber *trip",
+                                                 "1234 5678", "netflix.com"]
+    assert out["merchant_key"].tolist() == ["countdown petone", "uber *trip", "1234 5678", "netflix.com"]
+
+
+def test_chunk_dtype_does_not_change_hashes():
+    # The first chunk holds only whole numbers (read as int64), the second a decimal
+    data = ("Date,Description,Amount\n"
+            + "".join(f"2024-02-{1 + i % 28:02d},Shop {i},-{10 + i}\n" for i in range(6))
+            + "2024-02-07,Coffee,-4.5\n").encode()
+    whole = app.parse_dataframe(pd.read_csv(io.BytesIO(data)), "stmt.csv")
+    chunked = pd.concat(app.parse_export_chunks(io.BytesIO(data), "stmt.csv", chunksize=3))
+    assert chunked["hash"].tolist() == whole["hash"].tolist()
@@ -0,0 +1,65 @@
+import datetime
+import sqlite3
+
+import app
+
+
+def _plan(db_file, q, params):
+    con = sqlite3.connect(db_file)
+    rows = con.execute("EXPLAIN QUERY PLAN " + q, params).fetchall()
+    con.close()
+    return " | ".join(r[-1] for r in rows)
+
+
+def test_listing_queries_use_indexes(db_file):
+    start, end = datetime.date(2024, 1, 1), datetime.date(2024, 12, 31)
+
+    plan = _plan(db_file, *app.transactions_query(start, end))
+    assert "USING INDEX idx_tx_hidden_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+    plan = _plan(db_file, *app.transactions_query(start, end, show_hidden=True))
+    assert "USING INDEX idx_tx_date" in plan
+    assert "TEMP B-TREE" not in plan
+
+    plan = _plan(db_file, *app.transactions_query(start, end, category="Groceries"))
+    assert "USING INDEX idx_tx_category_date" in plan
+    assert "SCAN transactions" not in plan
+
+
+def test_range_aggregate_is_covered(db_file):
+    plan = _plan(db_file, """
+        SELECT category, SUM(amount) FROM transactions
+        WHERE hidden = 0 AND tx_date BETWEEN ? AND ?
+        GROUP BY category
+    """, ("2024-01-01", "2024-12-31"))
+    assert "USING COVERING INDEX idx_tx_range_cover" in plan
+
+
+def test_existing_dates_are_canonicalised(db_file):
+    con = sqlite3.connect(db_file)
+    con.execute("INSERT INTO transactions (tx_date, amount, hash) VALUES ('2024-01-05 00:00:00', -1, 'x')")
+    con.execute("PRAGMA user_version = 0")
+    con.commit()
+    con.close()
+
+    app.init_db()
+
+    con = sqlite3.connect(db_file)
+    assert con.execute("SELECT tx_date FROM transactions").fetchone()[0] == "2024-01-05"
+    assert con.execute("PRAGMA user_version").fetchone()[0] == app.SCHEMA_VERSION
+    con.close()
+
+
+def test_new_db_skips_one_off_migrations(db_file, monkeypatch):
+    con = sqlite3.connect(db_file)
+    assert con.execute("PRAGMA user_version").fetchone()[0] == app.SCHEMA_VERSION
+    con.close()
+
+    def rescan(con):
+        raise AssertionError("a new DB should not be migrated")
+
+    monkeypatch.setattr(app, "_canonicalise_dates", rescan)
+    monkeypatch.setattr(app, "_backfill_normalised", rescan)
+    monkeypatch.setattr(app, "_drop_hash_unique", rescan)
+    app.init_db()
@@ -0,0 +1,39 @@
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def _rows(seed):
+    seed("INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES ('2024-01-02', 'Shop', -5, 'Misc', ?)",
+         [("h1",)])
+
+
+def test_repeat_requests_hit_cache_until_a_write(client, monkeypatch):
+    calls = []
+    real = app.transactions_query
+    monkeypatch.setattr(app, "transactions_query", lambda *a, **k: calls.append(1) or real(*a, **k))
+    url = "/api/transactions?start=2024-01-01&end=2024-01-31"
+
+    first = client.get(url)
+    # Param order and blank params do not change the key
+    second = client.get("/api/transactions?end=2024-01-31&category=&start=2024-01-01")
+    assert first.get_json() == second.get_json()
+    assert first.headers["ETag"] == second.headers["ETag"]
+    assert len(calls) == 1
+
+    client.post("/api/toggle_hidden", json={"hash": "h1"})
+    third = client.get(url)
+    assert third.get_json() == []
+    assert third.headers["ETag"] != first.headers["ETag"]
+    assert len(calls) == 2
+
+
+def test_if_none_match_returns_304(client):
+    first = client.get("/api/categories")
+    etag = first.headers["ETag"]
+    assert "no-store" not in first.headers["Cache-Control"]
+
+    again = client.get("/api/categories", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.get_data() == b""
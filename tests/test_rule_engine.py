@@ -0,0 +1,65 @@
+import app
+
+
+RULES = {
+    "default_category": "Uncategorised",
+    "rules": [
+        {"name": "a", "match": {"contains_any": ["countdown", "new world"]}, "category": "Groceries"},
+        {"name": "b", "match": {"regex_any": [r"^z energy \d+", "("]}, "category": "Transport"},
+        {"name": "c", "match": {"contains_any": ["world"]}, "category": "Travel"},
+        {"name": "d", "match": {"contains_any": ["Mixed Case"]}, "category": "Never"},
+        {"name": "e", "match": {"contains_any": ["energy"]}, "category": "Utilities"},
+    ],
+}
+
+
+def test_first_rule_wins():
+    eng = app.RuleEngine(RULES)
+    assert eng.categorise("NEW   World Petone", -20) == "Groceries"
+    assert eng.categorise("Around the world", -20) == "Travel"
+    assert eng.categorise("Z Energy 123 Lower Hutt", -60) == "Transport"
+    assert eng.categorise("Contact Energy", -90) == "Utilities"
+
+
+def test_fallbacks():
+    eng = app.RuleEngine(RULES)
+    # Phrases are matched against the lower-cased description as-is
+    assert eng.categorise("mixed case", -1) == "Uncategorised"
+    assert eng.categorise("Salary", 1000) == "Income"
+    assert eng.categorise(None, -5) == "Uncategorised"
+
+
+def test_overlapping_phrases_use_rule_order():
+    rules = {"rules": [
+        {"match": {"contains_any": ["bcd"]}, "category": "First"},
+        {"match": {"contains_any": ["abc"]}, "category": "Second"},
+    ]}
+    eng = app.RuleEngine(rules)
+    assert eng.categorise("xabcdx", -1) == "First"
+    assert eng.categorise("xabcx", -1) == "Second"
+
+
+def test_engine_rebuilt_when_rules_change(monkeypatch):
+    rules = {"rules": [{"match": {"contains_any": ["foo"]}, "category": "Foo"}]}
+    monkeypatch.setattr(app, "RULES", rules)
+    assert app.categorise("bar", -1) == "Uncategorised"
+    rules["rules"].append({"match": {"contains_any": ["bar"]}, "category": "Bar"})
+    assert app.categorise("bar", -1) == "Bar"
+
+
+def test_combined_regex_gate_keeps_rule_order():
+    rules = {"rules": [
+        {"match": {"regex_any": [r"petone$"]}, "category": "Late"},
+        {"match": {"regex_any": [r"^new"]}, "category": "Early"},
+    ]}
+    eng = app.RuleEngine(rules)
+    assert eng.regex_gate is not None
+    # The gate only rules texts out; rule order still decides between matches
+    assert eng.categorise("New World Petone", -1) == "Late"
+    assert eng.categorise("New World Thorndon", -1) == "Early"
+    assert eng.categorise("Pak n Save", -1) == "Uncategorised"
+
+    # Patterns that cannot share one alternation are tried one by one
+    backref = app.RuleEngine({"rules": [{"match": {"regex_any": [r"(\w)\1"]}, "category": "Double"}]})
+    assert backref.regex_gate is None
+    assert backref.categorise("Coffee", -1) == "Double"
@@ -0,0 +1,74 @@
+import json
+import os
+import sqlite3
+
+import app
+
+
+def _init(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "rules_store.db")
+    monkeypatch.setattr(app, "DB_PATH", db_file)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    monkeypatch.setattr(app, "RULES", app.RULES)
+    monkeypatch.setattr(app, "_RULES_LOADED", (None, None))
+    monkeypatch.setattr(app, "_APPLIED_RULES", set())
+    app.init_db()
+    monkeypatch.setitem(app.app.config, "_DB_INIT_DONE", True)
+    return db_file
+
+
+RULES = {
+    "version": "7",
+    "default_category": "Other",
+    "rules": [
+        {"name": "food", "match": {"contains_any": ["countdown", "pak n save"]}, "category": "Groceries"},
+        {"name": "fuel", "match": {"regex_any": [r"^z energy \d+"]}, "category": "Transport", "enabled": 1},
+    ],
+}
+
+
+def test_new_db_is_seeded_from_rules_json(tmp_path, monkeypatch):
+    _init(tmp_path, monkeypatch)
+    with open(app.RULES_PATH) as fh:
+        assert app.load_rules_from_db() == json.load(fh)
+
+
+def test_rules_round_trip_and_versioning(tmp_path, monkeypatch):
+    _init(tmp_path, monkeypatch)
+    gen = app.rules_generation()
+    app.replace_rules(RULES)
+    assert app.load_rules_from_db() == RULES
+    assert app.rules_generation() == gen + 1
+    app.mark_rules_applied()
+
+    app.add_rule({"name": "gym", "match": {"contains_any": ["les mills"]}, "category": "Health"})
+    assert app.rules_generation() == gen + 2
+    assert app.RULES["rules"][-1]["category"] == "Health"
+    assert app.rule_with_phrase("les mills", "Health") is not None
+    assert app.changed_rules() == [app.RULES["rules"][-1]]
+
+    export = app.app.test_client().get("/api/rules/export")
+    assert json.loads(export.get_data())["rules"] == app.RULES["rules"]
+
+
+def test_other_workers_changes_are_picked_up(tmp_path, monkeypatch):
+    db_file = _init(tmp_path, monkeypatch)
+    app.replace_rules(RULES)
+    assert app.refresh_rules() is False
+    engine = app.get_rule_engine()
+
+    # Simulate another process adding a rule
+    con = sqlite3.connect(db_file)
+    con.execute("INSERT INTO rules (position, name, category) VALUES (9, 'cafe', 'Eating Out')")
+    con.execute("INSERT INTO rule_phrases (rule_id, position, phrase) VALUES (last_insert_rowid(), 0, 'flat white')")
+    con.execute("UPDATE app_meta SET value = value + 1 WHERE key = 'rules_generation'")
+    con.commit()
+    con.close()
+
+    app.app.test_client().get("/api/rules")
+    assert app.RULES["rules"][-1]["name"] == "cafe"
+    assert app.get_rule_engine() is not engine
+    assert app.categorise("Flat White Co", -5) == "Eating Out"
+    # Another worker's rules are not re-applied here
+    assert app.changed_rules() == []
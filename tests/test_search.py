@@ -0,0 +1,69 @@
+import sqlite3
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def _rows(seed):
+    seed(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash, hidden) VALUES (?, ?, -1, ?, ?, ?)",
+        [
+            ("2024-01-02", "COUNTDOWN Petone", "Groceries", "a", 0),
+            ("2024-01-03", "Countdown Lower Hutt", "Groceries", "b", 0),
+            ("2024-01-04", "New World Petone", "Groceries", "c", 1),
+            ("2024-02-01", "Z Energy Lower Hutt", "Transport", "d", 0),
+        ],
+    )
+
+
+def _search(client, **params):
+    res = client.get("/api/search", query_string={"start": "2024-01-01", "end": "2024-12-31", **params})
+    return [t["hash"] for t in res.get_json()["transactions"]]
+
+
+def test_search_syntax_and_filters(client):
+    assert _search(client, q="countdown") == ["b", "a"]
+    assert _search(client, q="ountd") == ["b", "a"]
+    assert _search(client, q='"lower hutt"') == ["d", "b"]
+    assert _search(client, q="petone", show_hidden="true") == ["c", "a"]
+    assert _search(client, q="petone NOT countdown", show_hidden="true") == ["c"]
+    assert _search(client, q="hutt", category="Transport") == ["d"]
+    assert _search(client, q="hutt", end="2024-01-31") == ["b"]
+    # Rejected whether or not the date range holds any rows
+    assert client.get("/api/search", query_string={"q": "AND (", "start": "2024-01-01", "end": "2024-12-31"}).status_code == 400
+    assert client.get("/api/search", query_string={"q": "AND (", "start": "2020-01-01", "end": "2020-12-31"}).status_code == 400
+    assert client.get("/api/search").status_code == 400
+
+
+def test_index_follows_writes_and_narrows_rule_updates(db_file, client, monkeypatch):
+    con = sqlite3.connect(db_file)
+    con.execute("UPDATE transactions SET description = 'Pak n Save Petone' WHERE hash = 'a'")
+    con.execute("DELETE FROM transactions WHERE hash = 'b'")
+    con.commit()
+    con.close()
+    assert _search(client, q="countdown") == []
+    assert _search(client, q="pak") == ["a"]
+
+    sql, params = app.contains_candidates("energy")
+    assert "transactions_fts MATCH" in sql and params == ('"energy"',)
+    assert app.contains_candidates("ab") == ("", ())
+    assert app.contains_candidates("50%") == ("", ())
+
+    monkeypatch.setattr(app, "RULES", {"rules": [{"match": {"contains_any": ["energy", "pak n"]}, "category": "X"}]})
+    assert app.apply_rules_to_db() == 2
+
+
+def test_bulk_inserts_are_indexed_after_the_batch(db_file, client):
+    df = app.parse_dataframe(app.pd.DataFrame({
+        "Date": ["2024-03-01", "2024-03-02"], "Description": ["Gull Petone", "Countdown Kilbirnie"], "Amount": [-5.0, -9.0],
+    }), "stmt.csv")
+    app.insert_transactions(df)
+
+    assert _search(client, q="petone") == [df["hash"][0], "a"]
+    assert _search(client, q="kilbirnie") == [df["hash"][1]]
+    con = sqlite3.connect(db_file)
+    # The per-row trigger is back on for writes outside insert_transactions
+    assert con.execute("SELECT value FROM app_meta WHERE key = 'fts_bulk_insert'").fetchone()[0] == 0
+    con.close()
@@ -0,0 +1,90 @@
+import os
+import sqlite3
+
+import app
+
+
+def _seed(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "simulate.db")
+    monkeypatch.setattr(app, "DB_PATH", db_file)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+    app.init_db()
+    monkeypatch.setitem(app.app.config, "_DB_INIT_DONE", True)
+    con = sqlite3.connect(db_file)
+    con.executemany(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES ('2024-01-01', ?, -1, ?, ?)",
+        [
+            ("Countdown Petone", "Uncategorised", "a"),
+            ("Countdown Petone", "Uncategorised", "b"),
+            ("Z  ENERGY 42", "Uncategorised", "c"),
+            ("Countdown Fuel", "Groceries", "d"),
+            ("Bakery", "Dining", "e"),
+            ("Mystery", None, "f"),
+        ],
+    )
+    con.commit()
+    con.close()
+    return db_file
+
+
+RULES = {"rules": [
+    {"name": "groceries", "match": {"contains_any": ["countdown", "mystery"]}, "category": "Groceries"},
+    {"name": "fuel", "match": {"contains_any": ["fuel"]}, "category": "Transport"},
+    {"name": "z", "match": {"regex_any": [r"^z energy \d+"]}, "category": "Transport"},
+    {"name": "empty", "match": {"contains_any": [" "]}, "category": "Never"},
+]}
+
+
+def test_simulation_matches_a_real_apply(tmp_path, monkeypatch):
+    db_file = _seed(tmp_path, monkeypatch)
+    res = app.app.test_client().post("/api/rules/simulate", json=RULES).get_json()
+
+    assert res["rows"] == 6
+    assert res["changed"] == 4
+    assert [(r["name"], r["matched"], r["changed"]) for r in res["rules"]] == [
+        ("groceries", 2, 2), ("fuel", 1, 1), ("z", 1, 1), ("empty", 0, 0),
+    ]
+    assert res["delta"] == [
+        {"from": "Uncategorised", "to": "Groceries", "count": 2},
+        {"from": "Groceries", "to": "Transport", "count": 1},
+        {"from": "Uncategorised", "to": "Transport", "count": 1},
+    ]
+    assert {s["description"] for s in res["samples"]} == {"Countdown Petone", "Z  ENERGY 42", "Countdown Fuel"}
+
+    # Nothing written
+    con = sqlite3.connect(db_file)
+    before = dict(con.execute("SELECT hash, category FROM transactions").fetchall())
+    con.close()
+    assert before["a"] == "Uncategorised"
+
+    monkeypatch.setattr(app, "RULES", RULES)
+    assert app.apply_rules_to_db() == res["changed"]
+    con = sqlite3.connect(db_file)
+    after = dict(con.execute("SELECT hash, category FROM transactions").fetchall())
+    con.close()
+    moved = {(before[h], after[h]) for h in before if before[h] != after[h]}
+    assert moved == {(d["from"], d["to"]) for d in res["delta"]}
+
+
+def test_simulate_rejects_bad_body(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch)
+    assert app.app.test_client().post("/api/rules/simulate", json={"nope": 1}).status_code == 400
+
+
+def test_rows_are_reread_only_after_a_write(tmp_path, monkeypatch):
+    _seed(tmp_path, monkeypatch)
+    assert app.simulate_rules(RULES)["changed"] == 4
+    index = app._SIMULATION_INDEXES[app.DB_PATH]
+
+    # An edited rule set reuses the rows read for the last one
+    edited = {"rules": RULES["rules"] + [{"name": "bakery", "match": {"contains_any": ["bakery"]}, "category": "Food"}]}
+    assert app.simulate_rules(edited)["changed"] == 5
+    assert app._SIMULATION_INDEXES[app.DB_PATH] is index
+
+    with app.db_writer() as con:
+        con.execute("INSERT INTO transactions (tx_date, amount, category, hash) VALUES ('2024-01-02', -1, 'Dining', 'g')")
+        con.execute("UPDATE transactions SET category = 'Groceries' WHERE hash = 'a'")
+    res = app.simulate_rules(edited)
+    assert app._SIMULATION_INDEXES[app.DB_PATH] is not index
+    assert (res["rows"], res["changed"]) == (7, 4)
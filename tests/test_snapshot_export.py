@@ -0,0 +1,56 @@
+import sqlite3
+
+import pytest
+
+import app
+
+pa = pytest.importorskip("pyarrow")
+
+
+@pytest.fixture(autouse=True)
+def _rows(seed):
+    seed(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES (?, ?, ?, 'Misc', ?)",
+        [("2024-01-05", "A", -1.0, "a"), ("2024-02-05", "B", -2.0, "b"), ("2024-03-05", "C", -3.0, "c")],
+    )
+
+
+def test_only_changed_months_are_rewritten(db_file):
+    assert app.refresh_snapshot()["written"] == ["2024-01", "2024-02", "2024-03"]
+    assert app.refresh_snapshot() == {"written": [], "removed": []}
+
+    con = sqlite3.connect(db_file)
+    con.execute("UPDATE transactions SET category = 'Food' WHERE hash = 'b'")
+    con.execute("DELETE FROM transactions WHERE hash = 'c'")
+    con.commit()
+    con.close()
+    assert app.refresh_snapshot() == {"written": ["2024-02"], "removed": ["2024-03"]}
+
+    table = app.read_snapshot("2024-02-01", "2024-12-31", ["description", "category"])
+    assert table.column_names == ["description", "category"]
+    assert table.to_pylist() == [{"description": "B", "category": "Food"}]
+
+
+def test_export_endpoint(client):
+    res = client.get("/api/export?format=arrow&start=2024-01-01&end=2024-02-29&columns=tx_date,amount")
+    assert res.status_code == 200
+    table = pa.ipc.open_file(pa.py_buffer(res.get_data())).read_all()
+    assert table.to_pydict() == {"tx_date": ["2024-01-05", "2024-02-05"], "amount": [-1.0, -2.0]}
+
+    assert client.get("/api/export?format=csv").status_code == 400
+    assert client.get("/api/export?columns=raw_json").status_code == 400
+
+
+def test_edits_that_keep_totals_still_rewrite_the_month(db_file):
+    app.refresh_snapshot()
+
+    # Neither edit touches daily_category_totals
+    con = sqlite3.connect(db_file)
+    con.execute("UPDATE transactions SET description = 'Bee' WHERE hash = 'b'")
+    con.execute("DELETE FROM transactions WHERE hash = 'c'")
+    con.execute("INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES ('2024-03-05', 'Sea', -3.0, 'Misc', 'c2')")
+    con.commit()
+    con.close()
+    assert app.refresh_snapshot() == {"written": ["2024-02", "2024-03"], "removed": []}
+    table = app.read_snapshot("2024-02-01", "2024-03-31", ["description"])
+    assert table.to_pylist() == [{"description": "Bee"}, {"description": "Sea"}]
@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+
+import app
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_does_not_load_pandas():
+    out = subprocess.run(
+        [sys.executable, "-c", "import sys, app; print('pandas' in sys.modules, 'numpy' in sys.modules)"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    assert out.stdout.split() == ["False", "False"]
+
+
+def _init_db_in_request():
+    raise AssertionError("init_db ran inside a request")
+
+
+def test_create_app_initialises_db_at_startup(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "startup.db")
+    monkeypatch.setattr(app, "DB_PATH", db_file)
+    monkeypatch.setattr(app, "LOGS_DIR", str(tmp_path / "logs"))
+    os.makedirs(app.LOGS_DIR, exist_ok=True)
+
+    flask_app = app.create_app(init_database=True)
+    assert os.path.exists(db_file)
+    assert flask_app.config["_DB_INIT_DONE"] is True
+
+    resumed = []
+    monkeypatch.setattr(app, "init_db", _init_db_in_request)
+    monkeypatch.setattr(app, "resume_ingest_jobs", lambda: resumed.append(1))
+    client = flask_app.test_client()
+    assert client.get("/health").get_json()["ok"] is True
+    client.get("/health")
+    assert resumed == [1]  # once per worker, on its first request
@@ -0,0 +1,73 @@
+import sqlite3
+
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def _rows(seed):
+    seed(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("2024-01-01", "Countdown", -10.10, "Groceries", "a"),  # Monday
+            ("2024-01-07", "Z Energy", -20.20, "Transport", "b"),   # Sunday, same week
+            ("2024-01-08", "Countdown", -5.00, "Groceries", "c"),   # next Monday
+            ("2024-01-09", "Salary", 1000.00, "Income", "d"),
+            ("2024-01-10", "To savings", -300.00, "Transfer", "e"),
+        ],
+    )
+
+
+def _rollup(db_file):
+    con = sqlite3.connect(db_file)
+    rows = con.execute("SELECT * FROM daily_category_totals ORDER BY 1, 3, 4").fetchall()
+    con.close()
+    return rows
+
+
+def test_summary_reads_rollups(client):
+    body = client.get("/api/summary?start=2024-01-01&end=2024-01-31").get_json()
+
+    assert body["categories_breakdown"] == [
+        {"category": "Groceries", "amount": -15.10},
+        {"category": "Transport", "amount": -20.20},
+    ]
+    assert body["weekly"]["points"] == [
+        {"week": "2024-01-01", "amount": -30.30},
+        {"week": "2024-01-08", "amount": -5.00},
+    ]
+    assert body["filters"]["categories"] == ["Groceries", "Income", "Transfer", "Transport"]
+    assert len(body["transactions"]) == 5
+
+
+def test_rollups_follow_mutations(db_file, client):
+
+    client.post("/api/toggle_hidden", json={"hash": "a"})
+    client.post("/api/bulk_hide_transfers", json={"action": "hide"})
+    client.post("/api/purge_transfers")
+    con = sqlite3.connect(db_file)
+    con.execute("UPDATE transactions SET category = 'Fuel' WHERE hash = 'b'")
+    con.commit()
+    con.close()
+    incremental = _rollup(db_file)
+
+    with app.get_db() as con:
+        app.rebuild_rollups(con)
+    assert incremental == _rollup(db_file)
+
+    body = client.get("/api/summary?start=2024-01-01&end=2024-01-31").get_json()
+    assert body["categories_breakdown"] == [
+        {"category": "Groceries", "amount": -5.00},
+        {"category": "Fuel", "amount": -20.20},
+    ]
+
+
+def test_existing_db_is_backfilled(db_file):
+    con = sqlite3.connect(db_file)
+    con.execute("DELETE FROM daily_category_totals")
+    con.commit()
+    con.close()
+
+    app.init_db()
+    assert sum(r[5] for r in _rollup(db_file)) == 5
@@ -0,0 +1,45 @@
+import pytest
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def _rows(seed):
+    # Several rows per day so pages split within a date
+    seed(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash, hidden) VALUES (?, ?, ?, 'Misc', ?, ?)",
+        [(f"2024-01-{1 + i // 3:02d}", f"Shop {i}", -float(i), f"h{i}", 1 if i == 7 else 0) for i in range(25)],
+    )
+
+
+def _walk(client, query):
+    seen, cursor = [], None
+    while True:
+        url = f"/api/transactions?start=2024-01-01&end=2024-12-31&{query}"
+        if cursor:
+            url += f"&cursor={cursor}"
+        body = client.get(url).get_json()
+        seen.extend(r["description"] for r in body["transactions"])
+        cursor = body["next_cursor"]
+        if not cursor:
+            return seen
+
+
+def test_keyset_pages_cover_every_row_once(client):
+    seen = _walk(client, "limit=4")
+    expected = [f"Shop {i}" for i in reversed(range(25)) if i != 7]
+    assert seen == expected
+
+
+def test_sort_by_amount_and_search(client):
+    seen = _walk(client, "limit=3&sort=amount&order=asc&show_hidden=true&q=shop 1")
+    assert seen == ["Shop 19", "Shop 18", "Shop 17", "Shop 16", "Shop 15", "Shop 14",
+                    "Shop 13", "Shop 12", "Shop 11", "Shop 10", "Shop 1"]
+
+
+def test_bad_cursor_and_legacy_shape(client):
+    assert client.get("/api/transactions?cursor=nonsense").status_code == 400
+    for bad in ({"s": "date", "o": "desc", "v": [1], "id": 1}, {"s": "date", "o": "desc", "v": "2024-01-01", "id": {}}):
+        assert client.get(f"/api/transactions?cursor={app.encode_cursor(bad)}").status_code == 400
+    legacy = client.get("/api/transactions?start=2024-01-01&end=2024-12-31").get_json()
+    assert isinstance(legacy, list) and len(legacy) == 24
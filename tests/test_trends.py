@@ -0,0 +1,63 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _rows(seed):
+    seed(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("2023-03-06", "Countdown", -100.00, "Groceries", "a"),
+            ("2024-02-05", "Countdown", -50.00, "Groceries", "b"),
+            ("2024-03-04", "Countdown", -80.00, "Groceries", "c"),  # Monday
+            ("2024-03-05", "Z Energy", -20.00, "Transport", "d"),
+            ("2024-03-06", "Salary", 500.00, "Income", "e"),
+        ],
+    )
+
+
+def test_month_over_month_and_year_over_year(client):
+    body = client.get("/api/trends?start=2024-03-01&end=2024-03-31").get_json()
+    by_cat = {m["category"]: m for m in body["months"]}
+    assert set(by_cat) == {"Groceries", "Transport"}  # Income is excluded
+
+    groceries = by_cat["Groceries"]
+    assert groceries["month"] == "2024-03"
+    assert (groceries["amount"], groceries["prev_month"], groceries["prev_year"]) == (-80.0, -50.0, -100.0)
+    assert (groceries["mom_delta"], groceries["mom_pct"]) == (-30.0, -60.0)
+    assert (groceries["yoy_delta"], groceries["yoy_pct"]) == (20.0, 20.0)
+
+    # No spend in the comparison month: delta but no percentage
+    assert by_cat["Transport"]["prev_month"] == 0.0
+    assert by_cat["Transport"]["mom_pct"] is None
+
+
+def test_rolling_averages_and_percentiles(client):
+    body = client.get("/api/trends?start=2024-03-01&end=2024-03-31").get_json()
+    weeks = {w["week"]: w for w in body["weeks"]}
+    assert list(weeks) == ["2024-02-26", "2024-03-04", "2024-03-11", "2024-03-18", "2024-03-25"]
+
+    week = weeks["2024-03-04"]
+    assert week["spend"] == 100.0
+    assert week["avg_4w"] == 25.0  # Feb 12 .. Mar 4: 0, 0, 0, 100
+    assert week["avg_52w"] == round((50 + 100) / 52, 2)  # the 2023-03-06 week has just dropped out
+    assert body["percentiles"]["p50"] == 0.0
+    assert body["percentiles"]["p90"] == 100.0
+
+
+def test_category_filter_and_empty_range(client):
+    body = client.get("/api/trends?start=2024-03-01&end=2024-03-31&category=Transport").get_json()
+    assert [m["category"] for m in body["months"]] == ["Transport"]
+    assert body["months"][0]["prev_year"] is None  # no Transport data a year back
+
+    empty = client.get("/api/trends?start=2020-01-01&end=2020-12-31").get_json()
+    assert empty["months"] == [] and empty["weeks"] == []
+    assert client.get("/api/trends?start=2024-03-31&end=2024-03-01").status_code == 400
+
+
+def test_every_month_in_a_multi_month_range(client):
+    body = client.get("/api/trends?start=2024-02-01&end=2024-03-31&category=Groceries").get_json()
+    assert [(m["month"], m["amount"], m["prev_month"]) for m in body["months"]] == [
+        ("2024-02", -50.0, 0.0),
+        ("2024-03", -80.0, -50.0),
+    ]
+    assert body["months"][0]["prev_year"] is None  # before the first month with data
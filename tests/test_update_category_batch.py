@@ -0,0 +1,75 @@
+import sqlite3
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def _rules(monkeypatch):
+    monkeypatch.setattr(app, "RULES", app.RULES)
+    monkeypatch.setattr(app, "_RULES_LOADED", (None, None))
+    monkeypatch.setattr(app, "_APPLIED_RULES", set())
+
+
+@pytest.fixture(autouse=True)
+def _rows(_rules, seed):
+    app.replace_rules({"rules": []})
+    seed(
+        "INSERT INTO transactions (tx_date, description, amount, category, hash) VALUES ('2024-01-01', ?, -1, 'Uncategorised', ?)",
+        [("Countdown Petone", "a"), ("Countdown Lower Hutt", "b"), ("Z Energy", "c"), ("Bakery", "d")],
+    )
+
+
+def _categories(db_file):
+    con = sqlite3.connect(db_file)
+    out = dict(con.execute("SELECT hash, category FROM transactions").fetchall())
+    con.close()
+    return out
+
+
+def test_batch_items_learn_once_and_apply_once(db_file, client, monkeypatch):
+    calls = []
+    real = app.apply_changed_rules
+    monkeypatch.setattr(app, "apply_changed_rules", lambda: calls.append(1) or real())
+
+    body = client.post("/api/update_category/batch", json={"items": [
+        {"hash": "a", "category": "Groceries"},
+        {"hash": "b", "category": "Groceries"},
+        {"hash": "c", "category": "Fuel"},
+        {"hash": "missing", "category": "Fuel"},
+        {"hash": "d"},
+    ]}).get_json()
+
+    assert [r["status"] for r in body["results"]] == ["ok", "ok", "ok", "error", "error"]
+    assert body["updated"] == 3
+    assert body["learned_phrases"] == ["countdown", "energy"]
+    assert len(calls) == 1
+    assert [r["name"] for r in app.RULES["rules"]] == ["User: countdown -> Groceries", "User: energy -> Fuel"]
+    assert _categories(db_file) == {"a": "Groceries", "b": "Groceries", "c": "Fuel", "d": "Uncategorised"}
+
+
+def test_batch_by_filter(db_file, client):
+    body = client.post("/api/update_category/batch", json={
+        "filter": {"start": "2024-01-01", "end": "2024-01-31", "q": "countdown"},
+        "category": "Groceries",
+    }).get_json()
+    assert body["updated"] == 2
+    assert _categories(db_file)["b"] == "Groceries"
+
+    assert client.post("/api/update_category/batch", json={"items": []}).status_code == 400
+
+
+def test_batch_filter_show_hidden_is_parsed_like_the_query_flag(db_file, client):
+    con = sqlite3.connect(db_file)
+    con.execute("UPDATE transactions SET hidden = 1 WHERE hash = 'a'")
+    con.commit()
+    con.close()
+
+    flt = {"start": "2024-01-01", "end": "2024-01-31", "q": "countdown", "show_hidden": "false"}
+    body = client.post("/api/update_category/batch", json={"filter": flt, "category": "Groceries"}).get_json()
+    assert [r["hash"] for r in body["results"]] == ["b"]
+
+    for flag in ("true", True):
+        flt["show_hidden"] = flag
+        assert client.post("/api/update_category/batch", json={"filter": flt, "category": "Groceries"}).get_json()["updated"] == 2